@@ -1,12 +1,23 @@
 import tkinter as tk
 from tkinter import ttk
-import cv2
 import PIL.Image, PIL.ImageTk
-import threading
 import time
+from urllib.parse import urlsplit
 
 # Import your camera module
 import OpenCV
+from adaptive import AdaptiveQuality
+from aiming import AimController
+from backend import ServoController, ServoScheduler
+from calibration import CalibrationError, Calibrator, FocalProfile, framesize_of
+from camera_control import CameraControl, needs_restart
+from detector import PROFILES, load_profile
+from detector_engine import create_detector, resolve_backend
+from metrics import Metrics, serve
+from motion import MotionGatedDetector
+from pipeline import Pipeline, draw_boxes
+from tracker import TrackingDetector
+from tracks import FaceTrackSet
 
 class ESP32CameraApp:
     def __init__(self, window, window_title):
@@ -15,15 +26,28 @@ class ESP32CameraApp:
         
         # Get URL from imported module
         self.url = OpenCV.URL
+        # /control and /status requests run off the Tk thread on a pooled connection
+        self.control = CameraControl(self.url)
+        # Automatic framesize/quality stepping, fed once per second from update()
+        self.adaptive = AdaptiveQuality(framesize=8, quality=10)
         
         # Face distance tracking constants
         self.KNOWN_DISTANCE = 30.0  # Distance in cm during calibration
         self.KNOWN_FACE_WIDTH = 14.3  # Average human face width in cm
-        self.focal_length = None  # Will be calculated during calibration
+        # Calibrated focal lengths per framesize, rescaled for framesizes never calibrated
+        self.focal_profile = FocalProfile.load()
+        self.focal_length = self.focal_profile.focal_for(8)
+        self.calibrator = None
         
-        # Distance tracking variables
-        self.distance_history = []  # For smoothing
-        self.distance_tracking_enabled = False
+        # Servo link and aiming loop, created when aiming is switched on
+        self.servo = None
+        self.servo_scheduler = None
+        self.aim = None
+        self.AIM_RATE = 50.0  # Control loop and servo update rate, Hz
+        
+        # Distance tracking variables, one filtered track per face
+        self.face_tracks = FaceTrackSet(face_width=self.KNOWN_FACE_WIDTH)
+        self.distance_tracking_enabled = self.focal_length is not None
         
         # Initialize camera
         self.init_camera()
@@ -33,12 +57,23 @@ class ESP32CameraApp:
         
         # Current frame placeholder
         self.current_frame = None
-        
-        # Start video stream in a separate thread
-        self.stop_event = threading.Event()
-        self.thread = threading.Thread(target=self.video_loop)
-        self.thread.daemon = True
-        self.thread.start()
+        self.display_seq = 0
+        self.fps_time = time.time()
+        self.frame_interval_ms = 1000 / 60  # Display refresh pacing
+        
+        # Stage timings and counters, scraped from http://127.0.0.1:9101/metrics
+        self.metrics = Metrics()
+        self.metrics.gauge("control_calls", lambda: self.control.control_calls)
+        self.metrics.gauge("servo_send_latency_seconds", lambda: self.servo.latency()[0] if self.servo else None)
+        self.metrics.gauge("servo_round_trip_seconds", lambda: self.servo.latency()[1] if self.servo else None)
+        self.metrics_services = serve(self.metrics)
+        
+        # Capture, detection and display conversion run on separate workers
+        self.pipeline = Pipeline(self.cap, self.gate, annotate=draw_boxes, metrics=self.metrics)
+        self.pipeline.bus.subscribe(self.on_detections)
+        self.pipeline.start()
+        self.run_async(self.session.classifier, self.on_classifier_ready)
+        self.run_async(self.session.stream, self.on_stream_ready)
         
         # Set window close handler
         self.window.protocol("WM_DELETE_WINDOW", self.on_close)
@@ -47,31 +82,47 @@ class ESP32CameraApp:
         self.update()
         
     def init_camera(self):
-        """Initialize camera connection"""
-        try:
-            # Use the reconnect_camera function from your imported module
-            self.cap = OpenCV.reconnect_camera(self.url)
-            if self.cap is None:
-                print("Failed to open video stream")
-                return False
-                
-            # Set initial resolution using your existing function
-            success = OpenCV.set_resolution(self.url, index=8, verbose=True)
-            if not success:
-                print("Failed to set initial resolution")
+        """Start connecting in the background, the window comes up without waiting for the camera"""
+        self.cap = None
+        # Backend picked offline by detector_engine.py for this framesize, haar without a selection.
+        # Finds nothing until its model has loaded
+        self.backend = resolve_backend("auto", framesize=8)
+        self.detector = create_detector(self.backend, None, load_profile("default"), self.focal_length,
+                                        face_width=self.KNOWN_FACE_WIDTH)
+        # Full cascade every few frames, template tracking in between
+        self.tracker = TrackingDetector(self.detector, interval=10)
+        # Skips the cascade while nothing in view moves, wraps whichever of the two is active
+        self.gate = MotionGatedDetector(self.detector)
+        # Initial resolution is applied before the stream opens, so the first frame already has it
+        self.session = OpenCV.CameraSession(self.url, self.backend, control=self.control,
+                                            settings={"framesize": 8}).start()
             
-            # Use face_classifier from your module
-            self.face_classifier = OpenCV.face_classifier
-                
-            return True
-        except Exception as e:
-            print(f"Camera initialization error: {e}")
-            return False
+    def on_classifier_ready(self, future):
+        self.detector.set_classifier(future.result())
+        
+    def on_stream_ready(self, future):
+        if self.cap is not None:
+            # Reconnect was pressed while the session was still connecting
+            future.result().release()
+            return
+        self.cap = future.result()
+        self.pipeline.set_source(self.cap)
+        self.status_var.set("Camera connected")
+        # The session read /status, show the camera's actual quality
+        quality = self.control.settings.get("quality")
+        if self.control.settings.known and quality is not None and 10 <= quality <= 63:
+            self.quality_var.set(quality)
+            self.adaptive.quality = quality
+            self.update_quality_label()
             
     def create_widgets(self):
         # Video display area
         self.canvas = tk.Canvas(self.window, width=800, height=600)
         self.canvas.pack(fill=tk.BOTH, expand=True)
+        # One image item for the whole session, updated in place
+        self.photo = None
+        self.image_item = self.canvas.create_image(400, 300, anchor=tk.CENTER)
+        self.canvas.bind("<Configure>", self.on_canvas_resize)
         
         # Controls area
         control_frame = ttk.Frame(self.window)
@@ -100,15 +151,41 @@ class ESP32CameraApp:
         
         # Face detection toggle
         self.face_var = tk.BooleanVar(value=True)
-        face_check = ttk.Checkbutton(control_frame, text="Face Detection", variable=self.face_var)
+        face_check = ttk.Checkbutton(control_frame, text="Face Detection", variable=self.face_var,
+                                     command=self.toggle_detection)
         face_check.pack(side=tk.LEFT, padx=20)
         
+        # Detection profile (downscale and cascade parameters)
+        self.profile_var = tk.StringVar(value="default")
+        profile_menu = ttk.Combobox(control_frame, textvariable=self.profile_var, values=list(PROFILES),
+                                    width=8, state="readonly")
+        profile_menu.pack(side=tk.LEFT, padx=5)
+        profile_menu.bind("<<ComboboxSelected>>", self.change_profile)
+        
+        # Detect-then-track toggle
+        self.tracking_var = tk.BooleanVar(value=False)
+        tracking_check = ttk.Checkbutton(control_frame, text="Track Faces", variable=self.tracking_var,
+                                         command=self.toggle_tracking)
+        tracking_check.pack(side=tk.LEFT, padx=5)
+        
+        # Motion gate toggle
+        self.motion_var = tk.BooleanVar(value=True)
+        motion_check = ttk.Checkbutton(control_frame, text="Motion Gate", variable=self.motion_var,
+                                       command=self.toggle_motion_gate)
+        motion_check.pack(side=tk.LEFT, padx=5)
+        
         # Distance tracking toggle
-        self.distance_var = tk.BooleanVar(value=False)
+        self.distance_var = tk.BooleanVar(value=self.distance_tracking_enabled)
         distance_check = ttk.Checkbutton(control_frame, text="Distance Tracking", 
                                         variable=self.distance_var)
         distance_check.pack(side=tk.LEFT, padx=5)
         
+        # Servo aiming toggle
+        self.aim_var = tk.BooleanVar(value=False)
+        aim_check = ttk.Checkbutton(control_frame, text="Aim Servos", variable=self.aim_var,
+                                    command=self.toggle_aiming)
+        aim_check.pack(side=tk.LEFT, padx=5)
+        
         # Calibrate button
         calibrate_btn = ttk.Button(control_frame, text="Calibrate Distance", 
                                   command=self.calibrate_distance)
@@ -134,6 +211,11 @@ class ESP32CameraApp:
                                 command=self.change_quality)
         quality_btn.pack(side=tk.LEFT, padx=5)
         
+        # Automatic framesize/quality toggle
+        self.auto_var = tk.BooleanVar(value=False)
+        auto_check = ttk.Checkbutton(control_frame, text="Auto Quality", variable=self.auto_var)
+        auto_check.pack(side=tk.LEFT, padx=5)
+        
         # AWB toggle button
         awb_btn = ttk.Button(control_frame, text="Toggle AWB", command=self.toggle_awb)
         awb_btn.pack(side=tk.LEFT, padx=10)
@@ -155,61 +237,116 @@ class ESP32CameraApp:
         self.quality_label.config(text=f"Quality: {int(self.quality_var.get())}")
         
     def calibrate_distance(self):
-        """Calibrate the system for distance measurement"""
-        self.status_var.set("Calibrating distance measurement...")
-        
-        # Wait for a stable frame
-        time.sleep(2)
-        
-        if self.current_frame is not None:
-            # Convert to grayscale for face detection
-            gray = cv2.cvtColor(self.current_frame, cv2.COLOR_RGB2GRAY)
-            gray = cv2.equalizeHist(gray)
-            
-            # Detect face
-            faces = self.face_classifier.detectMultiScale(gray)
-            
-            if len(faces) > 0:
-                # Use the first face detected
-                (x, y, w, h) = faces[0]
-                
-                # Calculate focal length using triangle similarity
-                self.focal_length = (w * self.KNOWN_DISTANCE) / self.KNOWN_FACE_WIDTH
-                
-                self.status_var.set(f"Calibration complete. Focal length: {self.focal_length:.2f}")
-                print(self.status_var)
-                self.distance_tracking_enabled = True
-                self.distance_var.set(True)
-                return True
-            else:
-                self.status_var.set("Calibration failed: No face detected")
-                return False
-        else:
-            self.status_var.set("Calibration failed: No frame available")
-            return False
+        """Measure the focal length over many frames in the background"""
+        if self.calibrator is not None:
+            return
+        self.status_var.set(f"Calibrating: hold one face {self.KNOWN_DISTANCE:.0f} cm from the camera...")
+        # Boxes come from the detection records at camera resolution, not from the drawn display frame
+        self.calibrator = Calibrator(self.KNOWN_DISTANCE, self.KNOWN_FACE_WIDTH)
+        # A face held still is the static scene the gate skips, run the raw detector on every frame
+        self.update_detector_chain()
+        self.pipeline.bus.subscribe(self.calibrator.on_detections)
+        # Fails the calibration if no detections arrive at all
+        self.window.after(int((self.calibrator.timeout + 2) * 1000), self.calibrator.cancel)
+        self.run_async(self.calibrator.result, self.on_calibrated)
     
-    def calculate_distance(self, face_width):
-        """Calculate distance from face to camera"""
-        if face_width == 0 or self.focal_length is None:
-            return 0
-        
-        # Calculate distance using triangle similarity
-        distance = (self.KNOWN_FACE_WIDTH * self.focal_length) / face_width
-        
-        # Apply smoothing with moving average
-        self.distance_history.append(distance)
-        if len(self.distance_history) > 5:  # Keep last 5 measurements
-            self.distance_history.pop(0)
-        
-        # Return smoothed distance
-        return sum(self.distance_history) / len(self.distance_history)
-        
+    def on_calibrated(self, future):
+        self.pipeline.bus.unsubscribe(self.calibrator.on_detections)
+        self.calibrator = None
+        self.update_detector_chain()
+        try:
+            framesize, focal_length = future.result()
+        except CalibrationError as e:
+            self.status_var.set(f"Calibration failed: {e}")
+            return
+        if framesize is None:
+            self.status_var.set("Calibration failed: unknown frame size")
+            return
+        self.focal_profile.set(framesize, focal_length)
+        try:
+            self.focal_profile.save()
+        except OSError as e:
+            print(f"Could not save focal profile: {e}")
+        self.set_focal_length(focal_length)
+        self.status_var.set(f"Calibration complete. Focal length: {focal_length:.2f} (framesize {framesize})")
+        self.distance_tracking_enabled = True
+        self.distance_var.set(True)
+    
+    def set_focal_length(self, focal_length):
+        self.focal_length = focal_length
+        # Lets the detector bound face sizes by the profile's distance range
+        self.detector.set_focal_length(focal_length)
+        if self.aim is not None:
+            self.aim.set_focal_length(focal_length)
+    
+    def on_detections(self, record):
+        """Runs on the detect worker for every DetectionRecord"""
+        # Follow framesize changes (manual or auto quality) with the matching focal length
+        focal_length = self.focal_profile.focal_for(framesize_of(record.frame_size))
+        if focal_length is not None and focal_length != self.focal_length:
+            self.set_focal_length(focal_length)
+        if self.distance_var.get() and self.focal_length is not None:
+            record.track_ids, distances = self.face_tracks.update(record.boxes, record.timestamp, self.focal_length)
+            record.distances = distances.tolist()
+
+    def toggle_detection(self):
+        self.pipeline.detection_enabled = self.face_var.get()
+
+    def toggle_aiming(self):
+        """Drive the pan/tilt servos from detections through the port 100 bridge"""
+        if self.aim_var.get():
+            host = urlsplit(self.url).hostname
+            self.servo = self.control.watch(ServoController(host)).connect()
+            # Pan and tilt leave together at a fixed rate instead of one write per axis per step
+            self.servo_scheduler = ServoScheduler(self.servo, rate=self.AIM_RATE).start()
+            self.aim = AimController(self.servo_scheduler, focal_length=self.focal_length,
+                                     rate=self.AIM_RATE).start()
+            self.pipeline.bus.subscribe(self.aim.on_detections)
+            self.status_var.set(f"Aiming servos via {host}")
+        elif self.aim is not None:
+            self.pipeline.bus.unsubscribe(self.aim.on_detections)
+            self.aim.stop()
+            self.servo_scheduler.stop()
+            self.servo.disconnect()
+            self.aim = None
+            self.servo_scheduler = None
+            self.servo = None
+            self.status_var.set("Aiming stopped")
+
+    def change_profile(self, event=None):
+        self.detector.set_profile(load_profile(self.profile_var.get()))
+        self.tracker.reset()
+        self.gate.reset()
+        self.status_var.set(f"Detector profile: {self.profile_var.get()} (scale {self.detector.scale:.2f})")
+
+    def toggle_tracking(self):
+        """Switch between full detection on every frame and detect-then-track"""
+        self.tracker.reset()
+        self.update_detector_chain()
+        
+    def toggle_motion_gate(self):
+        """Run detection only on motion (plus a periodic check) or on every frame"""
+        self.update_detector_chain()
+
+    def update_detector_chain(self):
+        """Put the motion gate and tracker in front of the detector as the toggles say, bypassed while calibrating"""
+        calibrating = self.calibrator is not None
+        self.gate.enabled = self.motion_var.get() and not calibrating
+        self.gate.detector = self.tracker if self.tracking_var.get() and not calibrating else self.detector
+        self.gate.reset()
+
     def on_resize(self, event):
         # Only process if it's the main window being resized
         if event.widget == self.window:
             # Update canvas size
             self.canvas.config(width=event.width-20, height=event.height-100)
         
+    def on_canvas_resize(self, event):
+        """Keep the image centred and have the presentation worker scale frames to fit"""
+        self.canvas.coords(self.image_item, event.width // 2, event.height // 2)
+        if hasattr(self, 'pipeline'):
+            self.pipeline.display_size = (event.width, event.height)
+        
     def change_resolution(self, event=None):
         """Handle resolution change from dropdown"""
         res_name = self.res_var.get()
@@ -218,13 +355,18 @@ class ESP32CameraApp:
         
         self.status_var.set(f"Changing resolution to {res_name}...")
         
-        # Set resolution using the imported module's function
-        if OpenCV.set_resolution(self.url, index=res_index, verbose=True):
-            # Reconnect camera with new settings
-            self.reconnect()
-            self.status_var.set(f"Resolution set to {res_name}")
-        else:
-            self.status_var.set("Failed to change resolution")
+        def done(future):
+            if future.exception() is None:
+                self.adaptive.framesize = res_index
+                # Camera confirmed the new framesize, restart the stream right away
+                if needs_restart(future.result()):
+                    self.restart_stream()
+                self.status_var.set(f"Resolution set to {res_name}")
+            else:
+                print(f"Resolution change error: {future.exception()}")
+                self.status_var.set("Failed to change resolution")
+        
+        self.run_async(self.control.apply(framesize=res_index), done)
             
     def change_quality(self):
         """Change camera quality"""
@@ -233,22 +375,75 @@ class ESP32CameraApp:
         
         self.status_var.set(f"Changing quality to {quality}...")
         
-        if OpenCV.set_quality(self.url, value=quality):
-            self.reconnect()
-            self.status_var.set(f"Quality set to {quality}")
-        else:
-            self.status_var.set("Failed to change quality")
+        def done(future):
+            if future.exception() is None:
+                # JPEG quality applies from the next frame, the stream keeps running
+                self.adaptive.quality = quality
+                self.status_var.set(f"Quality set to {quality}")
+            else:
+                print(f"Quality change error: {future.exception()}")
+                self.status_var.set("Failed to change quality")
+        
+        self.run_async(self.control.apply(quality=quality), done)
             
     def toggle_awb(self):
         """Toggle auto white balance"""
-        global AWB  # Use the global AWB variable from OpenCV module
-        
         self.status_var.set("Toggling AWB...")
         
-        # Toggle AWB using the imported module's function
-        OpenCV.AWB = OpenCV.set_awb(self.url, OpenCV.AWB)
+        def done(future):
+            if future.exception() is None:
+                awb = self.control.settings.get("awb")
+                self.status_var.set(f"AWB is now {'ON' if awb else 'OFF'}")
+            else:
+                print(f"AWB toggle error: {future.exception()}")
+                self.status_var.set("Failed to toggle AWB")
         
-        self.status_var.set(f"AWB is now {'ON' if OpenCV.AWB else 'OFF'}")
+        # The cache holds what /status reported, so this is a real toggle rather than a guess
+        self.run_async(self.control.apply(awb=0 if self.control.settings.get("awb", 1) else 1), done)
+    
+    def adapt_settings(self, rates):
+        """Let AdaptiveQuality step framesize/quality from the last second of measurements"""
+        record = self.pipeline.bus.latest()
+        fps = rates['capture']
+        latency = None
+        face_width = None
+        if self.pipeline.detection_enabled and record is not None:
+            fps = min(fps, rates['detect'])
+            latency = record.latency
+            if len(record.boxes):
+                face_width = int(record.boxes[:, 2].min())
+        changes = self.adaptive.evaluate(fps, latency, face_width)
+        if not changes:
+            return
+        print(f"Auto quality: applying {changes}")
+        
+        def done(future):
+            if future.exception() is None:
+                if 'framesize' in changes:
+                    self.res_var.set(next(k for k, v in self.res_map.items() if v == changes['framesize']))
+                if needs_restart(future.result()):
+                    self.restart_stream()
+                if 'quality' in changes:
+                    self.quality_var.set(changes['quality'])
+                    self.update_quality_label()
+            else:
+                print(f"Auto quality error: {future.exception()}")
+        
+        self.run_async(self.control.apply(**changes), done)
+    
+    def run_async(self, future, on_done):
+        """Call on_done(future) on the Tk thread once a background operation finishes"""
+        if future.done():
+            on_done(future)
+        else:
+            self.window.after(50, self.run_async, future, on_done)
+    
+    def restart_stream(self):
+        """Drop and reopen the stream connection without waiting"""
+        if self.cap is not None and self.cap.isOpened():
+            self.cap.restart()
+        else:
+            self.reconnect()
             
     def reconnect(self):
         """Reconnect the camera after settings change"""
@@ -258,88 +453,67 @@ class ESP32CameraApp:
         if hasattr(self, 'cap') and self.cap is not None:
             self.cap.release()
         
-        # Wait for camera to adjust to new settings
-        time.sleep(2)
-        
         # Use the reconnect function from imported module
         self.cap = OpenCV.reconnect_camera(self.url)
+        # The camera may have been power cycled, check its settings before trusting the cache
+        self.control.settings.invalidate()
+        self.control.watch(self.cap)
+        
+        if hasattr(self, 'pipeline'):
+            self.pipeline.set_source(self.cap)
         
         if self.cap is not None and self.cap.isOpened():
             self.status_var.set("Camera reconnected successfully")
         else:
             self.status_var.set("Failed to reconnect camera")
         
-    def video_loop(self):
-        frame_count = 0
-        start_time = time.time()
-        
-        while not self.stop_event.is_set():
-            if hasattr(self, 'cap') and self.cap is not None and self.cap.isOpened():
-                # Use the get_frame function from your module
-                self.cap, frame = OpenCV.get_frame(self.cap, self.url)
-                
-                if frame is not None:
-                    frame_count += 1
-                    if frame_count >= 30:
-                        fps = frame_count / (time.time() - start_time)
-                        print(f"FPS: {fps:.2f}")
-                        self.status_var.set(f"FPS: {fps:.2f}")
-                        frame_count = 0
-                        start_time = time.time()
-                    
-                    # Process face detection if enabled
-                    if self.face_var.get():
-                        try:
-                            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                            gray = cv2.equalizeHist(gray)
-                            faces = self.face_classifier.detectMultiScale(gray)
-                            
-                            for (x, y, w, h) in faces:
-                                # Draw rectangle around face
-                                frame = cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 255, 0), 4)
-                                
-                                # Calculate and display distance if enabled and calibrated
-                                if self.distance_var.get() and self.focal_length is not None:
-                                    distance = self.calculate_distance(w)
-                                    distance_text = f"Distance: {distance:.2f} cm"
-                                    cv2.putText(frame, distance_text, (x, y - 10), 
-                                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                        except Exception as e:
-                            print(f"Face detection error: {e}")
-                    
-                    # Convert frame for display
-                    self.current_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            else:
-                # If camera is disconnected, try to reconnect
-                if hasattr(self, 'cap') and self.cap is None:
-                    self.status_var.set("Camera disconnected. Attempting to reconnect...")
-                    self.reconnect()
-            
-            time.sleep(0.01)  # Small delay to reduce CPU usage
-            
     def update(self):
-        if hasattr(self, 'current_frame') and self.current_frame is not None:
+        # Newest annotated RGB frame from the presentation worker, reusing the last buffer
+        item = self.pipeline.display_ring.get(after=self.display_seq, timeout=0, out=self.current_frame)
+        if item is not None:
+            self.display_seq, _, _, self.current_frame = item
+        
+        if time.time() - self.fps_time >= 1.0:
+            rates = self.pipeline.rates()
+            if self.cap is None:
+                self.status_var.set(f"Camera {self.session.state} (attempt {self.session.attempts})...")
+            else:
+                self.status_var.set(f"FPS: {rates['capture']:.2f} (detect {rates['detect']:.2f})")
+            self.fps_time = time.time()
+            if self.auto_var.get():
+                self.adapt_settings(rates)
+        
+        started = time.perf_counter()
+        # Only the newest frame is drawn, anything that arrived in between was skipped
+        if item is not None:
             try:
-                # Convert OpenCV image to PhotoImage for Tkinter
-                self.photo = PIL.ImageTk.PhotoImage(image=PIL.Image.fromarray(self.current_frame))
-                
-                # Get canvas dimensions
-                canvas_width = self.canvas.winfo_width()
-                canvas_height = self.canvas.winfo_height()
-                
-                # Center the image on the canvas
-                self.canvas.create_image(canvas_width//2, canvas_height//2, 
-                                        image=self.photo, anchor=tk.CENTER)
+                image = PIL.Image.fromarray(self.current_frame)
+                if self.photo is not None and (self.photo.width(), self.photo.height()) == image.size:
+                    # Same size: copy pixels into the existing PhotoImage, no new Tk objects
+                    self.photo.paste(image)
+                else:
+                    self.photo = PIL.ImageTk.PhotoImage(image=image)
+                    self.canvas.itemconfig(self.image_item, image=self.photo)
+                self.metrics.observe("display", time.perf_counter() - started)
             except Exception as e:
                 print(f"Update error: {e}")
             
-        # Schedule next update
-        self.window.after(30, self.update)
+        # Pace to the display refresh, minus the time this update took
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.window.after(max(1, int(self.frame_interval_ms - elapsed_ms)), self.update)
         
     def on_close(self):
         print("Closing application...")
         self.status_var.set("Closing application...")
-        self.stop_event.set()
+        self.pipeline.stop()
+        self.session.stop()
+        for service in self.metrics_services:
+            service.stop()
+        self.control.close()
+        if self.aim is not None:
+            self.aim.stop()
+            self.servo_scheduler.stop()
+            self.servo.disconnect()
         if hasattr(self, 'cap') and self.cap is not None:
             self.cap.release()
         self.window.destroy()
@@ -1,37 +1,115 @@
 import cv2 # CV
 import numpy as np # CV
 import requests # HTTP
+import threading # BACKGROUND STARTUP
 import time # TIMING
+from concurrent.futures import Future # STARTUP RESULTS
+from camera_control import CameraControl, CameraControlError, needs_restart # /control
+from detector_engine import load_model # DETECTOR BACKENDS
+from esp32cam import FRAMESIZES, QUALITY_MAX, QUALITY_MIN, capture_url, stream_url # FIRMWARE CONSTANTS
+from framebus import SCHEME as BUS_SCHEME, BusSource # LOCAL FAN-OUT
+from mjpeg import MJPEGStream # STREAM
+from recording import ReplaySource # OFFLINE REPLAY
+from snapshot import SnapshotSource # /capture POLLING
 
 # ESP32 URL
 URL = "http://10.0.0.15"
-AWB = True
-
-# Test connection to ESP32 first
-try:
-    response = requests.get(URL, timeout=5)
-    print(f"Connection test: {response.status_code}")
-except requests.exceptions.RequestException as e:
-    print(f"Failed to connect to ESP32: {e}")
-    exit(1)
-
-# Face recognition and opencv setup
-try:
-    cap = cv2.VideoCapture(URL + ":81/stream")
-    # may be reduant but im pre sure it does increase the res 
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1920)  # Set to your desired width
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 1080)  # Set to your desired height
-    if not cap.isOpened():
-        print("Failed to open video stream")
-        exit(1)
-    
-    face_classifier = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
-    if face_classifier.empty():
-        print("Failed to load face classifier")
-        exit(1)
-except Exception as e:
-    print(f"Setup error: {e}")
-    exit(1)
+
+# Reuse one keep-alive connection for /control requests
+session = requests.Session()
+
+# Nothing connects at import time, CameraSession does the slow parts in the background
+
+class CameraSession:
+    """Lazily started camera: connectivity check, settings, stream and detector model load with retries
+
+    Construction does nothing. start() returns at once; `classifier` and `stream` are Futures that
+    resolve when each part is ready, so a GUI can come up first and attach to the camera later.
+    backend: detector_engine backend whose model goes into `classifier`, cascade overrides its file
+    control: optional CameraControl used to apply `settings` before the stream is opened
+    """
+
+    def __init__(self, url: str=URL, backend: str="haar", cascade: str=None, control=None, settings=None,
+                 source: str="stream", check_timeout: float=1.0, retry_min: float=0.25, retry_max: float=5.0):
+        self.url = url
+        self.source = source
+        self.backend = backend
+        self.cascade = cascade
+        self.control = control
+        self.settings = settings or {}
+        self.check_timeout = check_timeout
+        self.retry_min = retry_min
+        self.retry_max = retry_max
+        self.classifier = Future()
+        self.stream = Future()
+        self.state = "idle"
+        self.attempts = 0
+        self._stop_event = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._load_classifier, daemon=True).start()
+        threading.Thread(target=self._connect, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        if self.stream.done() and self.stream.exception() is None:
+            self.stream.result().release()
+
+    def wait(self, timeout=None):
+        """Block until the stream is attached, None on timeout (for scripts like run_camera)"""
+        try:
+            return self.stream.result(timeout)
+        except Exception:
+            return None
+
+    def _retry(self, delay):
+        # Exponential backoff that gives up early on stop()
+        self._stop_event.wait(delay)
+        return min(delay * 2, self.retry_max)
+
+    def _load_classifier(self):
+        delay = self.retry_min
+        while not self._stop_event.is_set():
+            classifier = load_model(self.backend, self.cascade)
+            if classifier is not None:
+                self.classifier.set_result(classifier)
+                return
+            print(f"Failed to load {self.backend} face detector {self.cascade or ''}, retrying")
+            delay = self._retry(delay)
+
+    def _connect(self):
+        delay = self.retry_min
+        if not is_local_source(self.url):
+            self.state = "connecting"
+            while not self._stop_event.is_set():
+                self.attempts += 1
+                try:
+                    if self.control is not None:
+                        # Also seeds the control's settings cache, so unchanged settings are not resent
+                        self.control.status()
+                    else:
+                        session.get(self.url + "/status", timeout=self.check_timeout).raise_for_status()
+                    break
+                except (requests.exceptions.RequestException, ValueError) as e:
+                    if self.attempts == 1:
+                        print(f"Camera not reachable yet ({e}), retrying in the background")
+                    delay = self._retry(delay)
+            if self._stop_event.is_set():
+                return
+            if self.settings and self.control is not None:
+                self.state = "configuring"
+                try:
+                    changes = self.control.apply(**self.settings).result()
+                    if changes:
+                        print(f"Applied camera settings {changes}")
+                except Exception as e:
+                    print(f"Failed to apply {self.settings}: {e}")
+        self.state = "streaming"
+        stream = open_stream(self.url, self.source)
+        if self.control is not None:
+            self.control.watch(stream)
+        self.stream.set_result(stream)
 
 def set_resolution(url: str, index: int=1, verbose: bool=False):
     try:
@@ -41,7 +119,7 @@ def set_resolution(url: str, index: int=1, verbose: bool=False):
         
         if index in [10, 9, 8, 7, 6, 5, 4, 3, 0]:
             resolutions_Array = ['0: QQVGA(160x120)', '', '', '3: HQVGA(240x176)', '4: QVGA(320x240)', '5: CIF(400x296)', '6: VGA(640x480)', '7: SVGA(800x600)', '8: XGA(1024x768)', '9: SXGA(1280x1024)', '10: UXGA(1600x1200)']
-            response = requests.get(url + "/control?var=framesize&val={}".format(index), timeout=5)
+            response = session.get(url + "/control?var=framesize&val={}".format(index), timeout=5)
             print(f"Resolution set response: {response.status_code}")
             print(f"Resolution set to {resolutions_Array[index]}")
             return True
@@ -57,7 +135,7 @@ def set_resolution(url: str, index: int=1, verbose: bool=False):
 def set_quality(url: str, value: int=1, verbose: bool=False):
     try:
         if 10 <= value <= 63:
-            response = requests.get(url + "/control?var=quality&val={}".format(value), timeout=5)
+            response = session.get(url + "/control?var=quality&val={}".format(value), timeout=5)
             print(f"Quality set response: {response.status_code}")
             return True
         else:
@@ -67,25 +145,43 @@ def set_quality(url: str, value: int=1, verbose: bool=False):
         print(f"SET_QUALITY error: {e}")
         return False
 
-def set_awb(url: str, awb: int=1):
+def set_awb(url: str, awb: bool=True):
+    """Set auto white balance to `awb` (not a toggle), True on success"""
     try:
-        awb = not awb
-        response = requests.get(url + "/control?var=awb&val={}".format(1 if awb else 0), timeout=5)
+        response = session.get(url + "/control?var=awb&val={}".format(1 if awb else 0), timeout=5)
         print(f"AWB set response: {response.status_code}")
-        return awb
+        return response.status_code == 200
     except Exception as e:
         print(f"SET_AWB error: {e}")
-        return awb
+        return False
+
+def is_local_source(url):
+    """Recordings and frame buses need no camera connectivity check or settings"""
+    return url.endswith(".mjr") or url.startswith(BUS_SCHEME)
+
+def open_stream(url, source: str="stream", concurrency: int=2):
+    """Start a latest-wins reader on the camera's /stream (or /capture) endpoint, a framebus.py hub
+    (shm://name), or replay a recording file"""
+    if url.endswith(".mjr"):
+        return ReplaySource(url).start()
+    if url.startswith(BUS_SCHEME):
+        # Shares one camera connection with every other local consumer
+        return BusSource(url).start()
+    if source == "capture":
+        # Overlapping snapshot requests, steadier than /stream at large framesizes
+        return SnapshotSource(capture_url(url), concurrency=concurrency).start()
+    return MJPEGStream(stream_url(url)).start()
 
 # Camera reconnection upon failure
 def get_frame(cap, url):
-    if not cap.isOpened() or not cap.grab():
+    if not cap.isOpened():
         print("Reconnecting to camera...")
         cap.release()
-        cap = cv2.VideoCapture(url + ":81/stream", cv2.CAP_FFMPEG)
-        time.sleep(1)  # Give it time to connect
+        # The reader reconnects with backoff on its own, no need to wait here
+        return open_stream(url), None
+
+    if not cap.grab():
         return cap, None
-    
     ret, frame = cap.retrieve()
     if not ret:
         return cap, None
@@ -95,31 +191,31 @@ def get_frame(cap, url):
 def reconnect_camera(url):
     try:
         print("Reconnecting camera...")
-        time.sleep(2)  # Wait for camera to adjust
-        new_cap = cv2.VideoCapture(url + ":81/stream", cv2.CAP_FFMPEG)
-        if not new_cap.isOpened():
-            print("Failed to reconnect camera")
-            return None
-        return new_cap
+        return open_stream(url)
     except Exception as e:
         print(f"Reconnection error: {e}")
         return None
     
-def change_resolution(URL, idx):
+def change_resolution(URL, idx, cap):
     set_resolution(URL, index=idx, verbose=True)
     cap.release()
-    cap = reconnect_camera(URL)
+    return reconnect_camera(URL)
+
+def apply_settings(control, **settings):
+    """Apply settings from the keyboard loop, the changes sent or None after printing the error"""
+    try:
+        return control.apply(**settings).result()
+    except (CameraControlError, requests.RequestException) as e:
+        print(f"Could not apply {settings}: {e}")
+        return None
 
 def run_camera():
     try:
-        # Initialize video capture
-        cap = cv2.VideoCapture(URL + ":81/stream")
-        if not cap.isOpened():
-            print("Failed to open video stream")
-            return
-            
-        # Set initial resolution
-        set_resolution(URL, index=8)
+        # Set initial resolution before the stream opens, the cascade loads meanwhile
+        control = CameraControl(URL)
+        camera = CameraSession(URL, control=control, settings={"framesize": 8}).start()
+        cap = camera.wait()
+        face_classifier = camera.classifier.result()
         
         frame_count = 0
         start_time = time.time()
@@ -130,8 +226,7 @@ def run_camera():
                     ret, frame = cap.read()
                     
                     if not ret:
-                        print("Failed to read frame")
-                        time.sleep(1)
+                        # Reader is reconnecting in the background
                         continue
                     
                     frame_count += 1
@@ -159,17 +254,24 @@ def run_camera():
                 key = cv2.waitKey(1)
                 
                 if key == ord('r'):
-                    idx = int(input("Select resolution index: "))
-                    if set_resolution(URL, index=idx, verbose=True):
-                        cap.release()
-                        cap = reconnect_camera(URL)
+                    idx = input("Select resolution index: ").strip()
+                    if idx.isdigit() and int(idx) in FRAMESIZES:
+                        changes = apply_settings(control, framesize=int(idx))
+                        if changes and needs_restart(changes):
+                            cap.restart()
+                    else:
+                        print(f"Wrong index, expected one of {sorted(FRAMESIZES)}")
                 elif key == ord('q'):
-                    val = int(input("Set quality (10 - 63): "))
-                    if set_quality(URL, value=val):
-                        cap.release()
-                        cap = reconnect_camera(URL)
+                    val = input(f"Set quality ({QUALITY_MIN} - {QUALITY_MAX}): ").strip()
+                    if val.isdigit() and QUALITY_MIN <= int(val) <= QUALITY_MAX:
+                        # JPEG quality applies to the next frame, no reconnect
+                        apply_settings(control, quality=int(val))
+                    else:
+                        print(f"Quality value must be between {QUALITY_MIN} and {QUALITY_MAX}")
                 elif key == ord('a'):
-                    AWB = set_awb(URL, AWB)
+                    awb = not control.settings.get("awb", 1)
+                    if apply_settings(control, awb=int(awb)) is not None:
+                        print(f"AWB is now {'ON' if awb else 'OFF'}")
                 elif key == 27:  # ESC key
                     break
             else:
@@ -178,7 +280,7 @@ def run_camera():
                 if cap is None:
                     print("Failed to reconnect. Waiting before retry...")
                     time.sleep(5)
-                    cap = cv2.VideoCapture(URL + ":81/stream")
+                    cap = open_stream(URL)
                 
     except KeyboardInterrupt:
         print("Program interrupted by user")
@@ -186,6 +288,8 @@ def run_camera():
         print(f"Unexpected error: {e}")
     finally:
         cv2.destroyAllWindows()
+        if 'control' in locals():
+            control.close()
         if 'cap' in locals() and cap is not None:
             cap.release()
         print("Resources released")
@@ -0,0 +1,97 @@
+# File: adaptive.py
+# Automatic framesize/quality selection from measured throughput
+# Every evaluation looks at achieved FPS, detection latency and the smallest face width,
+# and after `patience` agreeing evaluations steps quality or framesize by one notch.
+# A cooldown after each change keeps it from thrashing the stream with reconnects.
+
+import time
+
+from esp32cam import FRAMESIZES, QUALITY_MAX, QUALITY_MIN
+
+# Framesizes offered in the GUI (1 and 2 have an odd aspect ratio)
+LADDER = [0, 3, 4, 5, 6, 7, 8, 9, 10]
+
+
+class AdaptiveQuality:
+    def __init__(self, framesize: int=8, quality: int=10, target_fps: float=15.0, min_face_px: int=60,
+                 band: float=0.15, patience: int=3, cooldown: float=4.0, quality_step: int=5,
+                 best_quality: int=QUALITY_MIN, worst_quality: int=40, latency_budget: float=None):
+        self.framesize = framesize
+        self.quality = quality
+        self.target_fps = target_fps
+        self.min_face_px = min_face_px  # Faces narrower than this are at the edge of detection range
+        self.band = band  # Dead band around target_fps
+        self.patience = patience  # Consecutive evaluations that must agree before a change
+        self.cooldown = cooldown  # Seconds to ignore after a change while the stream settles
+        self.quality_step = quality_step
+        self.best_quality = best_quality
+        self.worst_quality = min(worst_quality, QUALITY_MAX)
+        self.latency_budget = latency_budget or 1.5 / target_fps
+        self._votes = 0  # >0 wants more quality/resolution, <0 wants less
+        self._last_change = 0.0
+        self.changes = 0
+
+    def _step(self, framesize, direction):
+        index = LADDER.index(framesize) if framesize in LADDER else LADDER.index(8)
+        index = min(max(index + direction, 0), len(LADDER) - 1)
+        return LADDER[index]
+
+    def evaluate(self, fps, detect_latency=None, face_width=None, now=None):
+        """Feed one measurement window, returns a dict of /control changes or None
+
+        fps: achieved frames per second (the slower of capture and detection)
+        detect_latency: seconds from frame arrival to detection result
+        face_width: narrowest detected face in px at the current framesize, None if no faces
+        """
+        now = time.monotonic() if now is None else now
+        if now - self._last_change < self.cooldown:
+            return None
+
+        too_slow = fps < self.target_fps * (1 - self.band) or \
+            (detect_latency is not None and detect_latency > self.latency_budget)
+        headroom = fps > self.target_fps * (1 + self.band) and \
+            (detect_latency is None or detect_latency < self.latency_budget * 0.7)
+        faces_small = face_width is not None and face_width < self.min_face_px
+
+        if too_slow:
+            vote = -1
+        elif headroom or (faces_small and fps >= self.target_fps):
+            vote = 1
+        else:
+            vote = 0
+        # Votes must agree in direction to accumulate
+        if vote == 0 or (self._votes and (vote > 0) != (self._votes > 0)):
+            self._votes = vote
+        else:
+            self._votes += vote
+        if abs(self._votes) < self.patience:
+            return None
+
+        changes = self._propose(self._votes > 0, face_width, faces_small)
+        self._votes = 0
+        if changes:
+            self._last_change = now
+            self.changes += 1
+            self.framesize = changes.get("framesize", self.framesize)
+            self.quality = changes.get("quality", self.quality)
+        return changes or None
+
+    def _propose(self, up, face_width, faces_small):
+        width = FRAMESIZES[self.framesize][0]
+        if up:
+            # Faces near the range limit: resolution first, otherwise spend headroom on JPEG quality
+            if not faces_small and self.quality > self.best_quality:
+                return {"quality": max(self.quality - self.quality_step, self.best_quality)}
+            larger = self._step(self.framesize, 1)
+            if larger != self.framesize:
+                return {"framesize": larger}
+            return {}
+        # Too slow: cheaper JPEGs first, then a smaller framesize if faces stay wide enough
+        if self.quality < self.worst_quality:
+            return {"quality": min(self.quality + self.quality_step, self.worst_quality)}
+        smaller = self._step(self.framesize, -1)
+        if smaller == self.framesize:
+            return {}
+        if face_width is not None and face_width * FRAMESIZES[smaller][0] / width < self.min_face_px:
+            return {}
+        return {"framesize": smaller}
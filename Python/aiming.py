@@ -0,0 +1,206 @@
+# File: aiming.py
+# Closed-loop face-to-servo aiming
+# Detections arrive at frame rate with a delay; the control loop runs at its own fixed rate,
+# predicts where the target is now (plus servo delay) and drives pan/tilt with a PID
+
+import collections
+import math
+import threading
+import time
+
+from detector import KNOWN_FACE_WIDTH
+
+
+class PID:
+    def __init__(self, kp: float, ki: float=0.0, kd: float=0.0, integral_limit: float=20.0):
+        self.kp, self.ki, self.kd = kp, ki, kd
+        self.integral_limit = integral_limit
+        self.reset()
+
+    def reset(self):
+        self.integral = 0.0
+        self.previous = None
+
+    def update(self, error, dt):
+        self.integral = min(max(self.integral + error * dt, -self.integral_limit), self.integral_limit)
+        derivative = 0.0 if self.previous is None or dt <= 0 else (error - self.previous) / dt
+        self.previous = error
+        return self.kp * error + self.ki * self.integral + self.kd * derivative
+
+
+class AlphaBeta:
+    """Position/velocity estimate of the target angle from delayed, irregular measurements"""
+
+    def __init__(self, alpha: float=0.6, beta: float=0.2):
+        self.alpha, self.beta = alpha, beta
+        self.position = None
+        self.velocity = 0.0
+        self.time = None
+
+    def reset(self):
+        self.position = None
+        self.velocity = 0.0
+        self.time = None
+
+    def update(self, measurement, t):
+        if self.position is None:
+            self.position, self.time = measurement, t
+            return
+        dt = t - self.time
+        if dt <= 0:
+            return
+        predicted = self.position + self.velocity * dt
+        residual = measurement - predicted
+        self.position = predicted + self.alpha * residual
+        self.velocity += self.beta * residual / dt
+        self.time = t
+
+    def predict(self, t):
+        return self.position + self.velocity * (t - self.time)
+
+
+class AimController:
+    """Turns DetectionRecords into pan/tilt servo commands at a fixed control rate
+
+    servo: ServoController (set_position, latency)
+    focal_length: calibrated focal length in px for the current framesize, None uses fov
+    camera_on_turret: pixel error is relative to where the servos pointed when the frame was taken
+    """
+
+    def __init__(self, servo, focal_length=None, fov: float=60.0, rate: float=50.0,
+                 pan_servo: int=0, tilt_servo: int=1, center=(90.0, 90.0), invert=(False, True),
+                 limits=((0, 180), (0, 180)), camera_on_turret: bool=True, camera_latency: float=0.08,
+                 lost_timeout: float=0.7, max_speed: float=240.0, gains=(0.9, 0.05, 0.02),
+                 face_width: float=KNOWN_FACE_WIDTH):
+        self.servo = servo
+        self.focal_length = focal_length
+        self.fov = fov
+        self.rate = rate
+        self.axes = (pan_servo, tilt_servo)
+        self.center = center
+        self.invert = invert
+        self.limits = limits
+        self.camera_on_turret = camera_on_turret
+        self.camera_latency = camera_latency  # Sensor exposure to frame arrival, not measurable here
+        self.lost_timeout = lost_timeout
+        self.max_speed = max_speed  # deg/s slew limit on commands
+        self.face_width = face_width
+
+        self.pids = [PID(*gains), PID(*gains)]
+        self.estimators = [AlphaBeta(), AlphaBeta()]
+        self.command = list(center)
+        self._sent = [None, None]
+        self._history = collections.deque()  # (time, pan, tilt) commands, for pointing at frame time
+        self._last_seen = 0.0
+        self._lock = threading.Lock()
+
+        # Stats
+        self.detection_delay = 0.0  # frame arrival -> detection record, smoothed
+        self.target = None  # (x, y, w, h, distance) last chosen target
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+        self._thread = None
+
+    def set_focal_length(self, focal_length):
+        self.focal_length = focal_length
+
+    def servo_delay(self):
+        latency = self.servo.latency() if hasattr(self.servo, "latency") else (None, None)
+        send, round_trip = latency
+        if round_trip is not None:
+            return round_trip / 2
+        return send or 0.0
+
+    # Detection side
+    def on_detections(self, record):
+        """DetectionBus subscriber: pick the closest face and update the target estimate"""
+        if len(record.boxes) == 0:
+            return
+        width, height = record.frame_size
+        focal = self.focal_length or (width / 2) / math.tan(math.radians(self.fov / 2))
+        if record.distances and len(record.distances) == len(record.boxes):
+            distances = record.distances
+        else:
+            distances = [self.face_width * focal / max(w, 1) for w in record.boxes[:, 2]]
+        index = min(range(len(distances)), key=lambda i: distances[i])
+        x, y, w, h = (int(v) for v in record.boxes[index])
+        self.target = (x, y, w, h, distances[index])
+
+        # Pixel error -> angle error through the pinhole model
+        error = (math.degrees(math.atan((x + w / 2 - width / 2) / focal)),
+                 math.degrees(math.atan((y + h / 2 - height / 2) / focal)))
+        captured = record.timestamp - self.camera_latency
+        self.detection_delay = 0.9 * self.detection_delay + 0.1 * record.latency
+        pointing = self._pointing_at(captured) if self.camera_on_turret else self.center
+        with self._lock:
+            for axis in (0, 1):
+                sign = -1.0 if self.invert[axis] else 1.0
+                self.estimators[axis].update(pointing[axis] + sign * error[axis], captured)
+            self._last_seen = time.monotonic()
+
+    def _pointing_at(self, t):
+        # Commands take servo_delay to land, so the camera pointed at the command sent that long before t
+        t -= self.servo_delay()
+        with self._lock:
+            for stamp, pan, tilt in reversed(self._history):
+                if stamp <= t:
+                    return pan, tilt
+            return tuple(self.command)
+
+    # Control side
+    def _run(self):
+        period = 1.0 / self.rate
+        next_time = time.monotonic()
+        previous = next_time
+        while not self._stop_event.is_set():
+            now = time.monotonic()
+            self.step(now - previous)
+            previous = now
+            next_time += period
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                self._stop_event.wait(delay)
+            else:
+                next_time = time.monotonic()
+
+    def step(self, dt):
+        now_wall = time.time()
+        with self._lock:
+            if time.monotonic() - self._last_seen > self.lost_timeout or self.estimators[0].position is None:
+                # Target lost, hold position and forget the motion model
+                for estimator, pid in zip(self.estimators, self.pids):
+                    estimator.reset()
+                    pid.reset()
+                return
+            # Aim where the target will be when this command takes effect
+            lead = now_wall + self.servo_delay()
+            goals = [self.estimators[axis].predict(lead) for axis in (0, 1)]
+
+        for axis in (0, 1):
+            low, high = self.limits[axis]
+            goal = min(max(goals[axis], low), high)
+            # PID output is the command increment for this tick, slew limited
+            change = self.pids[axis].update(goal - self.command[axis], dt)
+            limit = self.max_speed * dt
+            self.command[axis] = min(max(self.command[axis] + min(max(change, -limit), limit), low), high)
+            angle = int(round(self.command[axis]))
+            if angle != self._sent[axis]:
+                self.servo.set_position(self.axes[axis], angle)
+                self._sent[axis] = angle
+        with self._lock:
+            self._history.append((now_wall, self.command[0], self.command[1]))
+            # A couple of seconds is far more than any pipeline delay
+            while self._history and now_wall - self._history[0][0] > 2.0:
+                self._history.popleft()
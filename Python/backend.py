@@ -3,6 +3,13 @@
 # File will contain different servo functions
 # Backend recieves data and sends it directly to ESP which sends to ARDUINO
 
+import collections
+import math
+import select
+import socket
+import threading
+import time
+
 class Servo:
     def __init__(self, id, angle, num_sources=3):
         self.id = id
@@ -39,3 +46,347 @@ class Servo:
             print("Backend: Disconnected.")
         return True  
     
+
+
+# Command framing understood by the ESP32 port 100 bridge and ArduinoServo.ino
+HEARTBEAT = b"{Heartbeat}"
+
+
+class ServoController:
+    """Persistent connection to the ESP32 bridge that relays {...} frames to the Arduino
+
+    Commands are queued and written as soon as the socket is writable, without waiting for
+    replies, so several moves can be in flight. A single IO thread handles reconnects,
+    the one second {Heartbeat} the firmware expects, and latency bookkeeping.
+    """
+
+    def __init__(self, host="10.0.0.15", port=100, num_servos=2, heartbeat_interval=1.0,
+                 connect_timeout=2.0, backoff_max=2.0, max_pending=256):
+        self.host = host
+        self.port = port
+        self.num_servos = num_servos
+        self.heartbeat_interval = heartbeat_interval
+        self.connect_timeout = connect_timeout
+        self.backoff_max = backoff_max
+        self.positions = [None] * num_servos
+
+        self._pending = collections.deque(maxlen=max_pending)  # (frame bytes, queued time, command count)
+        self._in_flight = collections.deque(maxlen=max_pending)  # send times awaiting a reply
+        self._lock = threading.Lock()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._sock = None
+        self._stop_event = threading.Event()
+        self._thread = None
+        # callback() after every reconnect, run on the IO thread; the ESP32 may have rebooted
+        self.reconnect_callbacks = []
+
+        # Stats
+        self.connected = False
+        self.reconnects = 0
+        self.commands_sent = 0
+        self.send_latency = collections.deque(maxlen=200)  # queue -> socket, seconds
+        self.round_trip = collections.deque(maxlen=200)  # send -> '}' framed reply, seconds
+        self.last_bridge_heartbeat = 0.0
+
+    def connect(self):
+        """Start the IO thread, it keeps (re)connecting until disconnect()"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def disconnect(self):
+        self._stop_event.set()
+        self._wake()
+        if self._thread is not None:
+            self._thread.join(timeout=self.connect_timeout + 1)
+        self._thread = None
+        return True
+
+    # Commands
+    def send(self, command):
+        """Queue a raw command, e.g. 'S1:90', framed as {S1:90}"""
+        with self._lock:
+            self._pending.append((("{" + command + "}").encode(), time.monotonic(), 1))
+        self._wake()
+        return self.connected
+
+    def send_batch(self, commands):
+        """Queue several commands as one entry, they leave in a single socket write"""
+        if not commands:
+            return self.connected
+        frames = "".join("{" + command + "}" for command in commands).encode()
+        with self._lock:
+            self._pending.append((frames, time.monotonic(), len(commands)))
+        self._wake()
+        return self.connected
+
+    def set_position(self, servo_id, angle):
+        """Move one servo, servo_id is 0 based like the GUI sliders"""
+        if not 0 <= servo_id < self.num_servos:
+            return False
+        angle = int(min(max(angle, 0), 180))
+        self.positions[servo_id] = angle
+        return self.send(f"S{servo_id + 1}:{angle}")
+
+    def set_all(self, angle):
+        angle = int(min(max(angle, 0), 180))
+        self.positions = [angle] * self.num_servos
+        return self.send(f"A:{angle}")
+
+    def center_all(self):
+        return self.set_all(90)
+
+    def reset_all(self):
+        return self.set_all(0)
+
+    def latency(self):
+        """Median send and round-trip latency in seconds, None when not measured yet"""
+        def median(samples):
+            return sorted(samples)[len(samples) // 2] if samples else None
+        return median(list(self.send_latency)), median(list(self.round_trip))
+
+    # IO thread
+    def _wake(self):
+        try:
+            self._wake_w.send(b"\0")
+        except OSError:
+            pass
+
+    def _open(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.connect_timeout)
+        # Small frames must leave immediately, not wait for Nagle
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setblocking(False)
+        return sock
+
+    def _run(self):
+        delay = 0.0
+        while not self._stop_event.is_set():
+            connected_at = None
+            try:
+                self._sock = self._open()
+                self.connected = True
+                connected_at = self.last_bridge_heartbeat = time.monotonic()
+                print(f"Backend: connected to servo bridge {self.host}:{self.port}")
+                if self.reconnects:
+                    for callback in self.reconnect_callbacks:
+                        callback()
+                self._serve(self._sock)
+            except OSError as e:
+                if not self._stop_event.is_set():
+                    print(f"Backend: servo bridge error: {e}")
+            self.connected = False
+            if self._sock is not None:
+                self._sock.close()
+                self._sock = None
+            self._in_flight.clear()
+            if self._stop_event.is_set():
+                break
+            self.reconnects += 1
+            # Back off unless the last connection was healthy for a while
+            if connected_at is not None and time.monotonic() - connected_at > 2 * self.heartbeat_interval:
+                delay = 0.0
+            self._stop_event.wait(delay)
+            delay = min(max(delay * 2, 0.1), self.backoff_max)
+
+    def _serve(self, sock):
+        read_buff = bytearray()
+        next_heartbeat = time.monotonic()
+        while not self._stop_event.is_set():
+            now = time.monotonic()
+            timeout = max(next_heartbeat - now, 0)
+            readable, _, _ = select.select([sock, self._wake_r], [], [], timeout)
+            if self._wake_r in readable:
+                self._wake_r.recv(4096)
+            if sock in readable:
+                data = sock.recv(4096)
+                if not data:
+                    raise ConnectionError("bridge closed the connection")
+                read_buff += data
+                self._handle_replies(read_buff)
+
+            now = time.monotonic()
+            frames = []
+            sent = 0
+            with self._lock:
+                while self._pending:
+                    frame, queued, count = self._pending.popleft()
+                    frames.append(frame)
+                    sent += count
+                    self.send_latency.append(now - queued)
+            if now >= next_heartbeat:
+                frames.append(HEARTBEAT)
+                next_heartbeat = now + self.heartbeat_interval
+            if frames:
+                # One write for everything queued, replies are not waited for. A bridge that stops
+                # reading must not hang this thread, the heartbeat checks below depend on it
+                sock.settimeout(self.connect_timeout)
+                try:
+                    sock.sendall(b"".join(frames))
+                except socket.timeout:
+                    raise ConnectionError("bridge stopped reading commands")
+                finally:
+                    sock.setblocking(False)
+                self.commands_sent += sent
+                self._in_flight.extend([now] * sent)
+
+            # Firmware drops us after 3 missed heartbeats, do the same in the other direction
+            if now - self.last_bridge_heartbeat > 3.5 * self.heartbeat_interval:
+                raise ConnectionError("no heartbeat from bridge")
+
+    def _handle_replies(self, read_buff):
+        while True:
+            end = read_buff.find(b"}")
+            if end < 0:
+                return
+            start = read_buff.rfind(b"{", 0, end)
+            frame = bytes(read_buff[start:end + 1]) if start >= 0 else b""
+            del read_buff[:end + 1]
+            if frame == HEARTBEAT:
+                self.last_bridge_heartbeat = time.monotonic()
+            elif self._in_flight:
+                # The Arduino answers in order, pair the reply with the oldest command
+                self.round_trip.append(time.monotonic() - self._in_flight.popleft())
+
+
+class ServoScheduler:
+    """Fixed-rate trajectory scheduler in front of a ServoController
+
+    set_target() only records the newest target per servo, so slider drags and per-frame
+    aiming coalesce (latest wins). Every tick each servo's setpoint moves toward its target
+    within max_velocity (deg/s) and max_acceleration (deg/s^2), and the servos whose whole
+    degree changed go out together in one write: at most `rate` updates per second on the link.
+    ArduinoServo.ino has no multi-axis command, so an update is the per-servo S<n>:<angle>
+    frames back to back.
+    """
+
+    def __init__(self, controller, rate: float=50.0, max_velocity: float=300.0, max_acceleration: float=3000.0):
+        self.controller = controller
+        self.num_servos = controller.num_servos
+        self.rate = rate
+        self.max_velocity = max_velocity  # None for no limit
+        self.max_acceleration = max_acceleration  # None for no limit
+        self.targets = [None] * self.num_servos
+        self.setpoints = [None] * self.num_servos  # Smoothed position, float degrees
+        self.velocities = [0.0] * self.num_servos
+        self._sent = [None] * self.num_servos
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        # Stats
+        self.requests = 0  # set_target calls
+        self.updates = 0  # combined writes
+
+    @property
+    def positions(self):
+        return list(self._sent)
+
+    @property
+    def connected(self):
+        return self.controller.connected
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+        self._thread = None
+
+    def set_target(self, servo_id, angle):
+        if not 0 <= servo_id < self.num_servos:
+            return False
+        with self._lock:
+            self.targets[servo_id] = float(min(max(angle, 0), 180))
+            self.requests += 1
+        return self.connected
+
+    # Same calls as ServoController, so either can drive the GUIs and AimController
+    set_position = set_target
+
+    def set_all(self, angle):
+        for servo_id in range(self.num_servos):
+            self.set_target(servo_id, angle)
+        return self.connected
+
+    def center_all(self):
+        return self.set_all(90)
+
+    def reset_all(self):
+        return self.set_all(0)
+
+    def latency(self):
+        # A command waits half a tick on average before it is sent
+        send, round_trip = self.controller.latency()
+        if send is not None:
+            send += 0.5 / self.rate
+        return send, round_trip
+
+    def _run(self):
+        period = 1.0 / self.rate
+        next_time = time.monotonic()
+        while not self._stop_event.is_set():
+            self.step(period)
+            next_time += period
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                self._stop_event.wait(delay)
+            else:
+                next_time = time.monotonic()
+
+    def step(self, dt):
+        """Advance every servo one tick and send the ones that moved, returns the commands sent"""
+        commands = []
+        with self._lock:
+            for servo_id in range(self.num_servos):
+                target = self.targets[servo_id]
+                if target is None:
+                    continue
+                angle = int(round(self._advance(servo_id, target, dt)))
+                if angle != self._sent[servo_id]:
+                    commands.append(f"S{servo_id + 1}:{angle}")
+                    self._sent[servo_id] = angle
+        if commands:
+            if not self.controller.connected:
+                # Nothing queues up while the bridge is down, the newest targets go out on reconnect
+                with self._lock:
+                    self._sent = [None] * self.num_servos
+                return []
+            self.controller.send_batch(commands)
+            self.updates += 1
+        return commands
+
+    def _advance(self, servo_id, target, dt):
+        position = self.setpoints[servo_id]
+        if position is None or self.max_velocity is None:
+            # First command has no known start, go straight there
+            self.setpoints[servo_id] = target
+            self.velocities[servo_id] = 0.0
+            return target
+        error = target - position
+        velocity = self.velocities[servo_id]
+        # Fastest speed that can still stop at the target
+        speed = self.max_velocity
+        if self.max_acceleration is not None:
+            speed = min(speed, math.sqrt(2.0 * self.max_acceleration * abs(error)))
+        desired = math.copysign(speed, error)
+        if self.max_acceleration is not None:
+            step = self.max_acceleration * dt
+            velocity = min(max(desired, velocity - step), velocity + step)
+        else:
+            velocity = desired
+        position += velocity * dt
+        if (target - position) * error <= 0:
+            # Reached or passed the target this tick
+            position, velocity = target, 0.0
+        self.setpoints[servo_id] = position
+        self.velocities[servo_id] = velocity
+        return position
@@ -0,0 +1,248 @@
+# File: benchmark.py
+# Replays recorded frames through the same stages as run_camera / ESP32CameraApp.video_loop
+# and reports per-stage latency percentiles and sustained FPS for each ESP32 framesize
+# Usage: python benchmark.py --source session.mjpeg --framesizes 4 6 8 10 --output bench.json
+#        python benchmark.py --source frames/ --budget detect=40 --baseline last.json
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+import PIL.Image, PIL.ImageTk
+
+from esp32cam import FRAMESIZES, PART_BOUNDARY
+from mjpeg import REDUCTIONS, MJPEGParser, decode_gray, decode_jpeg
+from recording import ReplaySource
+from simulator import esp_quality_to_cv2
+
+STAGES = ["grab", "decode", "gray", "equalize", "decode_gray", "detect", "draw", "rgb", "pil", "tk"]
+
+_PART_HEADER = "\r\n--" + PART_BOUNDARY + "\r\nContent-Type: image/jpeg\r\nContent-Length: {}\r\n\r\n"
+
+
+def load_frames(source, limit=None):
+    """Read BGR frames from a raw multipart dump, image directory/glob or video file"""
+    frames = []
+    if os.path.isdir(source) or any(c in source for c in "*?["):
+        pattern = os.path.join(source, "*.jpg") if os.path.isdir(source) else source
+        for path in sorted(glob.glob(pattern)):
+            frames.append(cv2.imread(path))
+            if limit and len(frames) >= limit:
+                break
+    elif source.endswith(".mjr"):
+        # Indexed recording from recording.py, every part in order
+        replay = ReplaySource(source, realtime=False)
+        while not limit or len(frames) < limit:
+            part = replay.read_jpeg()
+            if part is None:
+                break
+            frames.append(decode_jpeg(part.jpeg))
+        replay.release()
+    elif source.endswith((".mjpeg", ".mjpg")):
+        # e.g. curl http://10.0.0.15:81/stream > session.mjpeg
+        parser = MJPEGParser()
+        with open(source, "rb") as f:
+            while not limit or len(frames) < limit:
+                data = f.read(1 << 20)
+                if not data:
+                    break
+                for jpeg, _ in parser.feed(data):
+                    frames.append(cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR))
+    else:
+        cap = cv2.VideoCapture(source)
+        while not limit or len(frames) < limit:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            frames.append(frame)
+        cap.release()
+    frames = [f for f in frames if f is not None]
+    return frames[:limit] if limit else frames
+
+
+def encode_stream(frames, framesize, quality):
+    """Re-encode frames at a framesize/quality the way the camera would send them"""
+    width, height = FRAMESIZES[framesize]
+    params = [cv2.IMWRITE_JPEG_QUALITY, esp_quality_to_cv2(quality)]
+    chunks = []
+    for frame in frames:
+        if frame.shape[1] != width or frame.shape[0] != height:
+            frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+        jpeg = cv2.imencode(".jpg", frame, params)[1].tobytes()
+        chunks.append(_PART_HEADER.format(len(jpeg)).encode() + jpeg)
+    return chunks
+
+
+def summarize(samples):
+    """Latency summary in milliseconds"""
+    if not samples:
+        return None
+    ms = np.asarray(samples) * 1000.0
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"p50": round(float(p50), 3), "p95": round(float(p95), 3), "p99": round(float(p99), 3),
+            "mean": round(float(ms.mean()), 3), "max": round(float(ms.max()), 3), "n": int(ms.size)}
+
+
+def run_pipeline(chunks, classifier, tk_root=None, repeat=1, reduction=2):
+    """Time every stage for each frame, return per-stage samples and sustained FPS
+
+    decode_gray is the Pipeline's detection path (reduced grayscale decode + equalize) timed in
+    a separate pass after the FPS run, to compare against decode + gray + equalize of the original loop
+    """
+    samples = {stage: [] for stage in STAGES}
+    parser = MJPEGParser()
+    clock = time.perf_counter
+    frames = 0
+    start = clock()
+    for _ in range(repeat):
+        for chunk in chunks:
+            t0 = clock()
+            parts = parser.feed(chunk)
+            t1 = clock()
+            samples["grab"].append(t1 - t0)
+            if not parts:
+                continue
+            frame = cv2.imdecode(np.frombuffer(parts[-1][0], np.uint8), cv2.IMREAD_COLOR)
+            t2 = clock()
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            t3 = clock()
+            gray = cv2.equalizeHist(gray)
+            t4 = clock()
+            faces = classifier.detectMultiScale(gray)
+            t5 = clock()
+            for (x, y, w, h) in faces:
+                cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 255, 0), 4)
+                cv2.putText(frame, "Distance: 0.00 cm", (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            t6 = clock()
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            t7 = clock()
+            image = PIL.Image.fromarray(rgb)
+            t8 = clock()
+            if tk_root is not None:
+                PIL.ImageTk.PhotoImage(image=image, master=tk_root)
+                samples["tk"].append(clock() - t8)
+            for stage, a, b in (("decode", t1, t2), ("gray", t2, t3), ("equalize", t3, t4),
+                                ("detect", t4, t5), ("draw", t5, t6), ("rgb", t6, t7), ("pil", t7, t8)):
+                samples[stage].append(b - a)
+            frames += 1
+    elapsed = clock() - start
+    # Separate pass so the alternative path does not count against the original loop's FPS
+    parser.reset()
+    for _ in range(repeat):
+        for chunk in chunks:
+            for jpeg, _ in parser.feed(chunk)[-1:]:
+                t0 = clock()
+                reduced = decode_gray(jpeg, reduction)
+                cv2.equalizeHist(reduced, dst=reduced)
+                samples["decode_gray"].append(clock() - t0)
+    return samples, (frames / elapsed if elapsed > 0 else 0.0)
+
+
+def check(results, budgets, baseline=None, tolerance=0.2):
+    """List p95 budget violations and regressions against a previous results file"""
+    problems = []
+    for framesize, result in results["framesizes"].items():
+        for stage, stats in result["stages"].items():
+            if stats is None:
+                continue
+            budget = budgets.get(stage)
+            if budget is not None and stats["p95"] > budget:
+                problems.append(f"framesize {framesize} {stage}: p95 {stats['p95']:.2f} ms > budget {budget:.2f} ms")
+            if baseline:
+                old = baseline.get("framesizes", {}).get(framesize, {}).get("stages", {}).get(stage)
+                if old and stats["p95"] > old["p95"] * (1 + tolerance):
+                    problems.append(f"framesize {framesize} {stage}: p95 {stats['p95']:.2f} ms regressed from {old['p95']:.2f} ms")
+        if baseline:
+            old = baseline.get("framesizes", {}).get(framesize)
+            if old and result["fps"] < old["fps"] * (1 - tolerance):
+                problems.append(f"framesize {framesize}: {result['fps']:.1f} FPS regressed from {old['fps']:.1f} FPS")
+    return problems
+
+
+def parse_budgets(values):
+    budgets = {}
+    for item in values or []:
+        if os.path.isfile(item):
+            with open(item) as f:
+                budgets.update({k: float(v) for k, v in json.load(f).items()})
+            continue
+        stage, _, ms = item.partition("=")
+        if stage not in STAGES or not ms:
+            raise ValueError(f"Bad budget '{item}', expected stage=ms with stage in {STAGES}")
+        budgets[stage] = float(ms)
+    return budgets
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage pipeline benchmark")
+    parser.add_argument("--source", required=True, help=".mjpeg stream dump, image directory/glob or video file")
+    parser.add_argument("--framesizes", type=int, nargs="+", default=sorted(FRAMESIZES))
+    parser.add_argument("--quality", type=int, default=10, help="ESP32 JPEG quality used when re-encoding")
+    parser.add_argument("--frames", type=int, default=200, help="max frames loaded from the source")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--cascade", default=cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+    parser.add_argument("--no-tk", action="store_true", help="skip PhotoImage conversion")
+    parser.add_argument("--reduction", type=int, choices=REDUCTIONS, default=2,
+                        help="scale divisor for the decode_gray stage")
+    parser.add_argument("--budget", action="append", help="stage=ms p95 budget, or a JSON file of them")
+    parser.add_argument("--baseline", help="previous results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression vs baseline")
+    parser.add_argument("--output", default="-", help="results JSON path, '-' for stdout")
+    args = parser.parse_args()
+
+    classifier = cv2.CascadeClassifier(args.cascade)
+    if classifier.empty():
+        print(f"Failed to load face classifier {args.cascade}", file=sys.stderr)
+        return 2
+    frames = load_frames(args.source, args.frames)
+    if not frames:
+        print(f"No frames in {args.source}", file=sys.stderr)
+        return 2
+
+    tk_root = None
+    if not args.no_tk:
+        try:
+            import tkinter as tk
+            tk_root = tk.Tk()
+            tk_root.withdraw()
+        except Exception as e:
+            print(f"Tk unavailable, skipping PhotoImage stage: {e}", file=sys.stderr)
+
+    results = {"source": args.source, "frames": len(frames), "repeat": args.repeat,
+               "quality": args.quality, "opencv": cv2.__version__, "time": time.time(), "framesizes": {}}
+    for framesize in args.framesizes:
+        width, height = FRAMESIZES[framesize]
+        chunks = encode_stream(frames, framesize, args.quality)
+        samples, fps = run_pipeline(chunks, classifier, tk_root, args.repeat, args.reduction)
+        results["framesizes"][str(framesize)] = {
+            "width": width, "height": height, "fps": round(fps, 2),
+            "jpeg_bytes": int(np.mean([len(c) for c in chunks])),
+            "stages": {stage: summarize(samples[stage]) for stage in STAGES},
+        }
+        print(f"framesize {framesize} ({width}x{height}): {fps:.1f} FPS", file=sys.stderr)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    problems = check(results, parse_budgets(args.budget), baseline, args.tolerance)
+    results["violations"] = problems
+
+    text = json.dumps(results, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w") as f:
+            f.write(text)
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+# File: calibration.py
+# Distance calibration: focal length from many frames of a face at a known distance
+# Results are kept per framesize in a JSON profile. A framesize that was never calibrated gets
+# the nearest calibrated focal length scaled by the width ratio, since every OV2640 framesize
+# is the full sensor field of view scaled down.
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+
+import numpy as np
+
+from detector import KNOWN_FACE_WIDTH
+from esp32cam import FRAMESIZES
+
+CALIBRATION_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "focal_profile.json")
+
+
+def framesize_of(frame_size):
+    """framesize_t index for a (width, height), None for sizes the camera does not produce"""
+    for index, size in FRAMESIZES.items():
+        if tuple(size) == tuple(frame_size):
+            return index
+    return None
+
+
+class CalibrationError(Exception):
+    """Raised when not enough consistent face measurements were collected"""
+
+
+class FocalProfile:
+    """Calibrated focal lengths in px keyed by framesize index, persisted as JSON"""
+
+    def __init__(self, path: str=CALIBRATION_FILE, focal_lengths=None):
+        self.path = path
+        self.focal_lengths = dict(focal_lengths or {})
+
+    @classmethod
+    def load(cls, path: str=CALIBRATION_FILE):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            return cls(path, {int(k): float(v) for k, v in data.get("focal_lengths", {}).items()})
+        except (OSError, ValueError):
+            return cls(path)
+
+    def save(self):
+        with open(self.path, "w") as f:
+            json.dump({"focal_lengths": {str(k): v for k, v in sorted(self.focal_lengths.items())}}, f, indent=2)
+
+    def set(self, framesize, focal_length):
+        self.focal_lengths[framesize] = float(focal_length)
+
+    def focal_for(self, framesize):
+        """Measured value for this framesize, else the closest calibrated one rescaled, None if none"""
+        if framesize is None or not self.focal_lengths:
+            return None
+        if framesize in self.focal_lengths:
+            return self.focal_lengths[framesize]
+        width = FRAMESIZES[framesize][0]
+        source = min(self.focal_lengths, key=lambda k: abs(FRAMESIZES[k][0] - width))
+        return self.focal_lengths[source] * width / FRAMESIZES[source][0]
+
+
+class Calibrator:
+    """Collects face widths from DetectionRecords and resolves `result` with (framesize, focal_length)
+
+    Subscribe on_detections to the DetectionBus; runs on the detect worker, never blocks it.
+    Only fresh records (the detector ran on that frame, the boxes were not reused by the motion
+    gate or moved by the tracker) with exactly one face count, and widths further than `outlier_mads` median
+    absolute deviations from the median are discarded before averaging.
+    """
+
+    def __init__(self, known_distance: float, face_width: float=KNOWN_FACE_WIDTH, frames: int=30,
+                 min_frames: int=10, timeout: float=10.0, outlier_mads: float=3.0):
+        self.known_distance = known_distance
+        self.face_width = face_width
+        self.frames = frames
+        self.min_frames = min_frames
+        self.timeout = timeout
+        self.outlier_mads = outlier_mads
+        self.result = Future()
+        self.widths = []
+        self.frame_size = None
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def on_detections(self, record):
+        if self.result.done():
+            return
+        with self._lock:
+            if record.frame_size != self.frame_size:
+                # Resolution changed under us, widths from before are on another scale
+                self.frame_size = record.frame_size
+                self.widths = []
+            if record.fresh and len(record.boxes) == 1:
+                self.widths.append(float(record.boxes[0][2]))
+            timed_out = time.monotonic() - self._started > self.timeout
+            if len(self.widths) < self.frames and not timed_out:
+                return
+            widths = np.asarray(self.widths)
+        try:
+            self.result.set_result((framesize_of(self.frame_size), self._focal_length(widths)))
+        except CalibrationError as e:
+            self.cancel(str(e))
+        except InvalidStateError:
+            pass
+
+    def cancel(self, reason: str="no detections arrived"):
+        """Fail the calibration unless it already finished, e.g. when the stream is down"""
+        try:
+            self.result.set_exception(CalibrationError(reason))
+        except InvalidStateError:
+            pass
+
+    def _focal_length(self, widths):
+        if len(widths) < self.min_frames:
+            raise CalibrationError(f"only {len(widths)} frames with a single face")
+        median = np.median(widths)
+        mad = np.median(np.abs(widths - median)) * 1.4826  # Scaled to a standard deviation
+        inliers = widths[np.abs(widths - median) <= self.outlier_mads * max(mad, 1.0)]
+        if len(inliers) < self.min_frames:
+            raise CalibrationError(f"face width too unsteady ({len(inliers)} of {len(widths)} frames consistent)")
+        return float(inliers.mean()) * self.known_distance / self.face_width
@@ -0,0 +1,175 @@
+# File: camera_control.py
+# Non-blocking client for the camera's /control and /status endpoints
+# Keeps one pooled HTTP connection and runs requests on a worker thread, so the Tk loop never waits.
+# A batch of /control changes is confirmed by polling /status instead of sleeping a fixed time.
+# CameraSettings mirrors the sensor state, so only settings that actually differ are sent.
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+SETTINGS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "camera_settings.json")
+
+# Changing these leaves frames of the old size queued in the camera and the socket, the
+# stream has to be reopened. Quality, AWB and the other sensor values apply in place.
+RESTART_SETTINGS = frozenset({"framesize"})
+
+
+class CameraControlError(Exception):
+    """Raised when the camera rejects a setting or never reports it as applied"""
+
+
+def needs_restart(changes):
+    """True if applying `changes` (as returned by CameraControl.apply) calls for a stream restart"""
+    return not RESTART_SETTINGS.isdisjoint(changes)
+
+
+class CameraSettings:
+    """Local model of the camera's /status values, persisted as JSON between runs
+
+    `known` stays False until /status was read in this run; until then the values are the ones
+    saved by the previous run, good for showing in the GUI but not trusted for skipping calls.
+    """
+
+    def __init__(self, path: str=SETTINGS_FILE, values=None):
+        self.path = path
+        self.values = dict(values or {})
+        self.known = False
+        self._saved = dict(self.values)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str=SETTINGS_FILE):
+        try:
+            with open(path) as f:
+                return cls(path, {k: int(v) for k, v in json.load(f).items()})
+        except (OSError, ValueError, AttributeError):
+            return cls(path)
+
+    def save(self):
+        """Write the values if they changed since the last save"""
+        with self._lock:
+            values = dict(self.values)
+        if self.path is None or values == self._saved:
+            return
+        self._saved = values
+        try:
+            with open(self.path, "w") as f:
+                json.dump(values, f, indent=2, sort_keys=True)
+        except OSError as e:
+            print(f"Could not save camera settings: {e}")
+
+    def get(self, var, default=None):
+        return self.values.get(var, default)
+
+    def seed(self, status):
+        """Take every numeric value from a /status response"""
+        values = {k: int(v) for k, v in status.items() if isinstance(v, (int, float))}
+        with self._lock:
+            self.known = True
+            self.values = values
+        self.save()
+
+    def diff(self, settings):
+        """The subset of settings that differ from the camera's state, all of them if it is unknown"""
+        with self._lock:
+            return {var: int(val) for var, val in settings.items()
+                    if not self.known or self.values.get(var) != int(val)}
+
+    def invalidate(self):
+        """Stop trusting the cache until /status is read again, e.g. after the camera rebooted"""
+        self.known = False
+
+    def update(self, settings):
+        with self._lock:
+            self.values.update({var: int(val) for var, val in settings.items()})
+
+
+class CameraControl:
+    def __init__(self, url: str, timeout: float=2.0, confirm_timeout: float=5.0, poll_interval: float=0.05,
+                 settings=None):
+        self.url = url
+        self.settings = settings if settings is not None else CameraSettings.load()
+        self.timeout = timeout  # Per request
+        self.confirm_timeout = confirm_timeout  # For /status to show the new values
+        self.poll_interval = poll_interval
+        self.session = requests.Session()
+        # A single worker keeps batches in the order they were requested
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="camera-control")
+        self.control_calls = 0
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
+
+    def watch(self, connection):
+        """Re-read /status before the next apply() whenever `connection` reconnects
+
+        connection: anything with reconnect_callbacks (MJPEGStream, SnapshotSource, ServoController);
+        a brown-out resets the sensor to its defaults while the stream quietly comes back
+        """
+        callbacks = getattr(connection, "reconnect_callbacks", None)
+        if callbacks is not None and self.settings.invalidate not in callbacks:
+            callbacks.append(self.settings.invalidate)
+        return connection
+
+    def status(self):
+        """GET /status on the calling thread, refreshes `settings`"""
+        response = self.session.get(self.url + "/status", timeout=self.timeout)
+        response.raise_for_status()
+        status = response.json()
+        self.settings.seed(status)
+        return status
+
+    def apply(self, confirm: bool=True, **settings):
+        """Send the var=val pairs that differ from the camera's state in one background operation
+
+        Returns a Future resolving to the dict of changes actually sent (empty if the camera
+        already had every value) once they are in effect; pass it to needs_restart().
+        e.g. control.apply(framesize=8, quality=12).add_done_callback(...)
+        """
+        return self.executor.submit(self._apply, settings, confirm)
+
+    def fetch_status(self):
+        """/status on the worker thread, as a Future"""
+        return self.executor.submit(self.status)
+
+    def _apply(self, settings, confirm):
+        if not self.settings.known:
+            try:
+                self.status()
+            except (requests.RequestException, ValueError):
+                pass  # Send everything below
+        changes = self.settings.diff(settings)
+        for var, val in changes.items():
+            self.control_calls += 1
+            response = self.session.get(self.url + "/control", params={"var": var, "val": val},
+                                        timeout=self.timeout)
+            if response.status_code != 200:
+                raise CameraControlError(f"/control {var}={val} failed with HTTP {response.status_code}")
+            self.settings.update({var: val})
+        if changes:
+            if confirm:
+                self._confirm(changes)
+            else:
+                self.settings.save()
+        return changes
+
+    def _confirm(self, settings):
+        deadline = time.monotonic() + self.confirm_timeout
+        while True:
+            try:
+                status = self.status()
+                if all(status.get(var) == int(val) for var, val in settings.items()):
+                    return status
+            except (requests.RequestException, ValueError):
+                # Camera may be busy reconfiguring the sensor, keep polling
+                status = None
+            if time.monotonic() >= deadline:
+                raise CameraControlError(f"camera did not confirm {settings} (last status {status})")
+            time.sleep(self.poll_interval)
@@ -0,0 +1,125 @@
+# File: detector.py
+# Face detectors behind a single detect(gray) -> boxes call
+# Boxes are always an (N, 4) int array of x, y, w, h in the coordinates of the image passed in
+
+import json
+from dataclasses import asdict, dataclass, replace
+
+import cv2
+import numpy as np
+
+NO_FACES = np.empty((0, 4), dtype=np.int32)
+
+KNOWN_FACE_WIDTH = 14.3  # Average human face width in cm
+CASCADE_WINDOW = 24  # Training window of the stock OpenCV face cascades
+
+
+def as_boxes(faces):
+    """Normalize detectMultiScale output (tuple or ndarray) to an (N, 4) int array"""
+    if faces is None or len(faces) == 0:
+        return NO_FACES
+    return np.asarray(faces, dtype=np.int32).reshape(-1, 4)
+
+
+@dataclass
+class DetectionProfile:
+    """Cascade parameters and the working distance range they are tuned for"""
+    scale: float = 1.0  # Detection image size relative to the frame, None picks it from min face size
+    scale_factor: float = 1.1
+    min_neighbors: int = 3
+    min_distance: float = None  # cm, closest face expected (bounds maxSize)
+    max_distance: float = None  # cm, farthest face expected (bounds minSize)
+    min_size: int = 0  # px at full resolution, used when no focal length is known
+    max_size: int = 0
+
+
+# Built-in profiles, "default" matches the plain detectMultiScale(gray) call
+PROFILES = {
+    "default": DetectionProfile(),
+    "fast": DetectionProfile(scale=0.5, scale_factor=1.2, min_neighbors=4, min_distance=30, max_distance=250),
+    "near": DetectionProfile(scale=None, scale_factor=1.15, min_neighbors=4, min_distance=20, max_distance=120),
+    "far": DetectionProfile(scale=None, scale_factor=1.08, min_neighbors=3, min_distance=50, max_distance=500),
+}
+
+
+def load_profile(name_or_path):
+    """Built-in profile by name, or a JSON file holding DetectionProfile fields"""
+    if name_or_path in PROFILES:
+        return replace(PROFILES[name_or_path])
+    with open(name_or_path) as f:
+        return DetectionProfile(**json.load(f))
+
+
+def save_profile(profile, path):
+    with open(path, "w") as f:
+        json.dump(asdict(profile), f, indent=2)
+
+
+def face_width_px(distance, focal_length, face_width=KNOWN_FACE_WIDTH):
+    """Expected face width in pixels at a distance, inverse of the triangle-similarity estimate"""
+    return face_width * focal_length / distance
+
+
+class CascadeDetector:
+    """cv2.CascadeClassifier run on a downscaled copy, boxes mapped back to full resolution
+
+    classifier may be None while the cascade is still loading, detect() finds nothing until set
+    """
+
+    def __init__(self, classifier, profile=None, focal_length=None, face_width=KNOWN_FACE_WIDTH):
+        self.classifier = classifier
+        self.profile = profile or DetectionProfile()
+        self.face_width = face_width
+        self.focal_length = focal_length
+        self._update_limits()
+
+    def set_classifier(self, classifier):
+        self.classifier = classifier
+
+    def set_profile(self, profile):
+        self.profile = profile
+        self._update_limits()
+
+    def set_focal_length(self, focal_length):
+        """Focal length in pixels for the current framesize, from distance calibration"""
+        self.focal_length = focal_length
+        self._update_limits()
+
+    def _update_limits(self):
+        profile = self.profile
+        min_size, max_size = profile.min_size, profile.max_size
+        if self.focal_length:
+            if profile.max_distance:
+                min_size = face_width_px(profile.max_distance, self.focal_length, self.face_width)
+            if profile.min_distance:
+                max_size = face_width_px(profile.min_distance, self.focal_length, self.face_width)
+        # Full resolution face size limits in px
+        self.min_size = int(min_size)
+        self.max_size = int(max_size)
+
+        scale = profile.scale
+        if scale is None:
+            # Shrink until the smallest expected face just fills the cascade window
+            scale = CASCADE_WINDOW / self.min_size if self.min_size else 1.0
+        self.scale = min(max(scale, 0.05), 1.0)
+
+    def detect(self, gray, input_scale: float=1.0):
+        """Boxes at full resolution; input_scale says gray was already shrunk, e.g. by a reduced decode"""
+        if self.classifier is None:
+            return NO_FACES
+        scale = min(self.scale, input_scale)
+        small = gray
+        if scale < input_scale:
+            small = cv2.resize(gray, None, fx=scale / input_scale, fy=scale / input_scale,
+                               interpolation=cv2.INTER_AREA)
+        min_px = max(int(self.min_size * scale), CASCADE_WINDOW) if self.min_size else 0
+        max_px = int(self.max_size * scale) if self.max_size else 0
+        if max_px and max_px < min_px:
+            max_px = 0
+        faces = self.classifier.detectMultiScale(small, scaleFactor=self.profile.scale_factor,
+                                                 minNeighbors=self.profile.min_neighbors,
+                                                 minSize=(min_px, min_px), maxSize=(max_px, max_px))
+        boxes = as_boxes(faces)
+        if scale < 1.0 and len(boxes):
+            boxes = np.rint(boxes / scale).astype(np.int32)
+        return boxes
@@ -0,0 +1,258 @@
+# File: detector_engine.py
+# Interchangeable face detector backends and an offline selector that benchmarks them
+# haar: the stock Haar cascade (ships with opencv-python)
+# lbp: LBP cascade, several times faster and a little less accurate
+# dnn: OpenCV's res10 SSD face detector through cv2.dnn
+# Model files that do not ship with opencv-python go in Python/models/ (not in the repo):
+#   lbpcascade_frontalface_improved.xml  from opencv/data/lbpcascades
+#   deploy.prototxt + res10_300x300_ssd_iter_140000_fp16.caffemodel  from opencv samples/dnn/face_detector
+# Usage: python detector_engine.py labeled/ --framesizes 6 8 --recall 0.9
+#   labeled/ holds images plus labels.json: {"image.jpg": [[x, y, w, h], ...], ...}
+
+import argparse
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+from detector import KNOWN_FACE_WIDTH, NO_FACES, CascadeDetector, load_profile
+from esp32cam import FRAMESIZES
+from mjpeg import reduction_for
+from tracks import iou_matrix
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+SELECTION_FILE = os.path.join(MODELS_DIR, "selection.json")
+
+BACKENDS = ("haar", "lbp", "dnn")
+DEFAULT_BACKEND = "haar"
+
+
+class DNNDetector(CascadeDetector):
+    """res10 SSD through cv2.dnn, same interface and size limits as CascadeDetector
+
+    The pipeline hands detectors equalized grayscale, which is replicated to three channels;
+    the network copes well with that and it keeps a single decode path for every backend.
+    """
+
+    def __init__(self, net, profile=None, focal_length=None, face_width=KNOWN_FACE_WIDTH,
+                 confidence: float=0.6, input_size: int=300):
+        self.confidence = confidence
+        self.input_size = input_size
+        super().__init__(net, profile, focal_length, face_width)
+
+    def _update_limits(self):
+        super()._update_limits()
+        if self.profile.scale is None:
+            # The network resizes to input_size anyway, half size decode is plenty
+            self.scale = 0.5
+
+    def detect(self, gray, input_scale: float=1.0):
+        if self.classifier is None:
+            return NO_FACES
+        height, width = gray.shape[:2]
+        bgr = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+        blob = cv2.dnn.blobFromImage(bgr, 1.0, (self.input_size, self.input_size), (104.0, 177.0, 123.0))
+        self.classifier.setInput(blob)
+        found = self.classifier.forward()[0, 0]
+        found = found[found[:, 2] >= self.confidence]
+        if len(found) == 0:
+            return NO_FACES
+        x0 = np.clip(found[:, 3], 0, 1) * width
+        y0 = np.clip(found[:, 4], 0, 1) * height
+        x1 = np.clip(found[:, 5], 0, 1) * width
+        y1 = np.clip(found[:, 6], 0, 1) * height
+        boxes = np.column_stack([x0, y0, x1 - x0, y1 - y0]) / input_scale
+        keep = (boxes[:, 2] > 0) & (boxes[:, 3] > 0)
+        if self.min_size:
+            keep &= boxes[:, 2] >= self.min_size
+        if self.max_size:
+            keep &= boxes[:, 2] <= self.max_size
+        return np.rint(boxes[keep]).astype(np.int32).reshape(-1, 4)
+
+
+def model_files(backend, models_dir=MODELS_DIR):
+    if backend == "haar":
+        return [cv2.data.haarcascades + "haarcascade_frontalface_default.xml"]
+    if backend == "lbp":
+        return [os.path.join(models_dir, "lbpcascade_frontalface_improved.xml")]
+    if backend == "dnn":
+        weights = os.path.join(models_dir, "res10_300x300_ssd_iter_140000_fp16.caffemodel")
+        if not os.path.exists(weights):
+            weights = os.path.join(models_dir, "res10_300x300_ssd_iter_140000.caffemodel")
+        return [os.path.join(models_dir, "deploy.prototxt"), weights]
+    raise ValueError(f"Unknown detector backend {backend}, expected one of {BACKENDS}")
+
+
+def available_backends(models_dir=MODELS_DIR):
+    return [name for name in BACKENDS if all(os.path.exists(p) for p in model_files(name, models_dir))]
+
+
+def load_model(backend, path=None, models_dir=MODELS_DIR):
+    """Classifier or network for a backend, None if the files are missing or invalid
+
+    path overrides the cascade file for haar/lbp
+    """
+    files = [path] if path else model_files(backend, models_dir)
+    if not all(os.path.exists(p) for p in files):
+        return None
+    if backend == "dnn":
+        try:
+            return cv2.dnn.readNetFromCaffe(*files)
+        except cv2.error:
+            return None
+    classifier = cv2.CascadeClassifier(files[0])
+    return None if classifier.empty() else classifier
+
+
+def create_detector(backend, model=None, profile=None, focal_length=None, face_width=KNOWN_FACE_WIDTH):
+    """Detector for a backend; model may be None and be set later with set_classifier()"""
+    if backend == "dnn":
+        return DNNDetector(model, profile, focal_length, face_width)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown detector backend {backend}, expected one of {BACKENDS}")
+    return CascadeDetector(model, profile, focal_length, face_width)
+
+
+# Selection
+def load_labeled(directory, limit=None):
+    """(image, boxes) pairs from a directory with labels.json, boxes at the image's resolution"""
+    with open(os.path.join(directory, "labels.json")) as f:
+        labels = json.load(f)
+    samples = []
+    for name, boxes in sorted(labels.items()):
+        image = cv2.imread(os.path.join(directory, name))
+        if image is None:
+            print(f"Skipping unreadable {name}")
+            continue
+        samples.append((image, np.asarray(boxes, dtype=float).reshape(-1, 4)))
+        if limit and len(samples) >= limit:
+            break
+    return samples
+
+
+def _prepare(samples, framesize):
+    # Full-resolution grayscale at the camera framesize, labels scaled to match
+    width, height = FRAMESIZES[framesize]
+    prepared = []
+    for image, boxes in samples:
+        fx, fy = width / image.shape[1], height / image.shape[0]
+        gray = cv2.cvtColor(cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        prepared.append((gray, boxes * (fx, fy, fx, fy)))
+    return prepared
+
+
+def evaluate(detector, prepared, iou: float=0.4, repeat: int=1):
+    """Recall, precision and per-frame latency of one detector on prepared samples"""
+    reduction = reduction_for(detector.scale)
+    inputs = []
+    for gray, _ in prepared:
+        # Same input the pipeline gives it: reduced-size equalized luma
+        small = gray if reduction == 1 else cv2.resize(gray, None, fx=1 / reduction, fy=1 / reduction,
+                                                       interpolation=cv2.INTER_AREA)
+        inputs.append(cv2.equalizeHist(small))
+    detector.detect(inputs[0], 1.0 / reduction)  # Warm up
+    times, hits, truths, found = [], 0, 0, 0
+    for _ in range(repeat):
+        for small, (_, truth) in zip(inputs, prepared):
+            start = time.perf_counter()
+            boxes = detector.detect(small, 1.0 / reduction)
+            times.append(time.perf_counter() - start)
+            truths += len(truth)
+            found += len(boxes)
+            if len(truth) and len(boxes):
+                overlap = iou_matrix(truth, boxes.astype(float))
+                # Greedy one-to-one matching is plenty for a handful of faces
+                while overlap.size and overlap.max() >= iou:
+                    t, d = np.unravel_index(np.argmax(overlap), overlap.shape)
+                    hits += 1
+                    overlap[t, :] = 0
+                    overlap[:, d] = 0
+    ms = np.asarray(times) * 1000.0
+    return {
+        "recall": hits / truths if truths else 1.0,
+        "precision": hits / found if found else 1.0,
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+    }
+
+
+def select_backend(samples, framesize, min_recall: float=0.9, backends=None, profile="default",
+                   models_dir=MODELS_DIR, repeat: int=1):
+    """Fastest backend (by p95) meeting min_recall, or the best recall if none does
+
+    Returns (backend, {backend: evaluation})
+    """
+    prepared = _prepare(samples, framesize)
+    results = {}
+    for backend in backends or available_backends(models_dir):
+        model = load_model(backend, models_dir=models_dir)
+        if model is None:
+            print(f"{backend}: model files missing, skipped")
+            continue
+        results[backend] = evaluate(create_detector(backend, model, load_profile(profile)), prepared, repeat=repeat)
+    if not results:
+        return DEFAULT_BACKEND, results
+    passing = [b for b in results if results[b]["recall"] >= min_recall]
+    if passing:
+        return min(passing, key=lambda b: results[b]["p95_ms"]), results
+    return max(results, key=lambda b: (results[b]["recall"], -results[b]["p95_ms"])), results
+
+
+def load_selection(path=SELECTION_FILE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_selection(framesize, backend, results, path=SELECTION_FILE):
+    selection = load_selection(path)
+    selection[str(framesize)] = {"backend": backend, "results": results}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(selection, f, indent=2)
+
+
+def resolve_backend(name, framesize=None, path=SELECTION_FILE):
+    """'auto' becomes the backend selected for this framesize (or the closest one selected), else haar"""
+    if name != "auto":
+        return name
+    selection = load_selection(path)
+    if not selection:
+        return DEFAULT_BACKEND
+    if framesize is None or str(framesize) not in selection:
+        closest = min(selection, key=lambda k: abs(int(k) - (framesize or 0)))
+        return selection[closest]["backend"]
+    return selection[str(framesize)]["backend"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark detector backends and pick one per framesize")
+    parser.add_argument("directory", help="labeled images, see labels.json format above")
+    parser.add_argument("--framesizes", type=int, nargs="+", default=[8], choices=sorted(FRAMESIZES))
+    parser.add_argument("--recall", type=float, default=0.9, help="minimum recall at IoU 0.4")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=None)
+    parser.add_argument("--profile", default="default")
+    parser.add_argument("--limit", type=int, default=None, help="max images")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--dry-run", action="store_true", help=f"do not write {SELECTION_FILE}")
+    args = parser.parse_args()
+
+    samples = load_labeled(args.directory, args.limit)
+    for framesize in args.framesizes:
+        backend, results = select_backend(samples, framesize, args.recall, args.backends, args.profile,
+                                          repeat=args.repeat)
+        width, height = FRAMESIZES[framesize]
+        for name, r in results.items():
+            print(f"framesize {framesize} ({width}x{height}) {name}: recall {r['recall']:.2f}, "
+                  f"precision {r['precision']:.2f}, p50 {r['p50_ms']:.1f} ms, p95 {r['p95_ms']:.1f} ms")
+        print(f"framesize {framesize}: selected {backend}")
+        if not args.dry_run:
+            save_selection(framesize, backend, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# File: esp32cam.py
+# Constants that mirror the ESP32-CAM firmware (Arduino/ESP CAM/app_httpd.cpp)
+# Kept free of side effects so any module can import it without touching the camera
+
+from urllib.parse import urlsplit
+
+# Web server ports opened by startCameraServer()
+HTTP_PORT = 80  # /, /status, /control, /capture
+STREAM_PORT = 81  # /stream
+
+# TCP bridge in ESP32_CameraServer_AP_2023_V1.3.ino that relays {...} frames to Serial2
+BRIDGE_PORT = 100
+
+# Multipart boundary used by stream_handler
+PART_BOUNDARY = "123456789000000000000987654321"
+
+# framesize_t index -> (width, height)
+FRAMESIZES = {
+    0: (160, 120),  # QQVGA
+    1: (128, 160),  # QQVGA2
+    2: (176, 144),  # QCIF
+    3: (240, 176),  # HQVGA
+    4: (320, 240),  # QVGA
+    5: (400, 296),  # CIF
+    6: (640, 480),  # VGA
+    7: (800, 600),  # SVGA
+    8: (1024, 768),  # XGA
+    9: (1280, 1024),  # SXGA
+    10: (1600, 1200),  # UXGA
+}
+
+# JPEG quality range accepted by /control?var=quality (lower is better)
+QUALITY_MIN = 10
+QUALITY_MAX = 63
+
+
+def stream_url(url: str, port: int=None):
+    """Build the /stream URL from the camera base URL
+
+    startCameraServer() opens the stream server one port above the web server, so
+    http://host:8080 streams from :8081 and a URL without a port from STREAM_PORT.
+    """
+    parts = urlsplit(url)
+    if port is None:
+        port = parts.port + 1 if parts.port else STREAM_PORT
+    return "{}://{}:{}/stream".format(parts.scheme or "http", parts.hostname, port)
+
+
+def capture_url(url: str):
+    """Build the single-JPEG /capture URL, served on the main HTTP port (kept from the base URL)"""
+    return url.rstrip("/") + "/capture"
@@ -0,0 +1,396 @@
+# File: framebus.py
+# Stream fan-out: one hub process reads the camera once and publishes every frame into a
+# shared-memory ring, any number of local processes read it without opening the camera.
+# Each slot carries a sequence number written before and after its data (a seqlock), so the
+# hub never waits for readers: a reader that falls behind finds its slot overwritten and
+# skips ahead, and readers never slow each other down.
+# Usage: python framebus.py http://10.0.0.15 --name esp32cam     (hub, keep it running)
+#        python service.py shm://esp32cam                          (any number of consumers)
+
+import argparse
+import signal
+import struct
+import threading
+import time
+from collections import namedtuple
+from multiprocessing import resource_tracker, shared_memory
+
+import cv2
+import numpy as np
+
+from esp32cam import FRAMESIZES
+from mjpeg import JPEGPart, MJPEGStream, decode_color, decode_jpeg
+
+MAGIC = b"ESPFBUS1"
+SCHEME = "shm://"
+DEFAULT_NAME = "esp32cam"
+# A hub beats at least every half second, a bus this quiet was left behind by a dead hub
+STALE_AFTER = 3.0
+
+KIND_JPEG = 0  # Slots hold the compressed JPEG as received
+KIND_BGR = 1  # Slots hold decoded HxWx3 BGR frames
+KINDS = {"jpeg": KIND_JPEG, "bgr": KIND_BGR}
+
+# magic, slots, kind, slot_bytes, newest committed seq, hub heartbeat (time.time()), closed
+HEADER = struct.Struct("<8sIIQQdI")
+HEADER_SIZE = 64
+# begin seq, end seq, timestamp, camera timestamp (nan if none), frame_id, nbytes, width, height, channels
+SLOT_HEADER = struct.Struct("<QQddQQIII")
+SLOT_HEADER_SIZE = 64
+_SEQ_OFFSET = 24  # Offset of the seq field in HEADER
+_HEARTBEAT_OFFSET = 32
+
+# One frame read from the bus; `data` is a view into shared memory, see FrameBus.valid()
+BusFrame = namedtuple("BusFrame", ["seq", "frame_id", "timestamp", "camera_timestamp", "data"])
+
+
+def bus_name(url):
+    """'shm://name' -> 'name'"""
+    return url[len(SCHEME):] if url.startswith(SCHEME) else url
+
+
+def _attach_shm(name):
+    # Attaching must not register the segment with this process's resource tracker,
+    # or it would unlink the hub's memory when this reader exits (Python < 3.13)
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class FrameBus:
+    """Shared-memory ring with one writer (create) and any number of readers (attach)
+
+    Readers get zero-copy views; a view stays good until the hub laps the ring, check with
+    valid(frame) after using it or copy the data out first (read(copy=True)).
+    """
+
+    def __init__(self, shm, owner: bool):
+        self.shm = shm
+        self.owner = owner
+        magic, self.slots, self.kind, self.slot_bytes, _, _, _ = HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{shm.name} is not a frame bus")
+        self.name = shm.name
+        self.lost = 0  # Frames an in-order reader missed because the hub lapped it
+
+    @classmethod
+    def create(cls, name: str=DEFAULT_NAME, slots: int=8, slot_bytes: int=None, kind: str="jpeg"):
+        if slot_bytes is None:
+            width, height = FRAMESIZES[max(FRAMESIZES)]
+            # A UXGA JPEG at the best quality stays well under 1 MB
+            slot_bytes = width * height * 3 if kind == "bgr" else 1024 * 1024
+        slot_bytes = -(-slot_bytes // 64) * 64
+        size = HEADER_SIZE + slots * (SLOT_HEADER_SIZE + slot_bytes)
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            existing = cls(_attach_shm(name), owner=False)
+            live = not existing.closed and existing.heartbeat_age() < STALE_AFTER
+            existing.close()
+            if live:
+                raise FileExistsError(f"Frame bus {name} is already served by a running hub")
+            # Left behind by a hub that did not shut down cleanly. unlink() unregisters the name
+            # from the resource tracker, register it first as _attach_shm() did not (Python < 3.13)
+            if getattr(existing.shm, "_track", True):
+                resource_tracker.register(existing.shm._name, "shared_memory")
+            existing.shm.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        shm.buf[:size] = bytes(size)
+        HEADER.pack_into(shm.buf, 0, MAGIC, slots, KINDS[kind], slot_bytes, 0, time.time(), 0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str=DEFAULT_NAME):
+        """Open an existing bus, FileNotFoundError if no hub is running"""
+        return cls(_attach_shm(bus_name(name)), owner=False)
+
+    def close(self):
+        if self.owner:
+            struct.pack_into("<I", self.shm.buf, HEADER.size - 4, 1)
+        try:
+            self.shm.close()
+        except BufferError:
+            # A reader still holds a view: hand the mapping to it (it is unmapped when the last
+            # view goes) so SharedMemory.__del__ does not try to close it again
+            self.shm._mmap = None
+            self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    # Shared state
+    @property
+    def seq(self):
+        """Sequence number of the newest committed frame, 0 before the first"""
+        return struct.unpack_from("<Q", self.shm.buf, _SEQ_OFFSET)[0]
+
+    @property
+    def closed(self):
+        return bool(struct.unpack_from("<I", self.shm.buf, HEADER.size - 4)[0])
+
+    def heartbeat_age(self):
+        """Seconds since the hub last showed signs of life"""
+        return time.time() - struct.unpack_from("<d", self.shm.buf, _HEARTBEAT_OFFSET)[0]
+
+    def _slot(self, seq):
+        return HEADER_SIZE + (seq % self.slots) * (SLOT_HEADER_SIZE + self.slot_bytes)
+
+    # Writer
+    def beat(self):
+        struct.pack_into("<d", self.shm.buf, _HEARTBEAT_OFFSET, time.time())
+
+    def publish(self, data, timestamp: float, frame_id: int=0, camera_timestamp: float=None):
+        """Copy a JPEG (bytes-like) or BGR frame (ndarray) into the next slot, its seq or None if too big"""
+        frame = np.asarray(data, dtype=np.uint8) if isinstance(data, np.ndarray) else np.frombuffer(data, np.uint8)
+        if frame.nbytes > self.slot_bytes:
+            print(f"Frame bus: {frame.nbytes} byte frame does not fit {self.slot_bytes} byte slots, dropped")
+            return None
+        height, width = frame.shape[:2] if frame.ndim >= 2 else (0, 0)
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+        seq = self.seq + 1
+        offset = self._slot(seq)
+        buf = self.shm.buf
+        # begin first: a reader still holding this slot's previous frame sees it is being replaced
+        struct.pack_into("<Q", buf, offset, seq)
+        start = offset + SLOT_HEADER_SIZE
+        np.frombuffer(buf, np.uint8, frame.nbytes, start)[:] = frame.reshape(-1)
+        camera_ts = float("nan") if camera_timestamp is None else camera_timestamp
+        SLOT_HEADER.pack_into(buf, offset, seq, seq, timestamp, camera_ts, frame_id, frame.nbytes,
+                              width, height, channels)
+        struct.pack_into("<Q", buf, _SEQ_OFFSET, seq)
+        self.beat()
+        return seq
+
+    # Readers
+    def valid(self, frame):
+        """True while frame.data has not been overwritten by the hub"""
+        return struct.unpack_from("<Q", self.shm.buf, self._slot(frame.seq))[0] == frame.seq
+
+    def decode(self, frame, flags=cv2.IMREAD_COLOR):
+        """Decode a JPEG frame straight from shared memory, None if it was overwritten meanwhile"""
+        image = decode_jpeg(frame.data, flags)
+        return image if self.valid(frame) else None
+
+    def read(self, after: int=0, latest: bool=True, timeout: float=1.0, copy: bool=False,
+             poll_min: float=0.0002, poll_max: float=0.004):
+        """Wait for a frame newer than sequence `after`, None on timeout or when the hub closed
+
+        latest=True jumps to the newest frame, otherwise frames come in order and `lost`
+        counts the ones overwritten before this reader got to them.
+        There is no cross-process wakeup, the sequence is polled with a backoff from poll_min
+        to poll_max, and slowly while the hub's heartbeat is stale.
+        """
+        deadline = time.monotonic() + timeout
+        poll = poll_min
+        while True:
+            newest = self.seq
+            if newest > after:
+                seq = newest if latest else max(after + 1, newest - self.slots + 1)
+                if not latest:
+                    self.lost += seq - after - 1
+                frame = self._read_slot(seq, copy)
+                if frame is not None:
+                    return frame
+                # Overwritten while we looked, the hub is at least a lap ahead now
+                after = seq
+                continue
+            remaining = deadline - time.monotonic()
+            if self.closed or remaining <= 0:
+                return None
+            if self.heartbeat_age() > STALE_AFTER:
+                poll = 0.1
+            time.sleep(min(poll, remaining))
+            poll = min(poll * 2, poll_max)
+
+    def _read_slot(self, seq, copy):
+        offset = self._slot(seq)
+        _, end, timestamp, camera_ts, frame_id, nbytes, width, height, channels = \
+            SLOT_HEADER.unpack_from(self.shm.buf, offset)
+        if end != seq:
+            return None
+        data = np.frombuffer(self.shm.buf, np.uint8, nbytes, offset + SLOT_HEADER_SIZE)
+        if self.kind == KIND_BGR:
+            data = data.reshape(height, width, channels)
+        if copy:
+            data = data.copy()
+        frame = BusFrame(seq, frame_id, timestamp, None if np.isnan(camera_ts) else camera_ts, data)
+        return frame if self.valid(frame) else None
+
+
+class BusSource(MJPEGStream):
+    """MJPEGStream interface over a JPEG frame bus, for open_stream('shm://name')
+
+    Reads are latest-wins like the camera stream. If the hub restarts, the new bus is
+    attached on the next read. Parts from read_jpeg() are zero-copy views into shared
+    memory: check valid(part) after using them. read()/retrieve() decode straight from
+    shared memory and only return frames that were not overwritten during the decode.
+    """
+
+    def __init__(self, url: str=SCHEME + DEFAULT_NAME, timeout: float=5.0):
+        super().__init__(url, timeout=timeout)
+        self.name = bus_name(url)
+        self.bus = None
+        self._seq = 0
+        self._opened = False
+        self._frames = {}  # frame_id -> (bus, BusFrame) for the last part handed out
+
+    def start(self):
+        self._opened = True
+        self._attach()
+        return self
+
+    def release(self):
+        self._opened = False
+        self.connected = False
+        # Drop our views so the mapping can be closed
+        self._frames = {}
+        self._latest = self._pending = None
+        if self.bus is not None:
+            self.bus.close()
+            self.bus = None
+        with self._cond:
+            self._cond.notify_all()
+
+    stop = release
+
+    def restart(self):
+        # The hub owns the camera connection, start over from its newest frame
+        self._seq = 0
+
+    def isOpened(self):
+        return self._opened
+
+    def _attach(self):
+        try:
+            bus = FrameBus.attach(self.name)
+        except FileNotFoundError:
+            return False
+        if bus.kind != KIND_JPEG:
+            bus.close()
+            raise ValueError(f"Frame bus {self.name} holds decoded frames, read it with FrameBus.attach()")
+        if bus.closed or bus.heartbeat_age() > self.timeout:
+            # Left behind by a hub that was killed, wait for a new one
+            bus.close()
+            return False
+        if self.bus is not None:
+            self.bus.close()
+            self.reconnects += 1
+        self.bus = bus
+        self._seq = 0
+        return True
+
+    def read_jpeg(self, timeout: float=1.0):
+        if not self._opened:
+            return None
+        if self.bus is None or self.bus.closed or self.bus.heartbeat_age() > self.timeout:
+            # No hub yet, or it exited: pick up a new one under the same name
+            if not self._attach() and (self.bus is None or self.bus.closed):
+                self.connected = False
+                time.sleep(min(timeout, 0.1))
+                return None
+        frame = self.bus.read(self._seq, latest=True, timeout=timeout)
+        if frame is None:
+            self.connected = self.bus.heartbeat_age() < self.timeout
+            return None
+        self.connected = True
+        self.frames_dropped += max(frame.seq - self._seq - 1, 0) if self._seq else 0
+        self._seq = frame.seq
+        self.frames_received += 1
+        self._frame_id += 1
+        part = JPEGPart(self._frame_id, frame.timestamp, frame.data, frame.camera_timestamp)
+        self._frames = {part.frame_id: (self.bus, frame)}
+        self._latest = part
+        for callback in self.part_callbacks:
+            callback(part.jpeg, part.timestamp, part.camera_timestamp)
+        return part
+
+    def valid(self, part):
+        """True while the part from the last read_jpeg() has not been overwritten by the hub"""
+        bus, frame = self._frames.get(part.frame_id, (None, None))
+        # A part from a bus that was replaced since is gone with it
+        return bus is not None and bus is self.bus and bus.valid(frame)
+
+    def retrieve(self, flags=cv2.IMREAD_COLOR):
+        part = self._pending
+        if part is None:
+            return False, None
+        image = decode_jpeg(part.jpeg, flags)
+        if image is None or not self.valid(part):
+            return False, None
+        return True, image
+
+
+class Hub:
+    """Reads one camera source and publishes each new frame to a FrameBus"""
+
+    def __init__(self, stream, bus):
+        self.stream = stream
+        self.bus = bus
+        self.published = 0
+
+    def run(self, stop_event=None):
+        self.stream.start()
+        while stop_event is None or not stop_event.is_set():
+            part = self.stream.read_jpeg(timeout=0.5)
+            if part is None:
+                # Camera down or slow: readers can still tell the hub is alive
+                self.bus.beat()
+                continue
+            if self.bus.kind == KIND_BGR:
+                frame = decode_color(part.jpeg)
+                if frame is None:
+                    continue
+            else:
+                frame = part.jpeg
+            if self.bus.publish(frame, part.timestamp, part.frame_id, part.camera_timestamp) is not None:
+                self.published += 1
+
+    def close(self):
+        self.stream.release()
+        self.bus.close()
+
+
+def main():
+    from OpenCV import open_stream
+
+    parser = argparse.ArgumentParser(description="Read the camera once and share its frames with local processes")
+    parser.add_argument("url", nargs="?", default="http://10.0.0.15", help="camera base URL or .mjr recording")
+    parser.add_argument("--name", default=DEFAULT_NAME, help="shared memory name, consumers open shm://NAME")
+    parser.add_argument("--source", choices=["stream", "capture"], default="stream")
+    parser.add_argument("--kind", choices=sorted(KINDS), default="jpeg",
+                        help="publish compressed JPEGs, or decoded BGR frames for consumers that want pixels")
+    parser.add_argument("--slots", type=int, default=8, help="frames kept, how far an in-order reader may lag")
+    parser.add_argument("--slot-bytes", type=int, default=None)
+    args = parser.parse_args()
+
+    try:
+        bus = FrameBus.create(args.name, args.slots, args.slot_bytes, args.kind)
+    except FileExistsError as e:
+        print(e)
+        return
+    hub = Hub(open_stream(args.url, args.source), bus)
+    stop = threading.Event()
+    # A plain kill should still unlink the shared memory
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    thread = threading.Thread(target=hub.run, args=(stop,), daemon=True)
+    thread.start()
+    print(f"Publishing {args.url} on {SCHEME}{args.name} ({args.kind}, {args.slots} slots)")
+    try:
+        last, last_time = 0, time.monotonic()
+        while not stop.wait(5):
+            now = time.monotonic()
+            print(f"{(hub.published - last) / (now - last_time):.1f} FPS published, "
+                  f"dropped {hub.stream.frames_dropped}, reconnects {hub.stream.reconnects}")
+            last, last_time = hub.published, now
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        thread.join(timeout=2)
+        hub.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,16 @@
 # Template
-from backend import Servo
-from CamGUI import ESP32CameraTracker
-import tkinter as tk
+# python main.py             Tk viewer
+# python main.py --headless  tracking service, see service.py for its flags
+import sys
 
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = ESP32CameraTracker(root)
-root.mainloop()
-
+    if "--headless" in sys.argv[1:]:
+        import service
+        service.main([arg for arg in sys.argv[1:] if arg != "--headless"])
+    else:
+        import tkinter as tk
+        from CamGUI import ESP32CameraApp
+        root = tk.Tk()
+        root.geometry("1024x768")
+        app = ESP32CameraApp(root, "ESP32 Camera Viewer")
+        root.mainloop()
@@ -2,14 +2,19 @@
 # This file contains the GUI (frontend) for servo control
 import tkinter as tk
 from tkinter import ttk, messagebox
-from backend import ServoController
+from backend import ServoController, ServoScheduler
 
 class ServoControlGUI:
     def __init__(self, root, controller):
         self.root = root
         self.root.title("Servo Control Panel")
         self.root.geometry("500x400")
+        # Slider drags coalesce into fixed-rate updates instead of one write per pixel of travel
+        self.scheduler = None
+        if not isinstance(controller, ServoScheduler):
+            controller = self.scheduler = ServoScheduler(controller).start()
         self.controller = controller
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
         
         # Create the main frame
         main_frame = ttk.Frame(root, padding="20")
@@ -55,13 +60,19 @@ class ServoControlGUI:
             self.sliders.append((slider, angle_string))
        
     def update_servo(self, idx, floatAngle, stringAngle):
-        #  Set Position
+        #  Set Target, fires for every pixel of slider travel, the scheduler sends the latest
         angle = int(floatAngle)
-        self.controller.set_position(idx, angle)
+        self.controller.set_target(idx, angle)
         # Set Labels
         stringAngle.set(f"{angle}°")
         # self.status_var.set(f"Servo {idx+1} moved to position {position}°")
 
+    def close(self):
+        # Only stop a scheduler this window started, a passed-in one belongs to the caller
+        if self.scheduler is not None:
+            self.scheduler.stop()
+        self.root.destroy()
+
 '''      
     def center_all(self):
         for i, (slider, value_var) in enumerate(self.sliders):
@@ -0,0 +1,210 @@
+# File: metrics.py
+# Per-stage timings and counters with a plain-text endpoint on localhost
+# Stages record perf_counter deltas into fixed-size rolling windows, so observing is a couple of
+# array writes; percentiles are only computed when someone scrapes /metrics or a dump is written.
+# Usage: curl http://127.0.0.1:9101/metrics
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+METRICS_PORT = 9101
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """Rolling window of the last `size` samples plus lifetime count and sum"""
+
+    def __init__(self, size: int=1024):
+        self._samples = np.zeros(size)
+        self._index = 0
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        with self._lock:
+            self._samples[self._index] = value
+            self._index = (self._index + 1) % len(self._samples)
+            self.count += 1
+            self.total += value
+
+    def summary(self):
+        with self._lock:
+            window = self._samples[:min(self.count, len(self._samples))].copy()
+            count, total = self.count, self.total
+        result = {"count": count, "sum": total}
+        if len(window):
+            for q, value in zip(QUANTILES, np.quantile(window, QUANTILES)):
+                result[f"p{int(q * 100)}"] = float(value)
+            result["max"] = float(window.max())
+        return result
+
+
+class Timer:
+    """with metrics.time("decode"): ..., for code that is not already holding a perf_counter"""
+
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Metrics:
+    """Registry of stage histograms, counters and gauges (callables read at scrape time)"""
+
+    def __init__(self, window: int=1024):
+        self.window = window
+        self.stages = {}
+        self.counters = {}
+        self.gauges = {}
+        self._lock = threading.Lock()
+
+    def stage(self, name):
+        histogram = self.stages.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.stages.setdefault(name, Histogram(self.window))
+        return histogram
+
+    def observe(self, name, seconds):
+        self.stage(name).observe(seconds)
+
+    def time(self, name):
+        return Timer(self.stage(name))
+
+    def inc(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def gauge(self, name, read):
+        """Register read() -> number or None, e.g. lambda: stream.reconnects"""
+        self.gauges[name] = read
+
+    def snapshot(self):
+        gauges = {}
+        for name, read in list(self.gauges.items()):
+            try:
+                value = read()
+            except Exception:
+                value = None
+            if value is not None:
+                gauges[name] = value
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            "time": time.time(),
+            "stages": {name: h.summary() for name, h in list(self.stages.items())},
+            "counters": counters,
+            "gauges": gauges,
+        }
+
+    def render(self):
+        """Prometheus-style text exposition"""
+        snapshot = self.snapshot()
+        lines = ["# TYPE stage_seconds summary"]
+        for name, summary in sorted(snapshot["stages"].items()):
+            for q in QUANTILES:
+                key = f"p{int(q * 100)}"
+                if key in summary:
+                    lines.append(f'stage_seconds{{stage="{name}",quantile="{q}"}} {summary[key]:.6f}')
+            lines.append(f'stage_seconds_sum{{stage="{name}"}} {summary["sum"]:.6f}')
+            lines.append(f'stage_seconds_count{{stage="{name}"}} {summary["count"]}')
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f"{name}_total {value}")
+        for name, value in sorted(snapshot["gauges"].items()):
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves Metrics.render() at /metrics and the JSON snapshot at /metrics.json, localhost only"""
+
+    def __init__(self, metrics, port: int=METRICS_PORT, host: str="127.0.0.1"):
+        self.metrics = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path == "/metrics":
+                    body, kind = metrics.render().encode(), "text/plain; version=0.0.4"
+                elif handler.path == "/metrics.json":
+                    body, kind = json.dumps(metrics.snapshot()).encode(), "application/json"
+                else:
+                    handler.send_error(404)
+                    return
+                handler.send_response(200)
+                handler.send_header("Content-Type", kind)
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class JSONDumper:
+    """Appends one snapshot per interval as a JSON line"""
+
+    def __init__(self, metrics, path: str, interval: float=10.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+        self._dump()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self._dump()
+
+    def _dump(self):
+        try:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(self.metrics.snapshot()) + "\n")
+        except OSError as e:
+            print(f"Metrics dump error: {e}")
+
+
+def serve(metrics, port=METRICS_PORT, dump_path=None, dump_interval=10.0):
+    """Start the endpoint (and optional JSON dump), returns the started objects for stop()"""
+    started = []
+    try:
+        started.append(MetricsServer(metrics, port).start())
+    except OSError as e:
+        print(f"Metrics endpoint on port {port} unavailable: {e}")
+    if dump_path:
+        started.append(JSONDumper(metrics, dump_path, dump_interval).start())
+    return started
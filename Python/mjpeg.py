@@ -0,0 +1,297 @@
+# File: mjpeg.py
+# Native reader for the ESP32 multipart/x-mixed-replace stream
+# Replaces cv2.VideoCapture over FFMPEG, which buffers frames and adds latency
+# Only the newest JPEG part is kept (latest-wins) and decoding happens on demand
+
+import http.client
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+import cv2
+import numpy as np
+
+from esp32cam import PART_BOUNDARY
+
+# One JPEG part pulled off the stream
+# timestamp is local arrival time, camera_timestamp is the firmware X-Timestamp header
+JPEGPart = namedtuple("JPEGPart", ["frame_id", "timestamp", "jpeg", "camera_timestamp"])
+
+
+# libjpeg can scale by 1/2, 1/4 and 1/8 while decoding (DCT scaling), far cheaper than decode + resize
+REDUCTIONS = (1, 2, 4, 8)
+_GRAY_FLAGS = {1: cv2.IMREAD_GRAYSCALE, 2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+               4: cv2.IMREAD_REDUCED_GRAYSCALE_4, 8: cv2.IMREAD_REDUCED_GRAYSCALE_8}
+_COLOR_FLAGS = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+                4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+
+def decode_jpeg(jpeg, flags=cv2.IMREAD_COLOR):
+    """Decode JPEG bytes into an OpenCV image, None on failure"""
+    if jpeg is None or len(jpeg) == 0:
+        return None
+    return cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), flags)
+
+
+def decode_gray(jpeg, reduction: int=1):
+    """Luma straight from the JPEG at 1/reduction size, no BGR image or cvtColor pass"""
+    return decode_jpeg(jpeg, _GRAY_FLAGS[reduction])
+
+
+def decode_color(jpeg, reduction: int=1):
+    return decode_jpeg(jpeg, _COLOR_FLAGS[reduction])
+
+
+def reduction_for(scale):
+    """Largest decode reduction that still gives at least `scale` of the full size"""
+    scale = scale or 1.0
+    return max(r for r in REDUCTIONS if 1.0 / r >= scale - 1e-6)
+
+
+class MJPEGParser:
+    """Incremental parser that cuts JPEG parts out of a multipart byte stream"""
+
+    def __init__(self, boundary: str=PART_BOUNDARY, max_buffer: int=8 * 1024 * 1024):
+        self.marker = b"--" + boundary.encode()
+        self.max_buffer = max_buffer
+        # Reused between feeds, consumed bytes are trimmed from the front
+        self.buffer = bytearray()
+
+    def reset(self):
+        del self.buffer[:]
+
+    def feed(self, data):
+        """Append stream bytes, return list of (jpeg, camera_timestamp) completed parts"""
+        buf = self.buffer
+        buf += data
+        parts = []
+        pos = 0
+        while True:
+            start = buf.find(self.marker, pos)
+            if start < 0:
+                # Keep a tail in case the marker is split across reads
+                pos = max(pos, len(buf) - len(self.marker))
+                break
+            header_end = buf.find(b"\r\n\r\n", start)
+            if header_end < 0:
+                pos = start
+                break
+            length, camera_ts = self._parse_headers(buf, start + len(self.marker), header_end)
+            body = header_end + 4
+            if length is not None:
+                end = body + length
+                if len(buf) < end:
+                    pos = start
+                    break
+            else:
+                # No Content-Length, the part ends at the next boundary
+                nxt = buf.find(self.marker, body)
+                if nxt < 0:
+                    pos = start
+                    break
+                end = nxt
+                if buf[end - 2:end] == b"\r\n":
+                    end -= 2
+            parts.append((bytes(buf[body:end]), camera_ts))
+            pos = end
+        if pos:
+            del buf[:pos]
+        if len(buf) > self.max_buffer:
+            # Garbage or a runaway part, resync on the next boundary
+            print("MJPEG: buffer overflow, resyncing")
+            del buf[:]
+        return parts
+
+    @staticmethod
+    def _parse_headers(buf, start, end):
+        length = None
+        camera_ts = None
+        for line in bytes(buf[start:end]).split(b"\r\n"):
+            name, sep, value = line.partition(b":")
+            if not sep:
+                continue
+            name = name.strip().lower()
+            try:
+                if name == b"content-length":
+                    length = int(value)
+                elif name == b"x-timestamp":
+                    camera_ts = float(value)
+            except ValueError:
+                pass
+        return length, camera_ts
+
+
+class MJPEGStream:
+    """Background MJPEG reader with a latest-wins frame slot
+
+    Exposes isOpened/grab/retrieve/read/release so it can stand in for cv2.VideoCapture
+    """
+
+    def __init__(self, url: str, boundary: str=PART_BOUNDARY, timeout: float=5.0,
+                 backoff_min: float=0.05, backoff_max: float=2.0, chunk_size: int=64 * 1024):
+        self.url = url
+        self.parser = MJPEGParser(boundary)
+        self.timeout = timeout
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.chunk_size = chunk_size
+
+        self._cond = threading.Condition()
+        self._latest = None  # Newest JPEGPart
+        self._pending = None  # Part picked by grab(), decoded by retrieve()
+        self._consumed_id = 0
+        self._frame_id = 0
+        self._conn = None
+        # callback(jpeg, timestamp, camera_timestamp) for every part, run on the reader thread
+        self.part_callbacks = []
+        # callback() after every reconnect (not the first connect), e.g. the camera may have rebooted
+        self.reconnect_callbacks = []
+
+        # Stats
+        self.frames_received = 0
+        self.frames_dropped = 0  # Parts replaced before anyone read them
+        self.reconnects = 0
+        self.connected = False
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def release(self):
+        """Stop the reader thread and close the connection"""
+        self._stop_event.set()
+        self._shutdown()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.timeout)
+        self._thread = None
+        with self._cond:
+            self._cond.notify_all()
+
+    stop = release
+
+    def restart(self):
+        """Drop the current connection so the reader reconnects right away"""
+        self._shutdown()
+
+    def isOpened(self):
+        return self._thread is not None and not self._stop_event.is_set()
+
+    def _shutdown(self):
+        # Called from other threads: shut the socket down so a blocked read returns,
+        # the reader thread closes the connection itself
+        conn = self._conn
+        sock = conn.sock if conn is not None else None
+        if sock is not None:
+            try:
+                sock.shutdown(2)
+            except OSError:
+                pass
+
+    def _close(self):
+        conn = self._conn
+        self._conn = None
+        if conn is not None:
+            conn.close()
+
+    def _open(self):
+        parts = urlsplit(self.url)
+        conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=self.timeout)
+        try:
+            conn.request("GET", parts.path or "/stream")
+            resp = conn.getresponse()
+        except (OSError, http.client.HTTPException):
+            # Refused, timed out or reset before a response; free the socket now, not at GC
+            conn.close()
+            raise
+        if resp.status != 200:
+            conn.close()
+            raise ConnectionError(f"stream returned HTTP {resp.status}")
+        self._conn = conn
+        return resp
+
+    def _run(self):
+        delay = 0.0
+        while not self._stop_event.is_set():
+            try:
+                resp = self._open()
+                if self.reconnects:
+                    for callback in self.reconnect_callbacks:
+                        callback()
+                self.parser.reset()
+                while not self._stop_event.is_set():
+                    data = resp.read1(self.chunk_size)
+                    if not data:
+                        raise ConnectionError("stream closed by camera")
+                    parts = self.parser.feed(data)
+                    if parts:
+                        self._publish(parts)
+                        self.connected = True
+                        delay = 0.0
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                if not self._stop_event.is_set():
+                    print(f"MJPEG stream error: {e}")
+            self.connected = False
+            self._close()
+            if self._stop_event.is_set():
+                break
+            # First retry is immediate, then back off exponentially
+            self.reconnects += 1
+            self._stop_event.wait(delay)
+            delay = min(max(delay * 2, self.backoff_min), self.backoff_max)
+
+    def _publish(self, parts):
+        now = time.time()
+        for callback in self.part_callbacks:
+            for jpeg, camera_ts in parts:
+                callback(jpeg, now, camera_ts)
+        # Only the last part of a read is kept, older ones are stale already
+        jpeg, camera_ts = parts[-1]
+        with self._cond:
+            if self._latest is not None and self._latest.frame_id > self._consumed_id:
+                self.frames_dropped += 1
+            self.frames_dropped += len(parts) - 1
+            self.frames_received += len(parts)
+            self._frame_id += 1
+            self._latest = JPEGPart(self._frame_id, now, jpeg, camera_ts)
+            self._cond.notify_all()
+
+    def read_jpeg(self, timeout: float=1.0):
+        """Wait for a part newer than the last one consumed, None on timeout"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._latest is None or self._latest.frame_id <= self._consumed_id:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.isOpened():
+                    return None
+                self._cond.wait(remaining)
+            part = self._latest
+            self._consumed_id = part.frame_id
+            return part
+
+    def latest(self):
+        """Newest part without waiting or marking it consumed"""
+        with self._cond:
+            return self._latest
+
+    def grab(self, timeout: float=1.0):
+        self._pending = self.read_jpeg(timeout)
+        return self._pending is not None
+
+    def retrieve(self, flags=cv2.IMREAD_COLOR):
+        part = self._pending
+        if part is None:
+            return False, None
+        frame = decode_jpeg(part.jpeg, flags)
+        return frame is not None, frame
+
+    def read(self, timeout: float=1.0):
+        if not self.grab(timeout):
+            return False, None
+        return self.retrieve()
@@ -0,0 +1,88 @@
+# File: motion.py
+# Motion gate in front of the face detector
+# A tiny running-average background (64 px wide) is compared with every frame; the wrapped
+# detector only runs when enough of it changed, when faces were just lost, or when
+# `max_interval` has passed so a face that walked in and stood still is still found.
+
+import time
+
+import cv2
+import numpy as np
+
+from detector import NO_FACES
+
+
+class MotionGatedDetector:
+    """Wraps a detector with detect(gray, input_scale), skipping it on static scenes
+
+    threshold: per-pixel change (0-255) that counts as motion in the tiny image
+    min_area: fraction of tiny pixels that must change to trigger detection
+    max_interval: seconds between detections with no motion and no faces
+    face_interval: seconds between detections while faces are in view but nothing moves
+    hold: seconds detection keeps running after faces disappear
+    """
+
+    def __init__(self, detector, width: int=64, threshold: int=18, min_area: float=0.004,
+                 max_interval: float=2.0, face_interval: float=0.5, hold: float=1.0, learning_rate: float=0.05):
+        self.detector = detector
+        self.width = width
+        self.threshold = threshold
+        self.min_area = min_area
+        self.max_interval = max_interval
+        self.face_interval = face_interval
+        self.hold = hold
+        self.learning_rate = learning_rate
+        self.enabled = True
+        self.fresh = True  # Whether the last boxes came from running the detector on that frame
+        self.runs = 0
+        self.skipped = 0
+        self.reset()
+
+    def reset(self):
+        self.background = None
+        self.boxes = NO_FACES
+        self.motion = 0.0  # Changed fraction of the last frame
+        self._last_run = 0.0
+        self._hold_until = 0.0
+        self._tiny = None
+        self._diff = None
+
+    def _update_motion(self, gray):
+        height, width = gray.shape[:2]
+        size = (self.width, max(int(round(height * self.width / width)), 1))
+        if self._tiny is None or self._tiny.shape[::-1] != size:
+            self._tiny = np.empty(size[::-1], dtype=np.uint8)
+            self._diff = np.empty(size[::-1], dtype=np.uint8)
+            self.background = None
+        cv2.resize(gray, size, dst=self._tiny, interpolation=cv2.INTER_AREA)
+        if self.background is None:
+            self.background = self._tiny.astype(np.float32)
+            return 1.0
+        cv2.absdiff(self._tiny, self.background.astype(np.uint8), dst=self._diff)
+        changed = cv2.countNonZero(cv2.threshold(self._diff, self.threshold, 255, cv2.THRESH_BINARY)[1])
+        # Slow blend so lighting drift and a person who stops moving fade into the background
+        cv2.accumulateWeighted(self._tiny, self.background, self.learning_rate)
+        return changed / self._diff.size
+
+    def detect(self, gray, input_scale: float=1.0):
+        if not self.enabled:
+            boxes = self.detector.detect(gray, input_scale)
+            self.fresh = getattr(self.detector, "fresh", True)
+            return boxes
+        now = time.monotonic()
+        self.motion = self._update_motion(gray)
+        interval = self.face_interval if len(self.boxes) else self.max_interval
+        static = self.motion < self.min_area
+        if static and now >= self._hold_until and now - self._last_run < interval:
+            self.skipped += 1
+            self.fresh = False
+            return self.boxes
+        boxes = self.detector.detect(gray, input_scale)
+        self.fresh = getattr(self.detector, "fresh", True)
+        if len(self.boxes) and not len(boxes):
+            # Faces just vanished, keep looking for a moment in case it was a missed frame
+            self._hold_until = now + self.hold
+        self.boxes = boxes
+        self._last_run = now
+        self.runs += 1
+        return boxes
@@ -0,0 +1,401 @@
+# File: pipeline.py
+# Staged capture -> detect -> present pipeline
+# Each stage runs on its own thread and they only meet in fixed-size frame rings,
+# so a slow detectMultiScale never throttles capture: stale frames are dropped instead
+
+import threading
+import time
+from dataclasses import dataclass, field, replace
+
+import cv2
+import numpy as np
+
+from detector import NO_FACES
+from esp32cam import FRAMESIZES
+from metrics import Metrics
+from mjpeg import REDUCTIONS, decode_color, decode_gray, reduction_for
+
+DROP_OLDEST = "drop_oldest"  # Writer overwrites the oldest slot, never blocks
+DROP_NEWEST = "drop_newest"  # Writer discards the incoming frame while every slot is unread
+
+
+class FrameRing:
+    """Ring of preallocated frame slots shared between one writer and any number of readers
+
+    Readers keep their own sequence cursor and either take the newest frame (latest=True)
+    or walk frames in order. Reads copy into a caller-owned buffer so slots can be reused.
+    """
+
+    def __init__(self, slots: int=4, slot_bytes: int=None, policy: str=DROP_OLDEST):
+        if policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"Unknown drop policy {policy}")
+        if slot_bytes is None:
+            width, height = FRAMESIZES[max(FRAMESIZES)]
+            slot_bytes = width * height * 3
+        self.slots = slots
+        self.policy = policy
+        self._buffers = [np.empty(slot_bytes, dtype=np.uint8) for _ in range(slots)]
+        self._meta = [None] * slots  # (seq, timestamp, frame_id, shape, dtype)
+        self._next_seq = 1
+        self._read_seq = 1  # Oldest frame an in-order reader has not taken yet
+        self._cond = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, frame, timestamp: float, frame_id: int=0, valid=None):
+        """Copy a frame into the next slot, return its sequence number or None if dropped
+
+        valid: optional callable checked after the copy, for zero-copy sources whose frame can be
+        overwritten while it is copied (framebus.BusSource); the frame is dropped if it returns False
+        """
+        with self._cond:
+            if self._next_seq - self._read_seq >= self.slots:
+                if self.policy == DROP_NEWEST:
+                    self.dropped += 1
+                    return None
+                # Oldest unread frame is about to be overwritten
+                self._read_seq += 1
+                self.dropped += 1
+            seq = self._next_seq
+            index = seq % self.slots
+            nbytes = frame.nbytes
+            if nbytes > self._buffers[index].size:
+                self._buffers[index] = np.empty(nbytes, dtype=np.uint8)
+            np.copyto(self._buffers[index][:nbytes].view(frame.dtype).reshape(frame.shape), frame)
+            if valid is not None and not valid():
+                # Torn copy; the slot's previous frame is gone as well, get() skips it
+                self._meta[index] = None
+                self.dropped += 1
+                return None
+            self._meta[index] = (seq, timestamp, frame_id, frame.shape, frame.dtype)
+            self._next_seq += 1
+            self._cond.notify_all()
+            return seq
+
+    def get(self, after: int=0, latest: bool=True, timeout: float=1.0, out=None):
+        """Wait for a frame newer than sequence `after`
+
+        Returns (seq, timestamp, frame_id, frame) or None on timeout/close.
+        `out` is reused as the destination when its shape and dtype match.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.closed or self._next_seq - 1 > after, timeout):
+                return None
+            if self.closed:
+                return None
+            newest = self._next_seq - 1
+            oldest = max(self._next_seq - self.slots, 1)
+            seq = newest if latest else max(after + 1, oldest)
+            while self._meta[seq % self.slots] is None or self._meta[seq % self.slots][0] != seq:
+                # Only in-order reads get here, over slots emptied by a torn put(); newest is always intact
+                seq += 1
+            if latest:
+                self._read_seq = self._next_seq
+            else:
+                self._read_seq = max(self._read_seq, seq + 1)
+            _, timestamp, frame_id, shape, dtype = self._meta[seq % self.slots]
+            src = self._buffers[seq % self.slots][:int(np.prod(shape)) * np.dtype(dtype).itemsize]
+            src = src.view(dtype).reshape(shape)
+            if len(shape) == 1 and out is not None and out.ndim == 1 and out.dtype == dtype:
+                # Variable-length payloads (JPEG bytes) reuse any earlier buffer that is large enough
+                base = out.base if isinstance(out.base, np.ndarray) else out
+                if base.ndim == 1 and base.size >= shape[0]:
+                    out = base[:shape[0]]
+            if out is None or out.shape != shape or out.dtype != dtype:
+                out = np.empty(shape[0] * 2, dtype=dtype)[:shape[0]] if len(shape) == 1 else np.empty(shape, dtype=dtype)
+            np.copyto(out, src)
+            return seq, timestamp, frame_id, out
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+@dataclass
+class DetectionRecord:
+    """Faces found in one frame, timestamped with the frame's arrival time"""
+    frame_id: int
+    timestamp: float  # When the frame arrived from the camera
+    detect_time: float  # When detection finished
+    frame_size: tuple  # (width, height) the boxes refer to
+    boxes: np.ndarray = field(default_factory=lambda: NO_FACES)
+    distances: list = field(default_factory=list)  # Filled in by subscribers, cm per box
+    track_ids: np.ndarray = None  # Persistent face identity per box, when tracked
+    fresh: bool = True  # False when the boxes were reused by the motion gate or moved by the tracker
+
+    @property
+    def latency(self):
+        return self.detect_time - self.timestamp
+
+
+class DetectionBus:
+    """Latest-wins publication of DetectionRecords with synchronous subscribers"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._latest = None
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        """callback(record) runs on the detect worker before the record becomes visible, keep it short"""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def publish(self, record):
+        for callback in list(self._subscribers):
+            try:
+                callback(record)
+            except Exception as e:
+                print(f"Detection subscriber error: {e}")
+        with self._cond:
+            self._latest = record
+            self._cond.notify_all()
+
+    def latest(self):
+        with self._cond:
+            return self._latest
+
+    def wait(self, after_id: int=0, timeout: float=1.0):
+        """Wait for a record with frame_id > after_id, None on timeout"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._latest is not None and self._latest.frame_id > after_id, timeout)
+            if self._latest is not None and self._latest.frame_id > after_id:
+                return self._latest
+            return None
+
+
+def prepare_gray(frame):
+    """Grayscale + histogram equalization used ahead of every detector"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.equalizeHist(gray)
+
+
+def draw_boxes(frame, record):
+    for i, (x, y, w, h) in enumerate(record.boxes):
+        cv2.rectangle(frame, (int(x), int(y)), (int(x + w), int(y + h)), (255, 255, 0), 4)
+        if i < len(record.distances) and record.distances[i]:
+            cv2.putText(frame, f"Distance: {record.distances[i]:.2f} cm", (int(x), int(y) - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+    return frame
+
+
+def fit_size(width, height, bounds):
+    """Largest size with the frame's aspect ratio that fits in bounds (width, height)"""
+    if not bounds or bounds[0] < 2 or bounds[1] < 2:
+        return width, height
+    scale = min(bounds[0] / width, bounds[1] / height)
+    return max(int(width * scale), 1), max(int(height * scale), 1)
+
+
+class Pipeline:
+    """Capture, detection and presentation workers joined by FrameRings
+
+    source: MJPEGStream (read_jpeg) or anything with a cv2.VideoCapture style read()
+    detector: object with detect(gray, input_scale) -> (N, 4) boxes at full resolution
+    decode_reduction: 1, 2, 4 or 8 for the detection decode, None derives it from the detector scale
+    metrics: Metrics that stage timings go into, a private one if None
+
+    JPEG sources are carried compressed through the capture ring. Detection decodes straight to
+    grayscale at reduced size, full color is only decoded by the present stage.
+    """
+
+    def __init__(self, source, detector, ring_slots: int=4, annotate=draw_boxes, present: bool=True,
+                 max_record_age: float=0.5, metrics=None, decode_reduction: int=None):
+        self.source = source
+        self.detector = detector
+        self.annotate = annotate
+        self.present = present
+        self.max_record_age = max_record_age  # Boxes older than this are not drawn
+        self.detection_enabled = True
+        self.decode_reduction = decode_reduction
+        self.frame_size = None  # Full (width, height) of the latest decoded frame
+        self.display_size = None  # (width, height) to fit displayed frames into, None keeps camera size
+        self.capture_ring = FrameRing(ring_slots, policy=DROP_OLDEST)
+        self.display_ring = FrameRing(2, policy=DROP_OLDEST)
+        self.bus = DetectionBus()
+        self.metrics = metrics or Metrics()
+        self.metrics.gauge("capture_ring_dropped", lambda: self.capture_ring.dropped)
+        self.metrics.gauge("display_ring_dropped", lambda: self.display_ring.dropped)
+        self.metrics.gauge("stream_frames_dropped", lambda: getattr(self.source, "frames_dropped", None))
+        self.metrics.gauge("stream_reconnects", lambda: getattr(self.source, "reconnects", None))
+        self.metrics.gauge("detect_skipped", lambda: getattr(self.detector, "skipped", None))
+
+        self.counts = {"capture": 0, "detect": 0, "present": 0}
+        self._frame_id = 0  # Numbers frames from sources without their own ids
+        self._rate_start = time.monotonic()
+        self._rate_counts = dict(self.counts)
+
+        self._stop_event = threading.Event()
+        self._threads = []
+
+    def start(self):
+        targets = [self._capture_loop, self._detect_loop]
+        if self.present:
+            targets.append(self._present_loop)
+        for target in targets:
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        self.capture_ring.close()
+        self.display_ring.close()
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads = []
+
+    def set_source(self, source):
+        """Swap the frame source, e.g. after a reconnect"""
+        self.source = source
+
+    def rates(self):
+        """Frames per second per stage since the last call"""
+        now = time.monotonic()
+        elapsed = max(now - self._rate_start, 1e-6)
+        rates = {k: (self.counts[k] - self._rate_counts[k]) / elapsed for k in self.counts}
+        self._rate_start = now
+        self._rate_counts = dict(self.counts)
+        return rates
+
+    def _read_source(self):
+        source = self.source
+        if source is None or not source.isOpened():
+            self._stop_event.wait(0.1)
+            return None
+        if hasattr(source, "read_jpeg"):
+            # grab is time spent waiting on the stream, i.e. the camera's frame interval when idle
+            t0 = time.perf_counter()
+            part = source.read_jpeg(timeout=0.5)
+            if part is None or len(part.jpeg) == 0:
+                return None
+            self.metrics.observe("grab", time.perf_counter() - t0)
+            # Still compressed, each consumer decodes only what it needs
+            valid = getattr(source, "valid", None)
+            return (part.frame_id, part.timestamp, np.frombuffer(part.jpeg, dtype=np.uint8),
+                    (lambda: valid(part)) if valid is not None else None)
+        t0 = time.perf_counter()
+        ret, frame = source.read()
+        self.metrics.observe("grab", time.perf_counter() - t0)
+        if not ret:
+            return None
+        self._frame_id += 1
+        return self._frame_id, time.time(), frame, None
+
+    def _capture_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                item = self._read_source()
+            except Exception as e:
+                print(f"Capture error: {e}")
+                item = None
+            if item is None:
+                continue
+            frame_id, timestamp, frame, valid = item
+            self.capture_ring.put(frame, timestamp, frame_id, valid)
+            self.counts["capture"] += 1
+
+    def _detect_loop(self):
+        seq = 0
+        frame = None
+        while not self._stop_event.is_set():
+            if not self.detection_enabled:
+                self._stop_event.wait(0.05)
+                continue
+            item = self.capture_ring.get(after=seq, latest=True, timeout=0.5, out=frame)
+            if item is None:
+                continue
+            seq, timestamp, frame_id, frame = item
+            try:
+                t0 = time.perf_counter()
+                if frame.ndim == 1:
+                    reduction = self.detect_reduction()
+                    gray = decode_gray(frame, reduction)
+                    if gray is None:
+                        continue
+                    cv2.equalizeHist(gray, dst=gray)
+                    size = (gray.shape[1] * reduction, gray.shape[0] * reduction)
+                    self.frame_size = size
+                    self.metrics.observe("decode_gray", time.perf_counter() - t0)
+                else:
+                    reduction = 1
+                    gray = prepare_gray(frame)
+                    size = (frame.shape[1], frame.shape[0])
+                    self.metrics.observe("gray", time.perf_counter() - t0)
+                t1 = time.perf_counter()
+                boxes = self.detector.detect(gray, 1.0 / reduction)
+                fresh = getattr(self.detector, "fresh", True)
+                self.metrics.observe("detect", time.perf_counter() - t1)
+            except Exception as e:
+                self.metrics.inc("detect_errors")
+                print(f"Face detection error: {e}")
+                continue
+            self.bus.publish(DetectionRecord(frame_id, timestamp, time.time(), size, boxes, fresh=fresh))
+            self.counts["detect"] += 1
+
+    def detect_reduction(self):
+        if self.decode_reduction:
+            return self.decode_reduction
+        detector = self.detector
+        while hasattr(detector, "detector"):
+            # Unwrap MotionGatedDetector / TrackingDetector down to the one that scales
+            detector = detector.detector
+        return reduction_for(getattr(detector, "scale", 1.0))
+
+    def _display_reduction(self):
+        # Decode no larger than the display needs when the frame will be scaled down anyway
+        if not self.display_size or not self.frame_size:
+            return 1
+        width, height = self.frame_size
+        return max(r for r in REDUCTIONS
+                   if width / r >= self.display_size[0] and height / r >= self.display_size[1] or r == 1)
+
+    def _present_loop(self):
+        seq = 0
+        payload = None
+        resized = None
+        rgb = None
+        while not self._stop_event.is_set():
+            item = self.capture_ring.get(after=seq, latest=True, timeout=0.5, out=payload)
+            if item is None:
+                continue
+            seq, timestamp, frame_id, payload = item
+            reduction = 1
+            if payload.ndim == 1:
+                t0 = time.perf_counter()
+                reduction = self._display_reduction()
+                frame = decode_color(payload, reduction)
+                if frame is None:
+                    continue
+                self.frame_size = self.frame_size or (frame.shape[1] * reduction, frame.shape[0] * reduction)
+                self.metrics.observe("decode_color", time.perf_counter() - t0)
+            else:
+                frame = payload
+            record = self.bus.latest() if self.detection_enabled else None
+            if record is not None and timestamp - record.timestamp > self.max_record_age:
+                record = None
+            if record is not None and self.annotate is not None:
+                if reduction != 1 and len(record.boxes):
+                    record = replace(record, boxes=record.boxes // reduction)
+                with self.metrics.time("draw"):
+                    self.annotate(frame, record)
+            t0 = time.perf_counter()
+            out = frame
+            size = fit_size(frame.shape[1], frame.shape[0], self.display_size)
+            if size != (frame.shape[1], frame.shape[0]):
+                # Scale on this worker into a reused buffer, the Tk thread only blits
+                if resized is None or resized.shape[:2] != (size[1], size[0]):
+                    resized = np.empty((size[1], size[0], 3), dtype=np.uint8)
+                cv2.resize(frame, size, dst=resized, interpolation=cv2.INTER_AREA)
+                out = resized
+            if rgb is None or rgb.shape != out.shape:
+                rgb = np.empty_like(out)
+            cv2.cvtColor(out, cv2.COLOR_BGR2RGB, dst=rgb)
+            self.metrics.observe("convert", time.perf_counter() - t0)
+            self.display_ring.put(rgb, timestamp, frame_id)
+            self.counts["present"] += 1
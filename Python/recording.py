@@ -0,0 +1,308 @@
+# File: recording.py
+# Append-only recording of the raw ESP32 JPEG parts and memory-mapped replay
+# The data file holds the JPEGs exactly as they came off the stream (no re-encode), each behind a
+# small record header; <path>.idx is a fixed-size (timestamp, camera timestamp, offset, length) table.
+# Usage: python recording.py record http://10.0.0.15 session.mjr
+#        python recording.py info session.mjr
+
+import argparse
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from mjpeg import JPEGPart, decode_jpeg
+
+MAGIC = b"MJR1"
+RECORD_HEADER = struct.Struct("<4sddI")  # b"FRM0", timestamp, camera timestamp (NaN if none), length
+RECORD_MAGIC = b"FRM0"
+INDEX_ENTRY = struct.Struct("<ddQI")  # timestamp, camera timestamp, offset of the JPEG, length
+INDEX_DTYPE = np.dtype([("timestamp", "<f8"), ("camera_timestamp", "<f8"), ("offset", "<u8"), ("length", "<u4")])
+
+
+def index_path(path):
+    return path + ".idx"
+
+
+class Recorder:
+    """Writes JPEG parts to a recording, safe to call from the stream reader thread"""
+
+    def __init__(self, path: str, flush_every: int=30):
+        self.path = path
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        append = os.path.exists(path) and os.path.getsize(path) > 0
+        self._data = open(path, "ab")
+        self._index = open(index_path(path), "ab")
+        if not append:
+            self._data.write(MAGIC)
+        self._offset = self._data.tell()
+        self._stream = None
+        self.frames = 0
+        self.bytes = 0
+
+    def write(self, jpeg, timestamp=None, camera_timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        camera_ts = math.nan if camera_timestamp is None else camera_timestamp
+        with self._lock:
+            if self._data is None:
+                return
+            self._data.write(RECORD_HEADER.pack(RECORD_MAGIC, timestamp, camera_ts, len(jpeg)))
+            self._data.write(jpeg)
+            self._index.write(INDEX_ENTRY.pack(timestamp, camera_ts, self._offset + RECORD_HEADER.size, len(jpeg)))
+            self._offset += RECORD_HEADER.size + len(jpeg)
+            self.frames += 1
+            self.bytes += len(jpeg)
+            if self.frames % self.flush_every == 0:
+                self._flush()
+
+    def _flush(self):
+        # Data before index, so the index never points past the end of the data
+        self._data.flush()
+        self._index.flush()
+
+    def attach(self, stream):
+        """Record every part an MJPEGStream receives, including ones the consumer drops"""
+        self.detach()
+        stream.part_callbacks.append(self.write)
+        self._stream = stream
+        return self
+
+    def detach(self):
+        if self._stream is not None and self.write in self._stream.part_callbacks:
+            self._stream.part_callbacks.remove(self.write)
+        self._stream = None
+
+    def close(self):
+        self.detach()
+        with self._lock:
+            if self._data is None:
+                return
+            self._flush()
+            self._data.close()
+            self._index.close()
+            self._data = self._index = None
+
+
+def rebuild_index(path):
+    """Recreate <path>.idx by walking the record headers, e.g. after the index was lost"""
+    entries = []
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a recording")
+        offset = len(MAGIC)
+        size = os.fstat(f.fileno()).st_size
+        while offset + RECORD_HEADER.size <= size:
+            magic, timestamp, camera_ts, length = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+            if magic != RECORD_MAGIC or offset + RECORD_HEADER.size + length > size:
+                break
+            entries.append(INDEX_ENTRY.pack(timestamp, camera_ts, offset + RECORD_HEADER.size, length))
+            offset += RECORD_HEADER.size + length
+            f.seek(offset)
+    with open(index_path(path), "wb") as f:
+        f.write(b"".join(entries))
+    return len(entries)
+
+
+def load_index(path):
+    """Index as a structured array, trailing entries beyond the data (interrupted write) dropped"""
+    if not os.path.exists(index_path(path)):
+        rebuild_index(path)
+    index = np.fromfile(index_path(path), dtype=INDEX_DTYPE, count=os.path.getsize(index_path(path)) // INDEX_DTYPE.itemsize)
+    size = os.path.getsize(path)
+    return index[index["offset"] + index["length"] <= size]
+
+
+class ReplaySource:
+    """Plays a recording back with the MJPEGStream interface, so Pipeline/run_camera can use it
+
+    realtime=True paces frames by their recorded timestamps (scaled by speed) and, like the live
+    stream, skips frames the consumer is too slow for. realtime=False hands out every frame as
+    fast as it is read. Parts share memory with the mapped file, nothing is copied.
+    """
+
+    def __init__(self, path: str, realtime: bool=True, speed: float=1.0, loop: bool=False):
+        self.path = path
+        self.realtime = realtime
+        self.speed = speed
+        self.loop = loop
+        self.index = load_index(path)
+        self.timestamps = self.index["timestamp"]
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffer = np.frombuffer(self._mmap, dtype=np.uint8)
+        self._lock = threading.Lock()
+        self._position = 0  # Next record to hand out
+        self._anchor = None  # (wall clock, recording time) pacing reference
+        self._opened = True
+        self._pending = None
+        self._latest = None
+        self._frame_id = 0
+        self.part_callbacks = []
+
+        # Same stats as MJPEGStream
+        self.frames_received = 0
+        self.frames_dropped = 0
+        self.reconnects = 0
+        self.connected = True
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def duration(self):
+        return float(self.timestamps[-1] - self.timestamps[0]) if len(self.index) else 0.0
+
+    @property
+    def position(self):
+        """Recording time in seconds of the next frame"""
+        with self._lock:
+            if self._position >= len(self.index):
+                return self.duration
+            return float(self.timestamps[self._position] - self.timestamps[0])
+
+    def start(self):
+        return self
+
+    def restart(self):
+        self.seek(0)
+
+    def release(self):
+        self._opened = False
+        self._buffer = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            # A consumer still holds a part, the mapping goes away with it
+            pass
+        self._file.close()
+
+    stop = release
+
+    def isOpened(self):
+        return self._opened and (self.loop or self._position < len(self.index))
+
+    def seek(self, seconds):
+        """Jump to the first frame at or after `seconds` from the start of the recording"""
+        with self._lock:
+            if len(self.index):
+                target = self.timestamps[0] + seconds
+                self._position = int(np.searchsorted(self.timestamps, target, side="left"))
+            self._anchor = None
+
+    def _next_index(self, timeout):
+        # Called with the lock held, returns the record to hand out or None
+        count = len(self.index)
+        if self._position >= count:
+            if not self.loop or count == 0:
+                return None
+            self._position = 0
+            self._anchor = None
+        if not self.realtime:
+            return self._position
+        now = time.monotonic()
+        if self._anchor is None:
+            self._anchor = (now, self.timestamps[self._position])
+        wall, start = self._anchor
+        due = wall + (self.timestamps[self._position] - start) / self.speed
+        if due - now > timeout:
+            return None
+        if due > now:
+            self._lock.release()
+            try:
+                time.sleep(due - now)
+            finally:
+                self._lock.acquire()
+            now = time.monotonic()
+        # Latest-wins: skip everything that is already due
+        clock = start + (now - wall) * self.speed
+        newest = int(np.searchsorted(self.timestamps, clock, side="right")) - 1
+        skipped = max(newest - self._position, 0)
+        self.frames_dropped += skipped
+        return self._position + skipped
+
+    def read_jpeg(self, timeout: float=1.0):
+        with self._lock:
+            if not self._opened:
+                return None
+            i = self._next_index(timeout)
+            if i is None:
+                return None
+            self._position = i + 1
+            entry = self.index[i]
+            offset = int(entry["offset"])
+            jpeg = self._buffer[offset:offset + int(entry["length"])]
+            camera_ts = float(entry["camera_timestamp"])
+            self._frame_id += 1
+            self.frames_received += 1
+            # timestamp is delivery time, so pipeline latencies mean the same as on a live stream
+            part = JPEGPart(self._frame_id, time.time(), jpeg, None if math.isnan(camera_ts) else camera_ts)
+            self._latest = part
+        for callback in self.part_callbacks:
+            callback(part.jpeg, part.timestamp, part.camera_timestamp)
+        return part
+
+    def latest(self):
+        return self._latest
+
+    def grab(self, timeout: float=1.0):
+        self._pending = self.read_jpeg(timeout)
+        return self._pending is not None
+
+    def retrieve(self, flags=cv2.IMREAD_COLOR):
+        part = self._pending
+        if part is None:
+            return False, None
+        frame = decode_jpeg(part.jpeg, flags)
+        return frame is not None, frame
+
+    def read(self, timeout: float=1.0):
+        if not self.grab(timeout):
+            return False, None
+        return self.retrieve()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record or inspect ESP32 stream recordings")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record = commands.add_parser("record", help="record a camera stream")
+    record.add_argument("url", help="camera base URL, e.g. http://10.0.0.15")
+    record.add_argument("path")
+    record.add_argument("--duration", type=float, default=0, help="seconds, 0 records until Ctrl+C")
+    info = commands.add_parser("info", help="print frame count, duration and rate")
+    info.add_argument("path")
+    commands.add_parser("reindex", help="rebuild the index from the data file").add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        from esp32cam import stream_url
+        from mjpeg import MJPEGStream
+        stream = MJPEGStream(stream_url(args.url))
+        recorder = Recorder(args.path).attach(stream)
+        stream.start()
+        start = time.monotonic()
+        try:
+            while not args.duration or time.monotonic() - start < args.duration:
+                time.sleep(1)
+                print(f"{recorder.frames} frames, {recorder.bytes / 1e6:.1f} MB")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stream.release()
+            recorder.close()
+    elif args.command == "info":
+        index = load_index(args.path)
+        duration = float(index["timestamp"][-1] - index["timestamp"][0]) if len(index) else 0.0
+        print(f"{len(index)} frames, {duration:.1f} s, {len(index) / max(duration, 1e-9):.1f} FPS, "
+              f"{int(index['length'].sum()) / 1e6:.1f} MB of JPEG")
+    else:
+        print(f"{rebuild_index(args.path)} frames indexed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+# File: service.py
+# Headless tracking service: capture + detection with no GUI, no drawing and no RGB conversion
+# Every detection is emitted as one compact JSON line on stdout or to clients of a local socket
+# Usage: python service.py http://10.0.0.15 --framesize 8 --profile fast --listen 9100
+#        nc localhost 9100
+
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+from OpenCV import CameraSession
+from calibration import FocalProfile, framesize_of
+from camera_control import CameraControl
+from detector import load_profile
+from detector_engine import BACKENDS, create_detector, resolve_backend
+from esp32cam import FRAMESIZES
+from metrics import JSONDumper, Metrics, serve
+from motion import MotionGatedDetector
+from pipeline import Pipeline
+from tracker import TrackingDetector
+from tracks import FaceTrackSet
+
+
+def record_to_json(record):
+    """One DetectionRecord as a JSON line, boxes in px at the camera framesize, distances in cm"""
+    message = {
+        "frame_id": record.frame_id,
+        "timestamp": round(record.timestamp, 4),
+        "latency_ms": round(1000.0 * record.latency, 1),
+        "size": list(record.frame_size),
+        "boxes": [[int(v) for v in box] for box in record.boxes],
+    }
+    if record.distances:
+        message["distances"] = [round(float(d), 1) for d in record.distances]
+    if record.track_ids is not None:
+        message["tracks"] = [int(i) for i in record.track_ids]
+    return json.dumps(message, separators=(",", ":"))
+
+
+class StdoutSink:
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def send(self, line):
+        try:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+        except BrokenPipeError:
+            # Reader went away (e.g. `| head`), keep running quietly
+            pass
+
+    def close(self):
+        pass
+
+
+class LineServer:
+    """Broadcasts lines to every client of a local TCP port or Unix socket
+
+    Sends never block the detect worker: each client has a bounded backlog and is
+    disconnected when it stops reading.
+    """
+
+    def __init__(self, address, max_backlog: int=256 * 1024):
+        self.address = address
+        self.max_backlog = max_backlog
+        if isinstance(address, int):
+            self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._server.bind(("127.0.0.1", address))
+        else:
+            if os.path.exists(address):
+                os.unlink(address)
+            self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._server.bind(address)
+        self._server.listen(8)
+        self._clients = {}  # socket -> pending bytes
+        self._lock = threading.Lock()
+        self._closed = False
+        self.dropped_clients = 0
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def _accept_loop(self):
+        while not self._closed:
+            try:
+                client, _ = self._server.accept()
+            except OSError:
+                return
+            client.setblocking(False)
+            with self._lock:
+                self._clients[client] = bytearray()
+
+    def send(self, line):
+        data = (line + "\n").encode()
+        with self._lock:
+            for client, pending in list(self._clients.items()):
+                pending += data
+                try:
+                    sent = client.send(pending)
+                    del pending[:sent]
+                except BlockingIOError:
+                    pass
+                except OSError:
+                    self._drop(client)
+                    continue
+                if len(pending) > self.max_backlog:
+                    self._drop(client)
+
+    def _drop(self, client):
+        self._clients.pop(client, None)
+        self.dropped_clients += 1
+        client.close()
+
+    def close(self):
+        self._closed = True
+        self._server.close()
+        with self._lock:
+            for client in self._clients:
+                client.close()
+            self._clients = {}
+        if not isinstance(self.address, int) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+
+class TrackingService:
+    """Pipeline without the present stage, publishing every DetectionRecord to a sink"""
+
+    def __init__(self, url: str, sink, framesize: int=None, quality: int=None, profile: str="default",
+                 cascade: str=None, tracking: bool=False, focal_length: float=None, metrics=None,
+                 source: str="stream", motion_gate: bool=True, backend: str="haar"):
+        self.url = url
+        self.sink = sink
+        self.settings = {k: v for k, v in (("framesize", framesize), ("quality", quality)) if v is not None}
+        self.control = CameraControl(url)
+        # Sensor changes are confirmed before the stream is opened, so the first frame has the new size
+        self.backend = resolve_backend(backend, framesize)
+        self.session = CameraSession(url, self.backend, cascade, control=self.control, settings=self.settings,
+                                     source=source)
+        # Without --focal-length, distances come from the saved calibration profile, rescaled per framesize
+        self.focal_profile = None if focal_length else FocalProfile.load()
+        self.detector = create_detector(self.backend, None, load_profile(profile), focal_length)
+        detector = TrackingDetector(self.detector, interval=10) if tracking else self.detector
+        if motion_gate:
+            detector = MotionGatedDetector(detector)
+        self.focal_length = focal_length
+        self.face_tracks = FaceTrackSet()
+        self.stream = None
+        self.metrics = metrics or Metrics()
+        self.metrics.gauge("control_calls", lambda: self.control.control_calls)
+        self.pipeline = Pipeline(None, detector, annotate=None, present=False, metrics=self.metrics)
+        self.pipeline.bus.subscribe(self.on_detections)
+
+    def start(self):
+        """Returns at once, detection starts when the cascade and camera become available"""
+        self.pipeline.start()
+        self.session.classifier.add_done_callback(lambda f: self.detector.set_classifier(f.result()))
+        self.session.stream.add_done_callback(self._attach)
+        self.session.start()
+        return self
+
+    def _attach(self, future):
+        self.stream = future.result()
+        self.pipeline.set_source(self.stream)
+        print("Camera connected", file=sys.stderr)
+
+    def stop(self):
+        self.pipeline.stop()
+        self.session.stop()
+        self.control.close()
+        self.sink.close()
+
+    def on_detections(self, record):
+        if self.focal_profile is not None:
+            focal_length = self.focal_profile.focal_for(framesize_of(record.frame_size))
+            if focal_length is not None and focal_length != self.focal_length:
+                self.focal_length = focal_length
+                self.detector.set_focal_length(focal_length)
+        record.track_ids, distances = self.face_tracks.update(record.boxes, record.timestamp, self.focal_length)
+        if self.focal_length:
+            record.distances = distances.tolist()
+        self.sink.send(record_to_json(record))
+        self.metrics.inc("records_sent")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless face tracking service")
+    parser.add_argument("url", nargs="?", default="http://10.0.0.15", help="camera base URL, .mjr recording or shm://NAME from framebus.py")
+    parser.add_argument("--framesize", type=int, choices=sorted(FRAMESIZES), default=None,
+                        help="camera framesize index, unchanged if omitted")
+    parser.add_argument("--quality", type=int, default=None, help="JPEG quality 10-63, lower is better")
+    parser.add_argument("--source", choices=["stream", "capture"], default="stream",
+                        help="read /stream or poll /capture with overlapping requests")
+    parser.add_argument("--profile", default="default", help="detector profile name or JSON file")
+    parser.add_argument("--backend", choices=BACKENDS + ("auto",), default="haar",
+                        help="face detector, auto uses the one detector_engine.py selected for this framesize")
+    parser.add_argument("--cascade", default=None, help="cascade file overriding the haar/lbp default")
+    parser.add_argument("--track", action="store_true", help="template tracking between cascade runs")
+    parser.add_argument("--no-motion-gate", action="store_true", help="run detection on every frame")
+    parser.add_argument("--focal-length", type=float, default=None, help="focal length in px for distances, default from the GUI calibration profile")
+    parser.add_argument("--listen", default=None,
+                        help="local TCP port or Unix socket path to serve JSON lines on, stdout if omitted")
+    parser.add_argument("--metrics-port", type=int, default=9101, help="localhost /metrics port, 0 disables it")
+    parser.add_argument("--metrics-json", default=None, help="append a metrics snapshot to this file periodically")
+    parser.add_argument("--metrics-interval", type=float, default=10.0)
+    args = parser.parse_args(argv)
+
+    if args.listen is None:
+        sink = StdoutSink(sys.stdout)
+        # Keep stdout for records only, log prints from other modules go to stderr
+        sys.stdout = sys.stderr
+    else:
+        sink = LineServer(int(args.listen) if args.listen.isdigit() else args.listen)
+    service = TrackingService(args.url, sink, args.framesize, args.quality, args.profile, args.cascade,
+                              args.track, args.focal_length, source=args.source,
+                              motion_gate=not args.no_motion_gate, backend=args.backend)
+    services = []
+    if args.metrics_port:
+        services = serve(service.metrics, args.metrics_port, args.metrics_json, args.metrics_interval)
+    elif args.metrics_json:
+        services = [JSONDumper(service.metrics, args.metrics_json, args.metrics_interval).start()]
+    service.start()
+    try:
+        while True:
+            time.sleep(5)
+            rates = service.pipeline.rates()
+            if service.stream is None:
+                print(f"Camera {service.session.state} (attempt {service.session.attempts})", file=sys.stderr)
+                continue
+            print(f"capture {rates['capture']:.1f} FPS, detect {rates['detect']:.1f} FPS, "
+                  f"dropped {service.stream.frames_dropped}, reconnects {service.stream.reconnects}",
+                  file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        for started in services:
+            started.stop()
+
+
+if __name__ == "__main__":
+    main()
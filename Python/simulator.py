@@ -0,0 +1,420 @@
+# File: simulator.py
+# Local stand-in for the ESP32-CAM board so the Python side can run without hardware
+# Serves the same endpoints as app_httpd.cpp and the port 100 bridge from the .ino sketch
+# Usage: python simulator.py --host 127.0.0.1 --source session.mp4 --fps 20 --dropout 0.01
+#        python simulator.py --http-port 8080 --bridge-port 8100   (unprivileged, clients use http://127.0.0.1:8080)
+
+import argparse
+import glob
+import json
+import os
+import random
+import socket
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import cv2
+import numpy as np
+
+from esp32cam import BRIDGE_PORT, FRAMESIZES, HTTP_PORT, PART_BOUNDARY, QUALITY_MAX, QUALITY_MIN
+
+_STREAM_CONTENT_TYPE = "multipart/x-mixed-replace;boundary=" + PART_BOUNDARY
+_STREAM_BOUNDARY = ("\r\n--" + PART_BOUNDARY + "\r\n").encode()
+_STREAM_PART = "Content-Type: image/jpeg\r\nContent-Length: {}\r\nX-Timestamp: {:.6f}\r\n\r\n"
+
+
+def esp_quality_to_cv2(quality):
+    """Map ESP32 quality (10 best .. 63 worst) onto cv2's 0-100 JPEG scale"""
+    quality = min(max(quality, QUALITY_MIN), QUALITY_MAX)
+    return int(round(95 - (quality - QUALITY_MIN) * 85 / (QUALITY_MAX - QUALITY_MIN)))
+
+
+class FrameSource:
+    """Frames from a video file, an image directory/glob, or a synthetic moving target"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.images = []
+        self.cap = None
+        self.index = 0
+        if path:
+            if os.path.isdir(path):
+                self.images = sorted(glob.glob(os.path.join(path, "*.jpg")) + glob.glob(os.path.join(path, "*.png")))
+            elif any(c in path for c in "*?["):
+                self.images = sorted(glob.glob(path))
+            else:
+                self.cap = cv2.VideoCapture(path)
+                if not self.cap.isOpened():
+                    raise ValueError(f"Cannot open video {path}")
+        self._background = {}
+
+    def next_frame(self, width, height):
+        frame = None
+        if self.cap is not None:
+            ok, frame = self.cap.read()
+            if not ok:
+                # Loop the recording
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ok, frame = self.cap.read()
+        elif self.images:
+            frame = cv2.imread(self.images[self.index % len(self.images)])
+            self.index += 1
+        if frame is None:
+            return self._synthetic(width, height)
+        if frame.shape[1] != width or frame.shape[0] != height:
+            frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+        return frame
+
+    def _synthetic(self, width, height):
+        # Gradient background with a face-sized blob drifting across it
+        background = self._background.get((width, height))
+        if background is None:
+            ramp = np.linspace(40, 200, width, dtype=np.uint8)
+            background = np.repeat(np.tile(ramp, (height, 1))[:, :, None], 3, axis=2)
+            self._background[(width, height)] = background
+        frame = background.copy()
+        t = self.index / 30.0
+        self.index += 1
+        cx = int(width * (0.5 + 0.3 * np.sin(t)))
+        cy = int(height * (0.5 + 0.2 * np.cos(t * 0.7)))
+        axes = (max(width // 12, 4), max(width // 9, 5))
+        cv2.ellipse(frame, (cx, cy), axes, 0, 0, 360, (150, 170, 210), -1)
+        cv2.circle(frame, (cx - axes[0] // 2, cy - axes[1] // 4), max(axes[0] // 6, 1), (30, 30, 30), -1)
+        cv2.circle(frame, (cx + axes[0] // 2, cy - axes[1] // 4), max(axes[0] // 6, 1), (30, 30, 30), -1)
+        return frame
+
+
+class ESP32Simulator:
+    """Camera web server (:80/:81) and servo bridge (:100) emulation"""
+
+    def __init__(self, host="127.0.0.1", source=None, fps=20.0, framesize=8, quality=10,
+                 latency=0.0, dropout=0.0, dropout_time=1.0,
+                 http_port=HTTP_PORT, stream_port=None, bridge_port=BRIDGE_PORT):
+        self.host = host
+        self.source = source if isinstance(source, FrameSource) else FrameSource(source)
+        self.fps = fps
+        self.latency = latency  # Extra delay before each frame is sent
+        self.dropout = dropout  # Probability per frame of cutting the stream
+        self.dropout_time = dropout_time  # Seconds new stream connections are refused after a drop
+        # Like the firmware, /stream is served one port above the web server unless told otherwise
+        self.ports = (http_port, stream_port or http_port + 1, bridge_port)
+
+        # Sensor state reported by /status
+        self.status = {"xclk": 20, "pixformat": 4, "framesize": framesize, "quality": quality,
+                       "brightness": 0, "contrast": 0, "saturation": 0, "sharpness": 0,
+                       "special_effect": 0, "wb_mode": 0, "awb": 1, "awb_gain": 1, "aec": 1,
+                       "aec2": 0, "ae_level": 0, "aec_value": 168, "agc": 1, "agc_gain": 0,
+                       "gainceiling": 0, "bpc": 0, "wpc": 1, "raw_gma": 1, "lenc": 1,
+                       "hmirror": 0, "dcw": 1, "colorbar": 0, "led_intensity": -1}
+        self.lock = threading.Lock()
+
+        # Latest encoded frame shared by every client, like the camera frame buffer
+        self._frame_cond = threading.Condition()
+        self._jpeg = None
+        self._frame_id = 0
+        self._camera_ts = 0.0
+        self._blackout_until = 0.0
+        self._start = time.monotonic()
+
+        # Bridge state
+        self.commands = []  # (time, command) received on port 100
+        self.servo_angles = {}
+        self.heartbeats = 0
+
+        # Stats
+        self.frames_sent = 0
+        self.dropouts = 0
+        self.control_calls = 0
+
+        self._stop_event = threading.Event()
+        self._servers = []
+        self._threads = []
+
+    def start(self):
+        http_port, stream_port, bridge_port = self.ports
+        handler = type("Handler", (_CameraHandler,), {"sim": self})
+        for port in (http_port, stream_port):
+            server = ThreadingHTTPServer((self.host, port), handler)
+            server.daemon_threads = True
+            self._servers.append(server)
+        bridge = _BridgeServer((self.host, bridge_port), type("Bridge", (_BridgeHandler,), {"sim": self}))
+        self._servers.append(bridge)
+
+        targets = [self._produce] + [s.serve_forever for s in self._servers]
+        for target in targets:
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"Simulator: http {self.host}:{http_port}, stream :{stream_port}, bridge :{bridge_port}")
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        with self._frame_cond:
+            self._frame_cond.notify_all()
+
+    @property
+    def url(self):
+        """Base URL for clients, stream_url() derives the stream port from it"""
+        http_port = self.ports[0]
+        return f"http://{self.host}" if http_port == HTTP_PORT else f"http://{self.host}:{http_port}"
+
+    def control(self, var, val):
+        """Apply a /control change, False for values the firmware would reject"""
+        with self.lock:
+            self.control_calls += 1
+            if var == "framesize" and val not in FRAMESIZES:
+                return False
+            if var == "quality" and not QUALITY_MIN <= val <= QUALITY_MAX:
+                return False
+            if var not in self.status:
+                return False
+            self.status[var] = val
+            return True
+
+    def encode_frame(self):
+        with self.lock:
+            width, height = FRAMESIZES[self.status["framesize"]]
+            quality = esp_quality_to_cv2(self.status["quality"])
+        frame = self.source.next_frame(width, height)
+        ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return jpeg.tobytes() if ok else None
+
+    def _produce(self):
+        next_time = time.monotonic()
+        while not self._stop_event.is_set():
+            jpeg = self.encode_frame()
+            with self._frame_cond:
+                self._jpeg = jpeg
+                self._frame_id += 1
+                self._camera_ts = time.monotonic() - self._start
+                self._frame_cond.notify_all()
+            next_time += 1.0 / self.fps
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                self._stop_event.wait(delay)
+            else:
+                next_time = time.monotonic()
+
+    def wait_frame(self, after_id, timeout=1.0):
+        with self._frame_cond:
+            self._frame_cond.wait_for(lambda: self._frame_id > after_id or self._stop_event.is_set(), timeout)
+            return self._frame_id, self._jpeg, self._camera_ts
+
+    def should_drop(self):
+        if self.dropout and random.random() < self.dropout:
+            self.dropouts += 1
+            self._blackout_until = time.monotonic() + self.dropout_time
+            return True
+        return False
+
+    def blacked_out(self):
+        return time.monotonic() < self._blackout_until
+
+
+class _CameraHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    sim = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, code, body=b"", content_type="text/plain", headers=None):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        if parts.path == "/stream":
+            self._stream()
+        elif parts.path == "/capture":
+            self._capture()
+        elif parts.path == "/status":
+            with self.sim.lock:
+                body = json.dumps(self.sim.status, separators=(",", ":")).encode()
+            self._send(200, body, "application/json")
+        elif parts.path == "/control":
+            query = parse_qs(parts.query)
+            try:
+                ok = self.sim.control(query["var"][0], int(query["val"][0]))
+            except (KeyError, ValueError):
+                ok = False
+            self._send(200 if ok else 500)
+        elif parts.path == "/":
+            self._send(200, b"ESP32-CAM simulator", "text/html")
+        else:
+            self._send(404)
+
+    def _capture(self):
+        if self.sim.latency:
+            time.sleep(self.sim.latency)
+        # Latest frame from _produce, like the firmware handing out its frame buffer. Encoding
+        # here would read the source from a second thread and skip frames on /stream
+        _, jpeg, camera_ts = self.sim.wait_frame(0)
+        if jpeg is None:
+            self._send(500)
+            return
+        try:
+            self._send(200, jpeg, "image/jpeg", {"X-Timestamp": "{:.6f}".format(camera_ts)})
+        except (BrokenPipeError, ConnectionResetError):
+            # Client gave up on the request, e.g. a SnapshotSource being released
+            self.close_connection = True
+
+    def _chunk(self, data):
+        self.wfile.write(b"%x\r\n" % len(data) + data + b"\r\n")
+
+    def _stream(self):
+        if self.sim.blacked_out():
+            self._send(503)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", _STREAM_CONTENT_TYPE)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        frame_id = 0
+        try:
+            while not self.sim._stop_event.is_set():
+                frame_id, jpeg, camera_ts = self.sim.wait_frame(frame_id)
+                if jpeg is None:
+                    continue
+                if self.sim.should_drop():
+                    # Cut the connection mid-stream like a Wi-Fi dropout
+                    self.close_connection = True
+                    return
+                if self.sim.latency:
+                    time.sleep(self.sim.latency)
+                # Same three chunks per frame as stream_handler
+                self._chunk(_STREAM_BOUNDARY)
+                self._chunk(_STREAM_PART.format(len(jpeg), camera_ts).encode())
+                self._chunk(jpeg)
+                self.sim.frames_sent += 1
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
+
+
+class _BridgeServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class _BridgeHandler(socketserver.BaseRequestHandler):
+    """Port 100 relay: {...} frames in, {Heartbeat} every second, drop after 3 missed"""
+    sim = None
+
+    def handle(self):
+        sim = self.sim
+        sock = self.request
+        sock.settimeout(0.05)
+        read_buff = ""
+        data_begin = True
+        heartbeat_status = False
+        heartbeat_count = 0
+        heartbeat_time = time.monotonic()
+        while not sim._stop_event.is_set():
+            try:
+                data = sock.recv(1024)
+                if not data:
+                    break
+                for c in data.decode(errors="ignore"):
+                    if data_begin and c == "{":
+                        data_begin = False
+                    if not data_begin and c != " ":
+                        read_buff += c
+                    if not data_begin and c == "}":
+                        data_begin = True
+                        if read_buff == "{Heartbeat}":
+                            heartbeat_status = True
+                            sim.heartbeats += 1
+                        else:
+                            self._relay(read_buff)
+                        read_buff = ""
+            except socket.timeout:
+                pass
+            except OSError:
+                break
+
+            if time.monotonic() - heartbeat_time > 1.0:
+                try:
+                    sock.sendall(b"{Heartbeat}")
+                except OSError:
+                    break
+                if heartbeat_status:
+                    heartbeat_status = False
+                    heartbeat_count = 0
+                else:
+                    heartbeat_count += 1
+                if heartbeat_count > 3:
+                    break
+                heartbeat_time = time.monotonic()
+
+    def _relay(self, frame):
+        # What ArduinoServo.ino would do with the relayed command
+        sim = self.sim
+        command = frame[1:-1]
+        with sim.lock:
+            sim.commands.append((time.time(), command))
+            try:
+                name, _, value = command.partition(":")
+                angle = int(value)
+                if name.startswith("S"):
+                    sim.servo_angles[int(name[1:])] = angle
+                elif name.startswith("A"):
+                    for servo in list(sim.servo_angles) or [1, 2]:
+                        sim.servo_angles[servo] = angle
+            except ValueError:
+                pass
+
+
+def _quality(value):
+    quality = int(value)
+    if not QUALITY_MIN <= quality <= QUALITY_MAX:
+        raise argparse.ArgumentTypeError(f"quality must be between {QUALITY_MIN} and {QUALITY_MAX}")
+    return quality
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ESP32-CAM and servo bridge simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--source", default=None, help="video file, image directory or glob (synthetic if omitted)")
+    parser.add_argument("--fps", type=float, default=20.0)
+    parser.add_argument("--framesize", type=int, default=8, choices=sorted(FRAMESIZES))
+    parser.add_argument("--quality", type=_quality, default=10, help=f"JPEG quality {QUALITY_MIN}-{QUALITY_MAX}")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added before each frame")
+    parser.add_argument("--dropout", type=float, default=0.0, help="probability per frame of cutting the stream")
+    parser.add_argument("--dropout-time", type=float, default=1.0)
+    parser.add_argument("--http-port", type=int, default=HTTP_PORT)
+    parser.add_argument("--stream-port", type=int, default=None,
+                        help="default is --http-port + 1 like the firmware, which is what clients expect")
+    parser.add_argument("--bridge-port", type=int, default=BRIDGE_PORT)
+    args = parser.parse_args()
+
+    sim = ESP32Simulator(args.host, args.source, args.fps, args.framesize, args.quality,
+                         args.latency, args.dropout, args.dropout_time,
+                         args.http_port, args.stream_port, args.bridge_port).start()
+    try:
+        while True:
+            time.sleep(5)
+            print(f"Simulator: sent {sim.frames_sent} frames, {sim.dropouts} dropouts, "
+                  f"{sim.control_calls} control calls, servos {sim.servo_angles}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# File: snapshot.py
+# Frame source that polls /capture instead of reading /stream
+# Several requests are kept in flight on their own keep-alive connections, so the camera is
+# already grabbing the next frame while the previous JPEG is on the wire. Only the newest
+# snapshot is kept; one that arrives after a newer request already returned is dropped.
+# Usage: python snapshot.py http://10.0.0.15 --seconds 5  (compares /capture with /stream)
+
+import argparse
+import http.client
+import statistics
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+from esp32cam import capture_url, stream_url
+from mjpeg import JPEGPart, MJPEGStream
+
+
+class SnapshotSource(MJPEGStream):
+    """Latest-wins /capture poller with the MJPEGStream interface
+
+    concurrency: requests in flight, one pooled connection each
+    interval: minimum seconds between request starts for a steady rate, 0 polls as fast as possible
+    """
+
+    def __init__(self, url: str, concurrency: int=2, interval: float=0.0, timeout: float=3.0,
+                 backoff_min: float=0.05, backoff_max: float=2.0):
+        super().__init__(url, timeout=timeout, backoff_min=backoff_min, backoff_max=backoff_max)
+        self.concurrency = max(int(concurrency), 1)
+        self.interval = interval
+        self._threads = []
+        self._conns = [None] * self.concurrency
+        self._issue_lock = threading.Lock()
+        self._issued = 0  # Sequence number of the last request sent
+        self._newest = 0  # Sequence number of the newest snapshot published
+        self._next_issue = 0.0
+        self.round_trips = deque(maxlen=100)  # Request -> full JPEG, seconds
+
+    def start(self):
+        if not self.isOpened():
+            self._stop_event.clear()
+            self._threads = [threading.Thread(target=self._run, args=(i,), daemon=True)
+                             for i in range(self.concurrency)]
+            for thread in self._threads:
+                thread.start()
+        return self
+
+    def release(self):
+        self._stop_event.set()
+        self._shutdown()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=self.timeout)
+        self._threads = []
+        with self._cond:
+            self._cond.notify_all()
+
+    stop = release
+
+    def isOpened(self):
+        return bool(self._threads) and not self._stop_event.is_set()
+
+    def round_trip(self):
+        """Median request latency in seconds, None before the first snapshot"""
+        samples = list(self.round_trips)
+        return statistics.median(samples) if samples else None
+
+    def _shutdown(self):
+        for conn in list(self._conns):
+            sock = conn.sock if conn is not None else None
+            if sock is not None:
+                try:
+                    sock.shutdown(2)
+                except OSError:
+                    pass
+
+    def _issue(self):
+        # Pace request starts across all workers, returns this request's sequence number
+        with self._issue_lock:
+            now = time.monotonic()
+            wait = self._next_issue - now
+            self._next_issue = max(self._next_issue, now) + self.interval
+            self._issued += 1
+            seq = self._issued
+        if wait > 0:
+            self._stop_event.wait(wait)
+        return seq
+
+    def _run(self, worker):
+        parts = urlsplit(self.url)
+        delay = 0.0
+        recovering = False
+        while not self._stop_event.is_set():
+            conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=self.timeout)
+            self._conns[worker] = conn
+            try:
+                while not self._stop_event.is_set():
+                    seq = self._issue()
+                    started = time.time()
+                    conn.request("GET", parts.path or "/capture")
+                    resp = conn.getresponse()
+                    jpeg = resp.read()
+                    if resp.status != 200:
+                        raise ConnectionError(f"/capture returned HTTP {resp.status}")
+                    camera_ts = resp.getheader("X-Timestamp")
+                    self._publish_snapshot(seq, started, jpeg, float(camera_ts) if camera_ts else None)
+                    if recovering:
+                        recovering = False
+                        for callback in self.reconnect_callbacks:
+                            callback()
+                    self.connected = True
+                    delay = 0.0
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                if not self._stop_event.is_set():
+                    print(f"Snapshot error: {e}")
+            self._conns[worker] = None
+            conn.close()
+            self.connected = False
+            if self._stop_event.is_set():
+                break
+            self.reconnects += 1
+            recovering = True
+            self._stop_event.wait(delay)
+            delay = min(max(delay * 2, self.backoff_min), self.backoff_max)
+
+    def _publish_snapshot(self, seq, started, jpeg, camera_ts):
+        now = time.time()
+        self.round_trips.append(now - started)
+        for callback in self.part_callbacks:
+            callback(jpeg, now, camera_ts)
+        with self._cond:
+            self.frames_received += 1
+            if seq < self._newest:
+                # Overtaken by a later request, older than what consumers already have
+                self.frames_dropped += 1
+                return
+            self._newest = seq
+            if self._latest is not None and self._latest.frame_id > self._consumed_id:
+                self.frames_dropped += 1
+            self._frame_id += 1
+            self._latest = JPEGPart(self._frame_id, now, jpeg, camera_ts)
+            self._cond.notify_all()
+
+
+def measure(source, seconds):
+    """Consume a source for `seconds`, returns (fps, median arrival-to-read latency)"""
+    source.start()
+    frames, latencies = 0, []
+    deadline = time.monotonic() + seconds
+    try:
+        while time.monotonic() < deadline:
+            part = source.read_jpeg(timeout=0.5)
+            if part is not None:
+                frames += 1
+                latencies.append(time.time() - part.timestamp)
+    finally:
+        source.release()
+    return frames / seconds, statistics.median(latencies) if latencies else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare /capture polling with /stream at the current framesize")
+    parser.add_argument("url", nargs="?", default="http://10.0.0.15")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 3])
+    args = parser.parse_args()
+
+    fps, _ = measure(MJPEGStream(stream_url(args.url)), args.seconds)
+    print(f"/stream: {fps:.1f} FPS")
+    for n in args.concurrency:
+        source = SnapshotSource(capture_url(args.url), concurrency=n)
+        fps, _ = measure(source, args.seconds)
+        rtt = source.round_trip()
+        print(f"/capture x{n}: {fps:.1f} FPS, request {1000 * rtt:.0f} ms" if rtt else f"/capture x{n}: no frames")
+
+
+if __name__ == "__main__":
+    main()
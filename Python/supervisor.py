@@ -0,0 +1,197 @@
+# File: supervisor.py
+# Runs one worker process per ESP32 camera so detection for several turrets uses every core
+# Each worker owns its stream reader and cascade; results come back on one shared queue
+# Usage: python supervisor.py http://10.0.0.15 http://10.0.0.16 --profile fast
+
+import argparse
+import multiprocessing as mp
+import os
+import queue
+import time
+
+import cv2
+
+# Message kinds sent from workers, kept as small tuples so pickling stays cheap
+DETECTION = 0  # (DETECTION, camera, frame_id, timestamp, latency, boxes as tuple of tuples)
+STATS = 1  # (STATS, camera, dict)
+ERROR = 2  # (ERROR, camera, message)
+
+
+def _send(results, message):
+    # Never let a slow parent stall capture, drop the message instead
+    try:
+        results.put_nowait(message)
+    except queue.Full:
+        pass
+
+
+def camera_worker(index, url, profile, cascade, results, stop_event, stats_interval=1.0, cpu=None, backend="haar"):
+    """Capture + detection loop for one camera, runs in its own process"""
+    # Each process builds its own reader and cascade instance
+    from detector import load_profile
+    from detector_engine import create_detector, load_model
+    from motion import MotionGatedDetector
+    from esp32cam import stream_url
+    from mjpeg import MJPEGStream, decode_gray, reduction_for
+
+    if cpu is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {cpu})
+    # One worker per core already, keep OpenCV from spawning its own thread pool
+    cv2.setNumThreads(1)
+
+    classifier = load_model(backend, cascade)
+    if classifier is None:
+        _send(results, (ERROR, index, f"Failed to load {backend} face detector {cascade or ''}"))
+        return
+    cascade_detector = create_detector(backend, classifier, load_profile(profile))
+    # Decode straight to grayscale, already shrunk as far as the detector would resize anyway
+    reduction = reduction_for(cascade_detector.scale)
+    # Idle cameras cost almost nothing, so more of them fit on one host
+    detector = MotionGatedDetector(cascade_detector)
+    stream = MJPEGStream(stream_url(url)).start()
+
+    frames = 0
+    detect_time = 0.0
+    window_start = time.monotonic()
+    try:
+        while not stop_event.is_set():
+            part = stream.read_jpeg(timeout=0.5)
+            if part is not None:
+                gray = decode_gray(part.jpeg, reduction)
+                if gray is None:
+                    continue
+                t0 = time.perf_counter()
+                boxes = detector.detect(cv2.equalizeHist(gray, dst=gray), 1.0 / reduction)
+                detect_time += time.perf_counter() - t0
+                frames += 1
+                _send(results, (DETECTION, index, part.frame_id, part.timestamp, time.time() - part.timestamp,
+                                tuple(map(tuple, boxes.tolist()))))
+
+            elapsed = time.monotonic() - window_start
+            if elapsed >= stats_interval:
+                _send(results, (STATS, index, {
+                    "fps": frames / elapsed,
+                    "detect_ms": 1000.0 * detect_time / frames if frames else 0.0,
+                    "detect_runs": detector.runs,
+                    "detect_skipped": detector.skipped,
+                    "received": stream.frames_received,
+                    "dropped": stream.frames_dropped,
+                    "reconnects": stream.reconnects,
+                    "connected": stream.connected,
+                }))
+                frames = 0
+                detect_time = 0.0
+                window_start = time.monotonic()
+    finally:
+        stream.release()
+
+
+class CameraSupervisor:
+    """Starts, watches and restarts one camera_worker process per endpoint"""
+
+    def __init__(self, urls, profile="default", cascade=None, pin_cpus=True, restart_delay=1.0, backend="haar"):
+        self.urls = list(urls)
+        self.profile = profile
+        self.cascade = cascade  # Overrides the backend's cascade file
+        self.backend = backend
+        self.pin_cpus = pin_cpus
+        self.restart_delay = restart_delay
+
+        ctx = mp.get_context("spawn")
+        self._ctx = ctx
+        self.results = ctx.Queue(maxsize=256 * max(len(self.urls), 1))
+        self._stop_event = ctx.Event()
+        self._processes = {}
+        self._started = {}
+
+        # Latest per-camera stats and detections as seen by the parent
+        self.stats = {i: {} for i in range(len(self.urls))}
+        self.latest = {}
+        self.restarts = {i: 0 for i in range(len(self.urls))}
+
+    def _spawn(self, index):
+        cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else []
+        cpu = cpus[index % len(cpus)] if self.pin_cpus and cpus else None
+        process = self._ctx.Process(target=camera_worker, name=f"camera-{index}", daemon=True,
+                                    args=(index, self.urls[index], self.profile, self.cascade,
+                                          self.results, self._stop_event, 1.0, cpu, self.backend))
+        process.start()
+        self._processes[index] = process
+        self._started[index] = time.monotonic()
+
+    def start(self):
+        for index in range(len(self.urls)):
+            self._spawn(index)
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        for process in self._processes.values():
+            process.join(timeout=3)
+            if process.is_alive():
+                process.terminate()
+        self._processes = {}
+
+    def check_workers(self):
+        """Restart workers that died, e.g. after an OpenCV crash"""
+        for index, process in list(self._processes.items()):
+            if not process.is_alive() and not self._stop_event.is_set():
+                if time.monotonic() - self._started[index] < self.restart_delay:
+                    continue
+                print(f"Supervisor: camera {index} exited ({process.exitcode}), restarting")
+                self.restarts[index] += 1
+                self._spawn(index)
+
+    def poll(self, timeout=0.1):
+        """Yield messages from workers, updating stats/latest as they pass"""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                message = self.results.get(timeout=max(remaining, 0)) if remaining > 0 else self.results.get_nowait()
+            except queue.Empty:
+                return
+            kind, index = message[0], message[1]
+            if kind == DETECTION:
+                self.latest[index] = message
+            elif kind == STATS:
+                message[2]["restarts"] = self.restarts[index]
+                self.stats[index] = message[2]
+            elif kind == ERROR:
+                print(f"Supervisor: camera {index} error: {message[2]}")
+            yield message
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-camera detection supervisor")
+    parser.add_argument("urls", nargs="+", help="camera base URLs, e.g. http://10.0.0.15")
+    parser.add_argument("--profile", default="default", help="detector profile name or JSON file")
+    parser.add_argument("--backend", default="haar", help="haar, lbp, dnn or auto (see detector_engine.py)")
+    parser.add_argument("--cascade", default=None)
+    parser.add_argument("--no-pin", action="store_true", help="do not pin workers to CPUs")
+    args = parser.parse_args()
+
+    from detector_engine import resolve_backend
+    supervisor = CameraSupervisor(args.urls, args.profile, args.cascade, pin_cpus=not args.no_pin,
+                                  backend=resolve_backend(args.backend)).start()
+    last_report = time.monotonic()
+    try:
+        while True:
+            for message in supervisor.poll(timeout=0.5):
+                if message[0] == DETECTION and message[5]:
+                    print(f"camera {message[1]} frame {message[2]}: {len(message[5])} face(s)")
+            supervisor.check_workers()
+            if time.monotonic() - last_report >= 5:
+                for index, stats in supervisor.stats.items():
+                    if stats:
+                        print(f"camera {index}: {stats['fps']:.1f} FPS, detect {stats['detect_ms']:.1f} ms, "
+                              f"dropped {stats['dropped']}, reconnects {stats['reconnects']}")
+                last_report = time.monotonic()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        supervisor.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# File: tests/conftest.py
+# Shared pytest fixtures, run with: python -m pytest -q (from the Python/ directory)
+import os
+import socket
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from simulator import ESP32Simulator
+
+
+def free_ports(count: int=1, consecutive: bool=False):
+    """Unprivileged ports nothing is listening on, `consecutive` for the firmware's http/stream pair"""
+    for _ in range(50):
+        sockets = []
+        try:
+            first = socket.socket()
+            first.bind(("127.0.0.1", 0))
+            sockets.append(first)
+            base = first.getsockname()[1]
+            for offset in range(1, count):
+                sock = socket.socket()
+                sock.bind(("127.0.0.1", base + offset if consecutive else 0))
+                sockets.append(sock)
+            return [sock.getsockname()[1] for sock in sockets]
+        except OSError:
+            continue
+        finally:
+            for sock in sockets:
+                sock.close()
+    raise RuntimeError("no free ports")
+
+
+def jpeg(value: int, size: int=16):
+    """Small solid-color JPEG, `value` is the gray level"""
+    ok, data = cv2.imencode(".jpg", np.full((size, size, 3), value, dtype=np.uint8))
+    return data.tobytes()
+
+
+@pytest.fixture
+def simulator():
+    """Running ESP32Simulator on free ports, stream one above http like the firmware"""
+    http_port, _ = free_ports(2, consecutive=True)
+    bridge_port, = free_ports()
+    sim = ESP32Simulator(fps=30.0, framesize=5, http_port=http_port, bridge_port=bridge_port).start()
+    yield sim
+    sim.stop()
@@ -0,0 +1,95 @@
+# File: tests/test_backend.py
+import time
+
+import pytest
+
+from backend import ServoController, ServoScheduler
+
+
+class FakeController:
+    """Records send_batch calls instead of writing to the bridge"""
+    num_servos = 2
+
+    def __init__(self):
+        self.connected = True
+        self.batches = []
+
+    def send_batch(self, commands):
+        self.batches.append(list(commands))
+
+    def latency(self):
+        return 0.01, 0.02
+
+
+def test_targets_coalesce_into_one_update_per_tick():
+    controller = FakeController()
+    scheduler = ServoScheduler(controller, max_velocity=None)
+    for angle in range(0, 91):
+        scheduler.set_target(0, angle)
+    scheduler.set_target(1, 45)
+    assert scheduler.step(0.02) == ["S1:90", "S2:45"]
+    assert controller.batches == [["S1:90", "S2:45"]]
+    assert scheduler.requests == 92 and scheduler.updates == 1
+    # Nothing moved, nothing is sent
+    assert scheduler.step(0.02) == []
+    assert scheduler.updates == 1
+
+
+def test_targets_are_clamped_and_checked():
+    scheduler = ServoScheduler(FakeController(), max_velocity=None)
+    assert scheduler.set_target(0, 400)
+    assert not scheduler.set_target(5, 90)
+    assert scheduler.step(0.02) == ["S1:180"]
+    assert scheduler.set_position == scheduler.set_target
+
+
+def test_moves_are_limited_by_velocity():
+    scheduler = ServoScheduler(FakeController(), max_velocity=100.0, max_acceleration=None)
+    scheduler.set_target(0, 0)
+    scheduler.step(0.02)
+    scheduler.set_target(0, 90)
+    positions = []
+    for _ in range(60):
+        scheduler.step(0.02)
+        positions.append(scheduler.positions[0])
+    steps = [b - a for a, b in zip([0] + positions, positions)]
+    # 100 deg/s at 50 Hz is 2 degrees per tick
+    assert max(steps) <= 2
+    assert positions[-1] == 90
+
+
+def test_targets_wait_for_the_bridge():
+    controller = FakeController()
+    scheduler = ServoScheduler(controller, max_velocity=None)
+    controller.connected = False
+    scheduler.set_target(0, 30)
+    assert scheduler.step(0.02) == []
+    scheduler.set_target(0, 60)
+    controller.connected = True
+    # Only the newest target goes out once the bridge is back
+    assert scheduler.step(0.02) == ["S1:60"]
+    assert controller.batches == [["S1:60"]]
+
+
+def test_latency_includes_half_a_tick():
+    scheduler = ServoScheduler(FakeController(), rate=50.0)
+    send, round_trip = scheduler.latency()
+    assert send == pytest.approx(0.02) and round_trip == 0.02
+
+
+def test_scheduler_drives_the_simulator_bridge(simulator):
+    controller = ServoController("127.0.0.1", port=simulator.ports[2]).connect()
+    scheduler = ServoScheduler(controller, max_velocity=None).start()
+    try:
+        deadline = time.monotonic() + 5.0
+        while not controller.connected and time.monotonic() < deadline:
+            time.sleep(0.01)
+        for angle in range(0, 121):
+            scheduler.set_target(1, angle)
+        while simulator.servo_angles.get(2) != 120 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert simulator.servo_angles.get(2) == 120
+        assert scheduler.updates < 10
+    finally:
+        scheduler.stop()
+        controller.disconnect()
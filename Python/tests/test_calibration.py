@@ -0,0 +1,113 @@
+# File: tests/test_calibration.py
+import time
+
+import numpy as np
+import pytest
+
+from calibration import CalibrationError, Calibrator
+from motion import MotionGatedDetector
+from pipeline import DetectionRecord, Pipeline
+from tracker import TrackingDetector
+
+SIZE = (640, 480)
+
+
+class FakeDetector:
+    """One face whose width grows by a pixel on every real run"""
+
+    def __init__(self, width: int=100):
+        self.width = width
+        self.calls = 0
+
+    def detect(self, gray, input_scale: float=1.0):
+        self.calls += 1
+        self.width += 1
+        return np.array([[200, 150, self.width, self.width]], dtype=np.int32)
+
+
+class StaticSource:
+    """cv2.VideoCapture-style source that keeps showing the same frame at ~100 Hz"""
+
+    def __init__(self):
+        rng = np.random.default_rng(1)
+        self.frame = rng.integers(0, 255, (SIZE[1], SIZE[0], 3), dtype=np.uint8)
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        time.sleep(0.01)
+        return True, self.frame
+
+
+def record(width, fresh=True, frame_size=SIZE):
+    return DetectionRecord(0, 0.0, 0.0, frame_size, np.array([[0, 0, width, width]]), fresh=fresh)
+
+
+def test_only_fresh_records_count():
+    calibrator = Calibrator(30.0, face_width=15.0, frames=10)
+    for _ in range(50):
+        calibrator.on_detections(record(999, fresh=False))
+    assert calibrator.widths == [] and not calibrator.result.done()
+    for _ in range(10):
+        calibrator.on_detections(record(100))
+    framesize, focal_length = calibrator.result.result(timeout=0)
+    assert focal_length == pytest.approx(200.0)
+
+
+def test_outliers_are_rejected():
+    calibrator = Calibrator(30.0, face_width=15.0, frames=12, min_frames=10)
+    for width in [100, 101, 99, 100, 100, 101, 99, 100, 100, 100, 300, 20]:
+        calibrator.on_detections(record(width))
+    assert calibrator.result.result(timeout=0)[1] == pytest.approx(200.0)
+
+
+def test_too_few_frames_fail():
+    calibrator = Calibrator(30.0, frames=30, min_frames=10, timeout=0.0)
+    calibrator.on_detections(record(100))
+    with pytest.raises(CalibrationError):
+        calibrator.result.result(timeout=0)
+
+
+def test_gate_marks_reused_boxes_stale():
+    detector = FakeDetector()
+    gate = MotionGatedDetector(detector, face_interval=10.0)
+    gray = StaticSource().frame[:, :, 0]
+    gate.detect(gray)
+    assert gate.fresh
+    gate.detect(gray)
+    assert not gate.fresh and detector.calls == 1
+    gate.enabled = False
+    gate.detect(gray)
+    assert gate.fresh and detector.calls == 2
+
+
+def test_tracker_marks_tracked_boxes_stale():
+    detector = FakeDetector()
+    tracker = TrackingDetector(detector, interval=5)
+    gray = StaticSource().frame[:, :, 0]
+    tracker.detect(gray)
+    assert tracker.fresh
+    tracker.detect(gray)
+    assert not tracker.fresh and detector.calls == 1
+    # Through the gate, the tracker decides whether the detector ran
+    gate = MotionGatedDetector(tracker)
+    gate.detect(gray)
+    assert not gate.fresh
+
+
+def test_calibration_on_a_static_scene_counts_real_detections_only():
+    detector = FakeDetector()
+    gate = MotionGatedDetector(detector, face_interval=0.1)
+    pipeline = Pipeline(StaticSource(), gate, present=False)
+    calibrator = Calibrator(30.0, frames=1000, timeout=60.0)
+    pipeline.bus.subscribe(calibrator.on_detections)
+    pipeline.start()
+    try:
+        time.sleep(0.6)
+    finally:
+        pipeline.stop()
+    # The gate skipped most frames, every width counted is one the detector measured
+    assert gate.skipped > len(calibrator.widths)
+    assert len(calibrator.widths) == detector.calls
+    assert len(set(calibrator.widths)) == len(calibrator.widths)
@@ -0,0 +1,92 @@
+# File: tests/test_camera_control.py
+import pytest
+
+from camera_control import CameraControl, CameraControlError, CameraSettings, needs_restart
+
+
+def test_diff_sends_everything_until_status_is_known():
+    settings = CameraSettings(path=None, values={"quality": 12, "awb": 1})
+    assert settings.diff({"quality": 12, "awb": 1}) == {"quality": 12, "awb": 1}
+    settings.seed({"quality": 12, "awb": 1, "framesize": 8, "name": "ov2640"})
+    assert settings.known
+    assert settings.diff({"quality": 12, "awb": 0, "framesize": "8"}) == {"awb": 0}
+
+
+def test_invalidate_distrusts_the_cache():
+    settings = CameraSettings(path=None)
+    settings.seed({"quality": 12})
+    settings.invalidate()
+    assert settings.diff({"quality": 12}) == {"quality": 12}
+
+
+def test_settings_persist_between_runs(tmp_path):
+    path = str(tmp_path / "camera_settings.json")
+    settings = CameraSettings(path)
+    settings.seed({"quality": 20, "framesize": 6})
+    loaded = CameraSettings.load(path)
+    assert loaded.values == {"quality": 20, "framesize": 6}
+    # Saved values are shown, not trusted for skipping calls
+    assert not loaded.known
+
+
+def test_load_ignores_a_broken_file(tmp_path):
+    path = tmp_path / "camera_settings.json"
+    path.write_text("{not json")
+    assert CameraSettings.load(str(path)).values == {}
+
+
+def test_needs_restart():
+    assert needs_restart({"framesize": 8, "quality": 12})
+    assert not needs_restart({"quality": 12})
+    assert not needs_restart({})
+
+
+def test_apply_skips_values_the_camera_already_has(simulator):
+    control = CameraControl(simulator.url, settings=CameraSettings(path=None))
+    try:
+        quality = simulator.status["quality"]
+        assert control.apply(quality=quality).result(timeout=5) == {}
+        assert control.apply(quality=quality + 2, awb=1).result(timeout=5) == {"quality": quality + 2}
+        assert simulator.status["quality"] == quality + 2
+        assert control.control_calls == 1
+    finally:
+        control.close()
+
+
+def test_apply_resends_after_the_camera_reset(simulator):
+    control = CameraControl(simulator.url, settings=CameraSettings(path=None))
+    try:
+        control.apply(quality=30).result(timeout=5)
+        # Brown-out: the sensor is back at its defaults behind the cache's back
+        simulator.status["quality"] = 10
+        control.settings.invalidate()
+        assert control.apply(quality=30).result(timeout=5) == {"quality": 30}
+        assert simulator.status["quality"] == 30
+    finally:
+        control.close()
+
+
+def test_apply_raises_when_the_camera_rejects_a_value(simulator):
+    control = CameraControl(simulator.url, settings=CameraSettings(path=None))
+    try:
+        with pytest.raises(CameraControlError):
+            control.apply(quality=5).result(timeout=5)
+    finally:
+        control.close()
+
+
+def test_watch_invalidates_on_reconnect():
+    class Connection:
+        reconnect_callbacks = []
+
+    control = CameraControl("http://127.0.0.1:1", settings=CameraSettings(path=None))
+    try:
+        connection = control.watch(Connection())
+        control.watch(connection)
+        assert len(connection.reconnect_callbacks) == 1
+        control.settings.seed({"quality": 12})
+        for callback in connection.reconnect_callbacks:
+            callback()
+        assert not control.settings.known
+    finally:
+        control.close()
@@ -0,0 +1,139 @@
+# File: tests/test_framebus.py
+import struct
+import threading
+import time
+import uuid
+from multiprocessing import resource_tracker
+
+import numpy as np
+import pytest
+
+from conftest import jpeg
+from framebus import _HEARTBEAT_OFFSET, STALE_AFTER, SCHEME, BusSource, FrameBus
+
+
+@pytest.fixture
+def bus():
+    """Hub side of a small JPEG bus under a name no other test uses"""
+    bus = FrameBus.create("test-" + uuid.uuid4().hex[:12], slots=4, slot_bytes=4096)
+    yield bus
+    bus.close()
+
+
+def test_reader_gets_the_newest_frame(bus):
+    reader = FrameBus.attach(SCHEME + bus.name)
+    for i in range(3):
+        bus.publish(bytes([i]) * 10, timestamp=float(i), frame_id=i, camera_timestamp=None if i else 5.0)
+    frame = reader.read(after=0, latest=True, timeout=0.1)
+    assert (frame.seq, frame.frame_id, frame.timestamp) == (3, 2, 2.0)
+    assert bytes(frame.data) == bytes([2]) * 10 and frame.camera_timestamp is None
+    assert reader.read(after=frame.seq, timeout=0.01) is None
+    del frame
+    reader.close()
+
+
+def test_in_order_reader_counts_lapped_frames(bus):
+    reader = FrameBus.attach(bus.name)
+    for i in range(10):
+        bus.publish(bytes([i]), timestamp=float(i))
+    frame = reader.read(after=0, latest=False, timeout=0.1, copy=True)
+    # Four slots: frames 1-6 were overwritten before the reader looked
+    assert frame.seq == 7 and reader.lost == 6
+    reader.close()
+
+
+def test_views_are_invalidated_when_the_hub_laps_them(bus):
+    reader = FrameBus.attach(bus.name)
+    bus.publish(b"first", timestamp=0.0)
+    view = reader.read(timeout=0.1)
+    copied = reader.read(timeout=0.1, copy=True)
+    assert reader.valid(view)
+    for i in range(bus.slots):
+        bus.publish(b"later", timestamp=float(i))
+    assert not reader.valid(view)
+    assert bytes(copied.data) == b"first"
+    del view
+    reader.close()
+
+
+def test_slot_being_rewritten_is_not_returned(bus):
+    reader = FrameBus.attach(bus.name)
+    seq = bus.publish(b"frame", timestamp=0.0)
+    # The hub has stamped the slot's begin seq for its next lap but not finished the copy
+    struct.pack_into("<Q", bus.shm.buf, bus._slot(seq), seq + bus.slots)
+    assert reader.read(timeout=0.05) is None
+    reader.close()
+
+
+def test_oversized_frames_are_dropped(bus):
+    assert bus.publish(bytes(bus.slot_bytes + 1), timestamp=0.0) is None
+    assert bus.seq == 0
+
+
+def test_bgr_frames_keep_their_shape():
+    bus = FrameBus.create("test-" + uuid.uuid4().hex[:12], slots=2, slot_bytes=16 * 16 * 3, kind="bgr")
+    try:
+        image = np.random.randint(0, 255, (16, 16, 3), dtype=np.uint8)
+        bus.publish(image, timestamp=0.0)
+        frame = bus.read(timeout=0.1, copy=True)
+        assert frame.data.shape == (16, 16, 3) and (frame.data == image).all()
+    finally:
+        bus.close()
+
+
+def test_readers_stop_waiting_when_the_hub_closes():
+    bus = FrameBus.create("test-" + uuid.uuid4().hex[:12], slots=2, slot_bytes=64)
+    reader = FrameBus.attach(bus.name)
+    results = []
+    waiting = threading.Thread(target=lambda: results.append(reader.read(timeout=5.0)))
+    waiting.start()
+    time.sleep(0.05)
+    bus.close()
+    waiting.join(timeout=1.0)
+    assert not waiting.is_alive() and results == [None]
+    assert reader.closed
+    reader.close()
+
+
+def test_create_refuses_a_bus_a_live_hub_serves(bus):
+    with pytest.raises(FileExistsError):
+        FrameBus.create(bus.name, slots=4, slot_bytes=4096)
+
+
+def test_create_replaces_a_stale_bus():
+    name = "test-" + uuid.uuid4().hex[:12]
+    stale = FrameBus.create(name, slots=4, slot_bytes=4096)
+    stale.publish(b"old", timestamp=0.0)
+    # Hub killed without close(): the segment stays, its heartbeat stops
+    struct.pack_into("<d", stale.shm.buf, _HEARTBEAT_OFFSET, time.time() - STALE_AFTER - 1)
+    resource_tracker.unregister(stale.shm._name, "shared_memory")
+    stale.owner = False
+    bus = FrameBus.create(name, slots=2, slot_bytes=4096)
+    try:
+        assert bus.seq == 0 and bus.slots == 2
+    finally:
+        stale.close()
+        bus.close()
+
+
+def test_bus_source_reads_and_validates_parts(bus):
+    source = BusSource(SCHEME + bus.name).start()
+    try:
+        bus.publish(jpeg(100), timestamp=1.0, frame_id=1)
+        part = source.read_jpeg(timeout=0.5)
+        assert part is not None and source.valid(part)
+        assert bytes(part.jpeg) == jpeg(100)
+        bus.publish(jpeg(200), timestamp=2.0, frame_id=2)
+        ok, image = source.read(timeout=0.5)
+        assert ok and abs(int(image[0, 0, 0]) - 200) <= 3
+        assert not source.valid(part)
+        for i in range(bus.slots):
+            bus.publish(jpeg(i), timestamp=3.0 + i)
+        # The pending part was overwritten by the hub before retrieve() decoded it
+        source.grab(timeout=0.5)
+        for i in range(bus.slots):
+            bus.publish(jpeg(i), timestamp=10.0 + i)
+        assert source.retrieve() == (False, None)
+    finally:
+        del part
+        source.release()
@@ -0,0 +1,122 @@
+# File: tests/test_mjpeg.py
+import http.client
+import socket
+import threading
+
+import numpy as np
+import pytest
+
+from esp32cam import FRAMESIZES, PART_BOUNDARY, stream_url
+from mjpeg import MJPEGParser, MJPEGStream, decode_jpeg
+
+JPEGS = [b"\xff\xd8first\xff\xd9", b"\xff\xd8" + bytes(range(256)) * 4 + b"\xff\xd9", b"\xff\xd8--\r\n\r\n\xff\xd9"]
+
+
+def multipart(jpegs, content_length=True, timestamps=True):
+    """Encode parts the way app_httpd.cpp stream_handler does"""
+    data = b""
+    for i, jpeg in enumerate(jpegs):
+        headers = "Content-Type: image/jpeg\r\n"
+        if content_length:
+            headers += f"Content-Length: {len(jpeg)}\r\n"
+        if timestamps:
+            headers += f"X-Timestamp: {i + 1}.500000\r\n"
+        data += f"\r\n--{PART_BOUNDARY}\r\n{headers}\r\n".encode() + jpeg
+    # Without Content-Length a part only ends at the next boundary
+    return data + f"\r\n--{PART_BOUNDARY}\r\n".encode()
+
+
+def feed_in_chunks(parser, data, size):
+    parts = []
+    for i in range(0, len(data), size):
+        parts += parser.feed(data[i:i + size])
+    return parts
+
+
+@pytest.mark.parametrize("content_length", [True, False])
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 100000])
+def test_parser_splits_parts_across_any_chunk_boundary(content_length, size):
+    parts = feed_in_chunks(MJPEGParser(), multipart(JPEGS, content_length), size)
+    assert [jpeg for jpeg, _ in parts] == JPEGS
+    assert [ts for _, ts in parts] == [1.5, 2.5, 3.5]
+
+
+def test_parser_without_timestamps():
+    parts = MJPEGParser().feed(multipart(JPEGS[:1], timestamps=False))
+    assert parts == [(JPEGS[0], None)]
+
+
+def test_parser_waits_for_the_whole_body():
+    parser = MJPEGParser()
+    data = multipart(JPEGS[1:2])
+    cut = data.index(b"\xff\xd8") + 10
+    assert parser.feed(data[:cut]) == []
+    assert [jpeg for jpeg, _ in parser.feed(data[cut:])] == JPEGS[1:2]
+
+
+def test_parser_ignores_bad_headers():
+    data = multipart(JPEGS[:1]).replace(b"X-Timestamp: 1.500000", b"X-Timestamp: soon")
+    assert MJPEGParser().feed(data) == [(JPEGS[0], None)]
+
+
+def test_parser_resyncs_after_overflow():
+    parser = MJPEGParser(max_buffer=64)
+    # A part header announcing more than the buffer may hold is dropped
+    assert parser.feed(f"\r\n--{PART_BOUNDARY}\r\nContent-Length: 1000\r\n\r\n".encode() + b"x" * 100) == []
+    assert len(parser.buffer) == 0
+    assert [jpeg for jpeg, _ in parser.feed(multipart(JPEGS[:1]))] == JPEGS[:1]
+
+
+def test_stream_round_trip_from_simulator(simulator):
+    stream = MJPEGStream(stream_url(simulator.url)).start()
+    try:
+        ok, frame = stream.read(timeout=5.0)
+        assert ok
+        width, height = FRAMESIZES[simulator.status["framesize"]]
+        assert frame.shape == (height, width, 3) and frame.dtype == np.uint8
+        first = stream.latest()
+        part = stream.read_jpeg(timeout=5.0)
+        assert part is not None and part.frame_id > first.frame_id
+        assert part.camera_timestamp is not None
+        assert decode_jpeg(part.jpeg) is not None
+        assert stream.connected and stream.frames_received >= 2
+    finally:
+        stream.release()
+    assert not stream.isOpened()
+
+
+def test_stream_reconnects_after_restart(simulator):
+    stream = MJPEGStream(stream_url(simulator.url), backoff_min=0.01).start()
+    reconnected = []
+    stream.reconnect_callbacks.append(lambda: reconnected.append(True))
+    try:
+        assert stream.read_jpeg(timeout=5.0) is not None
+        stream.restart()
+        assert stream.read_jpeg(timeout=5.0) is not None
+        assert stream.reconnects >= 1 and reconnected
+    finally:
+        stream.release()
+
+
+def test_failed_connect_closes_its_socket(monkeypatch):
+    # Accepts, then hangs up before answering, like a camera rebooting mid-request
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+    threading.Thread(target=lambda: server.accept()[0].close(), daemon=True).start()
+    connections = []
+
+    class Connection(http.client.HTTPConnection):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            connections.append(self)
+
+    monkeypatch.setattr(http.client, "HTTPConnection", Connection)
+    stream = MJPEGStream(f"http://127.0.0.1:{server.getsockname()[1]}/stream", timeout=2.0)
+    try:
+        # A clean close or a reset, depending on whether the request was read first
+        with pytest.raises(ConnectionResetError):
+            stream._open()
+        assert len(connections) == 1 and connections[0].sock is None
+    finally:
+        server.close()
@@ -0,0 +1,100 @@
+# File: tests/test_pipeline.py
+import threading
+
+import numpy as np
+import pytest
+
+from pipeline import DROP_NEWEST, DROP_OLDEST, FrameRing
+
+
+def frame(value, shape=(4, 6, 3)):
+    return np.full(shape, value, dtype=np.uint8)
+
+
+def test_latest_reader_skips_to_the_newest_frame():
+    ring = FrameRing(slots=4, slot_bytes=72)
+    for i in range(3):
+        ring.put(frame(i), timestamp=float(i), frame_id=i + 10)
+    seq, timestamp, frame_id, out = ring.get(after=0, latest=True)
+    assert (seq, timestamp, frame_id) == (3, 2.0, 12)
+    assert (out == 2).all() and out.shape == (4, 6, 3)
+    assert ring.get(after=seq, timeout=0.01) is None
+
+
+def test_in_order_reader_sees_every_frame():
+    ring = FrameRing(slots=4, slot_bytes=72)
+    for i in range(3):
+        ring.put(frame(i), timestamp=float(i))
+    seen = []
+    seq = 0
+    while (result := ring.get(after=seq, latest=False, timeout=0.01)) is not None:
+        seq = result[0]
+        seen.append(int(result[3][0, 0, 0]))
+    assert seen == [0, 1, 2]
+
+
+def test_drop_oldest_overwrites_unread_frames():
+    ring = FrameRing(slots=2, slot_bytes=72, policy=DROP_OLDEST)
+    for i in range(5):
+        assert ring.put(frame(i), timestamp=float(i)) == i + 1
+    assert ring.dropped == 3
+    seq, _, _, out = ring.get(after=0, latest=False)
+    assert seq == 4 and (out == 3).all()
+
+
+def test_drop_newest_keeps_unread_frames():
+    ring = FrameRing(slots=2, slot_bytes=72, policy=DROP_NEWEST)
+    assert ring.put(frame(0), 0.0) == 1
+    assert ring.put(frame(1), 1.0) == 2
+    assert ring.put(frame(2), 2.0) is None
+    assert ring.dropped == 1
+    seq, _, _, out = ring.get(after=0, latest=False)
+    assert seq == 1 and (out == 0).all()
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        FrameRing(policy="drop_random")
+
+
+def test_torn_put_is_dropped_and_skipped():
+    ring = FrameRing(slots=3, slot_bytes=72)
+    for i in range(3):
+        ring.put(frame(i), float(i))
+    # The writer's source changed under the copy, the slot it overwrote is gone as well
+    assert ring.put(frame(9), 9.0, valid=lambda: False) is None
+    assert ring.dropped == 2  # The oldest unread frame and the torn one
+    seq, _, _, out = ring.get(after=0, latest=False)
+    assert seq == 2 and (out == 1).all()
+    seq, _, _, out = ring.get(after=0, latest=True)
+    assert seq == 3 and (out == 2).all()
+
+
+def test_get_reuses_the_callers_buffer():
+    ring = FrameRing(slots=2, slot_bytes=72)
+    ring.put(frame(1), 0.0)
+    out = np.empty((4, 6, 3), dtype=np.uint8)
+    assert ring.get(out=out)[3] is out
+    # Variable-length payloads: a shorter JPEG lands in the same allocation
+    ring.put(np.arange(10, dtype=np.uint8), 1.0)
+    first = ring.get(after=1)[3]
+    ring.put(np.arange(5, dtype=np.uint8), 2.0)
+    second = ring.get(after=2, out=first)[3]
+    assert list(second) == [0, 1, 2, 3, 4]
+    assert np.shares_memory(first, second)
+
+
+def test_slots_grow_for_larger_frames():
+    ring = FrameRing(slots=2, slot_bytes=8)
+    ring.put(frame(7), 0.0)
+    assert (ring.get()[3] == 7).all()
+
+
+def test_close_wakes_waiting_readers():
+    ring = FrameRing(slots=2, slot_bytes=72)
+    results = []
+    reader = threading.Thread(target=lambda: results.append(ring.get(timeout=5.0)))
+    reader.start()
+    ring.close()
+    reader.join(timeout=1.0)
+    assert not reader.is_alive() and results == [None]
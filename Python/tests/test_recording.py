@@ -0,0 +1,101 @@
+# File: tests/test_recording.py
+import os
+import time
+
+import numpy as np
+import pytest
+
+from conftest import jpeg
+from recording import Recorder, ReplaySource, index_path, load_index, rebuild_index
+
+
+@pytest.fixture
+def recording(tmp_path):
+    """Five frames 0.1 s apart, the third without a camera timestamp"""
+    path = str(tmp_path / "session.mjr")
+    recorder = Recorder(path)
+    for i in range(5):
+        recorder.write(jpeg(i * 50), timestamp=100.0 + i * 0.1, camera_timestamp=None if i == 2 else float(i))
+    recorder.close()
+    return path
+
+
+def replay_all(path, **kwargs):
+    source = ReplaySource(path, realtime=False, **kwargs)
+    parts = []
+    while (part := source.read_jpeg(timeout=0.01)) is not None:
+        parts.append((bytes(part.jpeg), part.camera_timestamp))
+    source.release()
+    return parts
+
+
+def test_replay_returns_the_recorded_bytes(recording):
+    parts = replay_all(recording)
+    assert [data for data, _ in parts] == [jpeg(i * 50) for i in range(5)]
+    assert [ts for _, ts in parts] == [0.0, 1.0, None, 3.0, 4.0]
+
+
+def test_index_entries_point_at_the_jpegs(recording):
+    index = load_index(recording)
+    assert len(index) == 5
+    assert list(index["timestamp"]) == pytest.approx([100.0, 100.1, 100.2, 100.3, 100.4])
+    with open(recording, "rb") as f:
+        data = f.read()
+    for i, entry in enumerate(index):
+        offset, length = int(entry["offset"]), int(entry["length"])
+        assert data[offset:offset + length] == jpeg(i * 50)
+
+
+def test_lost_index_is_rebuilt(recording):
+    expected = load_index(recording)
+    os.remove(index_path(recording))
+    rebuilt = load_index(recording)
+    for field in ("timestamp", "offset", "length"):
+        assert (rebuilt[field] == expected[field]).all()
+    # NaN marks the frame without a camera timestamp
+    assert np.isnan(rebuilt["camera_timestamp"][2])
+    assert rebuild_index(recording) == 5
+
+
+def test_interrupted_write_drops_the_partial_record(recording):
+    # Index flushed, data cut short in the middle of the last JPEG
+    with open(recording, "r+b") as f:
+        f.truncate(os.path.getsize(recording) - 10)
+    assert len(load_index(recording)) == 4
+    assert rebuild_index(recording) == 4
+
+
+def test_recorder_appends_to_an_existing_recording(recording):
+    recorder = Recorder(recording)
+    recorder.write(jpeg(255), timestamp=101.0)
+    recorder.close()
+    parts = replay_all(recording)
+    assert len(parts) == 6 and parts[-1] == (jpeg(255), None)
+
+
+def test_not_a_recording(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"JFIF and more")
+    with pytest.raises(ValueError):
+        rebuild_index(str(path))
+
+
+def test_seek_and_loop(recording):
+    source = ReplaySource(recording, realtime=False, loop=True)
+    source.seek(0.3)
+    assert source.position == pytest.approx(0.3)
+    frames = [source.read(timeout=0.01)[1][0, 0, 0] for _ in range(4)]
+    source.release()
+    # Frames 3 and 4, then back to the start
+    assert list(frames) == pytest.approx([150, 200, 0, 50], abs=3)
+
+
+def test_realtime_replay_skips_frames_a_slow_reader_missed(recording):
+    source = ReplaySource(recording, realtime=True, speed=10.0)
+    assert source.read_jpeg(timeout=1.0) is not None
+    # 0.03 s at 10x is 0.3 s of recording: frames 1 and 2 are already stale
+    time.sleep(0.035)
+    part = source.read_jpeg(timeout=1.0)
+    assert part.camera_timestamp in (3.0, 4.0)
+    assert source.frames_dropped >= 2
+    source.release()
@@ -0,0 +1,145 @@
+# File: tracker.py
+# Detect-then-track: the full cascade runs every `interval` frames (or when a track is lost),
+# faces are followed with template matching in between and re-detected inside a small ROI
+
+import cv2
+import numpy as np
+
+from detector import NO_FACES, as_boxes
+
+
+def _clip_rect(x, y, w, h, width, height):
+    x0, y0 = max(int(x), 0), max(int(y), 0)
+    x1, y1 = min(int(x + w), width), min(int(y + h), height)
+    return x0, y0, max(x1 - x0, 0), max(y1 - y0, 0)
+
+
+def _expand(box, factor):
+    x, y, w, h = box
+    dw, dh = w * (factor - 1) / 2, h * (factor - 1) / 2
+    return x - dw, y - dh, w + 2 * dw, h + 2 * dh
+
+
+class _Track:
+    def __init__(self, box, gray, template_size):
+        self.box = np.asarray(box, dtype=np.int32)
+        self.set_template(gray, template_size)
+
+    def set_template(self, gray, template_size):
+        x, y, w, h = self.box
+        # Templates are matched at reduced scale so cost does not grow with face size
+        self.scale = min(1.0, template_size / max(w, 1))
+        patch = gray[y:y + h, x:x + w]
+        self.template = cv2.resize(patch, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA) \
+            if self.scale < 1.0 else patch.copy()
+        # Flat patches match anywhere and let the track drift
+        self.textured = patch.size > 0 and float(self.template.std()) > 4.0
+
+
+class TrackingDetector:
+    """Wraps a detector with detect(gray, input_scale) and tracks faces between full detections
+
+    Tracks live in the coordinates of the gray image, boxes are returned at full resolution
+    """
+
+    def __init__(self, detector, interval: int=10, search_factor: float=2.0, roi_factor: float=2.5,
+                 min_score: float=0.55, refresh_score: float=0.8, template_size: int=32):
+        self.detector = detector
+        self.interval = interval  # Frames between full-frame detections
+        self.search_factor = search_factor  # Template search window relative to the box
+        self.roi_factor = roi_factor  # Re-detection ROI relative to the box
+        self.min_score = min_score  # Below this the match is treated as lost
+        self.refresh_score = refresh_score  # Above this the template is refreshed to follow pose changes
+        self.template_size = template_size
+        self.tracks = []
+        self.frames_since_detect = 0
+        self.input_scale = 1.0
+        self.fresh = True  # False when the last boxes were tracked rather than detected
+        self.full_detections = 0
+        self.roi_detections = 0
+
+    def reset(self):
+        self.tracks = []
+        self.frames_since_detect = 0
+
+    def detect(self, gray, input_scale: float=1.0):
+        if input_scale != self.input_scale:
+            # Track boxes are in the old image's coordinates
+            self.reset()
+            self.input_scale = input_scale
+        boxes = self._detect(gray)
+        if input_scale != 1.0 and len(boxes):
+            boxes = np.rint(boxes / input_scale).astype(np.int32)
+        return boxes
+
+    def _detect(self, gray):
+        self.frames_since_detect += 1
+        if not self.tracks or self.frames_since_detect >= self.interval:
+            return self._full_detect(gray)
+
+        height, width = gray.shape[:2]
+        kept = []
+        for track in self.tracks:
+            if self._match(track, gray, width, height) or self._roi_detect(track, gray, width, height):
+                kept.append(track)
+        self.tracks = kept
+        if not kept:
+            # Everything was lost, fall back to a full detection right away
+            return self._full_detect(gray)
+        self.fresh = False
+        return np.stack([t.box for t in kept])
+
+    def _detector_boxes(self, gray):
+        # Wrapped detector answers at full resolution, tracks work in gray coordinates
+        boxes = as_boxes(self.detector.detect(gray, self.input_scale))
+        if self.input_scale != 1.0 and len(boxes):
+            boxes = np.rint(boxes * self.input_scale).astype(np.int32)
+        return boxes
+
+    def _full_detect(self, gray):
+        boxes = self._detector_boxes(gray)
+        self.tracks = [_Track(box, gray, self.template_size) for box in boxes]
+        self.frames_since_detect = 0
+        self.full_detections += 1
+        self.fresh = True
+        return boxes if len(boxes) else NO_FACES
+
+    def _match(self, track, gray, width, height):
+        x, y, w, h = track.box
+        if not track.textured:
+            return False
+        sx, sy, sw, sh = _clip_rect(*_expand(track.box, self.search_factor), width, height)
+        if sw < w or sh < h:
+            return False
+        window = gray[sy:sy + sh, sx:sx + sw]
+        if track.scale < 1.0:
+            window = cv2.resize(window, None, fx=track.scale, fy=track.scale, interpolation=cv2.INTER_AREA)
+        th, tw = track.template.shape[:2]
+        if window.shape[0] < th or window.shape[1] < tw:
+            return False
+        result = cv2.matchTemplate(window, track.template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, loc = cv2.minMaxLoc(result)
+        if score < self.min_score:
+            return False
+        nx = sx + int(round(loc[0] / track.scale))
+        ny = sy + int(round(loc[1] / track.scale))
+        track.box = np.array(_clip_rect(nx, ny, w, h, width, height), dtype=np.int32)
+        if score >= self.refresh_score and track.box[2] == w and track.box[3] == h:
+            track.set_template(gray, self.template_size)
+        return True
+
+    def _roi_detect(self, track, gray, width, height):
+        rx, ry, rw, rh = _clip_rect(*_expand(track.box, self.roi_factor), width, height)
+        if rw == 0 or rh == 0:
+            return False
+        self.roi_detections += 1
+        boxes = self._detector_boxes(gray[ry:ry + rh, rx:rx + rw])
+        if len(boxes) == 0:
+            return False
+        # Keep the candidate closest to the old centre
+        cx, cy = track.box[0] + track.box[2] / 2, track.box[1] + track.box[3] / 2
+        centres = boxes[:, :2] + boxes[:, 2:] / 2 + (rx, ry)
+        best = boxes[np.argmin(np.hypot(centres[:, 0] - cx, centres[:, 1] - cy))]
+        track.box = np.array((best[0] + rx, best[1] + ry, best[2], best[3]), dtype=np.int32)
+        track.set_template(gray, self.template_size)
+        return True
@@ -0,0 +1,152 @@
+# File: tracks.py
+# Per-face distance estimation with persistent track identity
+# Detections are matched to tracks by IoU (centroid distance as fallback) and every track
+# carries a constant-velocity Kalman filter on (cx, cy, distance), updated in one NumPy batch
+
+import numpy as np
+
+from detector import KNOWN_FACE_WIDTH
+
+_H = np.zeros((3, 6))
+_H[0, 0] = _H[1, 1] = _H[2, 2] = 1.0  # Measure position and distance, not velocity
+_I6 = np.eye(6)
+
+
+def iou_matrix(a, b):
+    """IoU between every box in a (N, 4) and b (M, 4), x y w h"""
+    ax0, ay0 = a[:, 0:1], a[:, 1:2]
+    ax1, ay1 = ax0 + a[:, 2:3], ay0 + a[:, 3:4]
+    bx0, by0 = b[:, 0], b[:, 1]
+    bx1, by1 = bx0 + b[:, 2], by0 + b[:, 3]
+    iw = np.clip(np.minimum(ax1, bx1) - np.maximum(ax0, bx0), 0, None)
+    ih = np.clip(np.minimum(ay1, by1) - np.maximum(ay0, by0), 0, None)
+    inter = iw * ih
+    union = a[:, 2:3] * a[:, 3:4] + b[:, 2] * b[:, 3] - inter
+    return inter / np.maximum(union, 1e-9)
+
+
+class FaceTrackSet:
+    """Kalman-filtered face tracks, all states kept in stacked arrays"""
+
+    def __init__(self, face_width: float=KNOWN_FACE_WIDTH, iou_threshold: float=0.3,
+                 centroid_gate: float=1.0, max_misses: int=5, process_noise=(50.0, 50.0, 30.0),
+                 measurement_noise=(4.0, 4.0, 5.0)):
+        self.face_width = face_width
+        self.iou_threshold = iou_threshold
+        self.centroid_gate = centroid_gate  # Max centre distance in face widths when IoU is zero
+        self.max_misses = max_misses
+        self.q = np.asarray(process_noise, dtype=float) ** 2  # Acceleration noise per second
+        self.r = np.diag(np.asarray(measurement_noise, dtype=float) ** 2)
+        self.reset()
+
+    def reset(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.x = np.empty((0, 6))  # cx, cy, d, vx, vy, vd
+        self.p = np.empty((0, 6, 6))
+        self.boxes = np.empty((0, 4))
+        self.misses = np.empty(0, dtype=np.int64)
+        self.time = None
+        self.focal_length = None
+        self._next_id = 1
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _predict(self, dt):
+        f = np.eye(6)
+        f[0, 3] = f[1, 4] = f[2, 5] = dt
+        # Constant-velocity model with white acceleration noise
+        q = np.zeros((6, 6))
+        for i in range(3):
+            q[i, i] = self.q[i] * dt ** 4 / 4
+            q[i, i + 3] = q[i + 3, i] = self.q[i] * dt ** 3 / 2
+            q[i + 3, i + 3] = self.q[i] * dt ** 2
+        self.x = self.x @ f.T
+        self.p = f @ self.p @ f.T + q
+
+    def _associate(self, boxes):
+        """Greedy one-to-one matching, returns (track_index, detection_index) arrays"""
+        n, m = len(self.ids), len(boxes)
+        if n == 0 or m == 0:
+            return np.empty(0, dtype=int), np.empty(0, dtype=int)
+        score = iou_matrix(self.boxes, boxes.astype(float))
+        # Fallback for fast motion: centre distance relative to face width, mapped below IoU scores
+        centres = boxes[:, :2] + boxes[:, 2:] / 2
+        dist = np.hypot(self.x[:, 0:1] - centres[:, 0], self.x[:, 1:2] - centres[:, 1])
+        rel = dist / np.maximum(self.boxes[:, 2:3], 1.0)
+        fallback = np.where(rel < self.centroid_gate, (1 - rel / self.centroid_gate) * self.iou_threshold * 0.99, 0)
+        score = np.where(score >= self.iou_threshold, score, np.maximum(fallback, 0))
+
+        rows, cols = [], []
+        flat = np.argsort(score, axis=None)[::-1]
+        used_t, used_d = np.zeros(n, bool), np.zeros(m, bool)
+        for k in flat:
+            t, d = divmod(int(k), m)
+            if score[t, d] <= 0:
+                break
+            if used_t[t] or used_d[d]:
+                continue
+            used_t[t] = used_d[d] = True
+            rows.append(t)
+            cols.append(d)
+        return np.asarray(rows, dtype=int), np.asarray(cols, dtype=int)
+
+    def update(self, boxes, timestamp, focal_length):
+        """Feed one frame of detections
+
+        Returns (track_ids, distances) aligned with boxes, distances in cm (0 without a focal length)
+        """
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+        if focal_length != self.focal_length:
+            # Distance states from another calibration are meaningless, start over
+            self.reset()
+            self.focal_length = focal_length
+        if self.time is not None and len(self.ids):
+            self._predict(max(timestamp - self.time, 1e-3))
+        self.time = timestamp
+        if not focal_length:
+            # Identity only, distance needs calibration
+            focal_length = 0.0
+
+        measured = np.column_stack([boxes[:, 0] + boxes[:, 2] / 2, boxes[:, 1] + boxes[:, 3] / 2,
+                                    self.face_width * focal_length / np.maximum(boxes[:, 2], 1.0)])
+        rows, cols = self._associate(boxes)
+
+        # Batched Kalman update for every matched track
+        if len(rows):
+            p = self.p[rows]
+            y = measured[cols] - self.x[rows] @ _H.T
+            s = _H @ p @ _H.T + self.r
+            k = p @ _H.T @ np.linalg.inv(s)
+            self.x[rows] += np.einsum("nij,nj->ni", k, y)
+            self.p[rows] = (_I6 - k @ _H) @ p
+            self.boxes[rows] = boxes[cols]
+        self.misses += 1
+        self.misses[rows] = 0
+
+        # New tracks for unmatched detections
+        new = np.setdiff1d(np.arange(len(boxes)), cols)
+        if len(new):
+            x = np.zeros((len(new), 6))
+            x[:, :3] = measured[new]
+            p = np.tile(np.diag([25.0, 25.0, 100.0, 400.0, 400.0, 400.0]), (len(new), 1, 1))
+            ids = np.arange(self._next_id, self._next_id + len(new))
+            self._next_id += len(new)
+            self.ids = np.concatenate([self.ids, ids])
+            self.x = np.concatenate([self.x, x])
+            self.p = np.concatenate([self.p, p])
+            self.boxes = np.concatenate([self.boxes, boxes[new]])
+            self.misses = np.concatenate([self.misses, np.zeros(len(new), dtype=np.int64)])
+
+        track_of = np.empty(len(boxes), dtype=int)
+        track_of[cols] = rows
+        track_of[new] = np.arange(len(self.ids) - len(new), len(self.ids))
+        result_ids = self.ids[track_of]
+        distances = self.x[track_of, 2] if focal_length else np.zeros(len(boxes))
+
+        # Drop tracks that have not been seen for a while
+        keep = self.misses <= self.max_misses
+        if not keep.all():
+            self.ids, self.x, self.p = self.ids[keep], self.x[keep], self.p[keep]
+            self.boxes, self.misses = self.boxes[keep], self.misses[keep]
+        return result_ids, distances